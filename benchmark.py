@@ -0,0 +1,319 @@
+"""
+预处理基准测试 - 在合成 COCO 夹具上测量各阶段的耗时、峰值内存与吞吐量
+
+夹具由 synthetic_coco.py 生成（bench/fixtures/<规模>/，参数一致时复用），不需要
+真实数据集与网络。每个条目在独立的子进程中运行，互不共享缓存与内存峰值：
+
+- parse:<源文件>   重建列式缓存（coco_cache / caption_cache），即第一次运行的解析开销
+- index           重建逐图索引（image_index，hero 阶段依赖）
+- <阶段>          spatial / semantic / pose / hero 单独跑一遍 run_pipeline
+
+--mode cached 时阶段从列式缓存读取（先运行 parse / index 条目），json 时直接流式
+解析 JSON（--no-cache 路径）。每个条目记录：
+- wall_s          墙钟时间（多次 --repeat 取中位数）
+- peak_rss_mb     子进程自身的峰值 RSS
+- worker_rss_mb   其进程池子进程中最大的峰值 RSS（没有子进程时为 0）
+- throughput      所读源文件的标注总数 / wall_s（条/秒）
+
+结果逐行追加到 bench/results.jsonl（附提交号、主机、CPU 数、Python / NumPy 版本），
+并与同一主机、规模、模式、进程数的上一条记录比较；--max-regression 给出百分比时，
+任何条目的耗时变慢超过该比例即以非零状态退出，可直接用于回归检查。
+
+用法：python benchmark.py --scales 10k 100k --mode both --repeat 3
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+import synthetic_coco
+
+BENCH_DIR = "bench"
+FIXTURE_DIR = os.path.join(BENCH_DIR, "fixtures")
+OUTPUT_DIR = os.path.join(BENCH_DIR, "output")
+RESULTS_FILE = os.path.join(BENCH_DIR, "results.jsonl")
+
+SCALES = ("10k", "100k")
+MODES = ("cached", "json")
+STAGE_NAMES = ("spatial", "semantic", "pose", "hero")
+# 子进程把结果写成以此开头的一行，其余输出原样转发
+RESULT_PREFIX = "BENCH_RESULT "
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# ================= 子进程：运行单个条目 =================
+def make_stage(name, fixture_dir, output_dir, workers):
+    """在 output_dir 下写出的阶段实例（不覆盖 src/data 中的正式输出）"""
+    import find_image
+    from preprocess_all import STAGES
+
+    def out(file_name):
+        return os.path.join(output_dir, file_name)
+
+    if name == "spatial":
+        return STAGES["spatial"](out("spatial_data.bin"), out("spatial_pyramid"), workers=workers)
+    if name == "semantic":
+        return STAGES["semantic"](out("semantic_data.json"), cube_file=out("semantic_cube.bin"), workers=workers)
+    if name == "pose":
+        return STAGES["pose"](out("pose_stats.json"), workers=workers)
+    # 主图必须存在于磁盘上，指向夹具的占位图片目录
+    find_image.COCO_IMAGE_DIR = os.path.join(fixture_dir, "images")
+    keypoints_path = os.path.join(fixture_dir, synthetic_coco.FILE_NAMES["person_keypoints"])
+    return STAGES["hero"](out("hero_data.json"), out("hero_image.jpg"), keypoints_path=keypoints_path)
+
+
+def run_entry(entry, fixture_dir, output_dir, mode, workers):
+    """执行一个条目，返回它读取的源文件"""
+    from caption_cache import load_caption_cache
+    from coco_cache import load_cache
+    from coco_pipeline import run_pipeline
+    from image_index import load_index
+
+    paths = {source: os.path.join(fixture_dir, name) for source, name in synthetic_coco.FILE_NAMES.items()}
+    if entry.startswith("parse:"):
+        source = entry.split(":", 1)[1]
+        loader = load_caption_cache if source == "captions" else load_cache
+        loader(paths[source], rebuild=True)
+        return [source]
+    if entry == "index":
+        load_index(load_cache(paths["instances"]), load_cache(paths["person_keypoints"]), rebuild=True)
+        return ["instances", "person_keypoints"]
+
+    os.makedirs(output_dir, exist_ok=True)
+    stage = make_stage(entry, fixture_dir, output_dir, workers)
+    run_pipeline([stage], paths=paths, use_cache=mode == "cached")
+    return sorted(stage.sections)
+
+
+def peak_rss_kb():
+    """
+    本进程的峰值 RSS (KB)。ru_maxrss 会跨 fork / exec 继承父进程的峰值，子进程报告的
+    值至少是主进程（可能刚生成过夹具）的峰值；/proc/self/status 的 VmHWM 在 exec 时重置，
+    只反映本条目自身。没有 /proc 时退回 ru_maxrss。
+    """
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def child_main(args):
+    start = time.perf_counter()
+    sources = run_entry(args.child, args.fixture_dir, args.output_dir, args.mode, args.workers)
+    wall = time.perf_counter() - start
+    self_rss = peak_rss_kb()
+    # 进程池子进程由本进程（exec 之后）fork 出来，ru_maxrss 不含主进程的峰值；Linux 上单位为 KB
+    worker_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    print(RESULT_PREFIX + json.dumps({
+        "wall_s": wall,
+        "peak_rss_mb": self_rss / 1024,
+        "worker_rss_mb": worker_rss / 1024,
+        "sources": sources,
+    }))
+
+
+# ================= 主进程：夹具、调度与比较 =================
+def ensure_fixture(scale, seed, need_images):
+    """bench/fixtures/<scale>：已有且参数一致时复用，否则重新生成"""
+    fixture_dir = os.path.join(FIXTURE_DIR, scale)
+    num_annotations = synthetic_coco.parse_count(scale)
+    meta = synthetic_coco.read_meta(fixture_dir)
+    if (
+        meta is not None
+        and meta.get("version") == synthetic_coco.GENERATOR_VERSION
+        and meta.get("seed") == seed
+        and meta.get("target_annotations") == num_annotations
+        and (meta.get("placeholder_images") or not need_images)
+    ):
+        print(f"♻️ Reusing fixture {fixture_dir}")
+        return fixture_dir, meta
+    print(f"🧪 Generating fixture {fixture_dir} ({num_annotations} annotations)")
+    start = time.perf_counter()
+    meta = synthetic_coco.generate(fixture_dir, num_annotations, seed, placeholder_images=need_images)
+    print(f"✅ Generated in {time.perf_counter() - start:.1f}s: {meta['images']} images, "
+          + ", ".join(f"{count} {source}" for source, count in meta["annotations"].items()))
+    return fixture_dir, meta
+
+
+def plan_entries(stages, mode):
+    """按依赖顺序排列的条目：cached 模式先重建所需的缓存与索引"""
+    from coco_pipeline import SOURCE_ORDER
+    from preprocess_all import STAGES
+
+    entries = []
+    if mode == "cached":
+        needed = set().union(*(STAGES[name].sections for name in stages))
+        entries += [f"parse:{source}" for source in SOURCE_ORDER if source in needed]
+        if "hero" in stages:
+            entries.append("index")
+    return entries + list(stages)
+
+
+def run_child(entry, fixture_dir, output_dir, mode, workers, verbose):
+    """在子进程中运行一个条目，返回其结果字典"""
+    command = [
+        sys.executable, os.path.abspath(__file__), "--child", entry,
+        "--fixture-dir", fixture_dir, "--output-dir", output_dir, "--mode", mode, "--workers", str(workers),
+    ]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get("PYTHONPATH")])))
+    proc = subprocess.run(command, capture_output=True, text=True, env=env)
+    result = None
+    for line in proc.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            result = json.loads(line[len(RESULT_PREFIX):])
+        elif verbose:
+            print("    " + line)
+    if proc.returncode != 0 or result is None:
+        sys.stderr.write(proc.stderr)
+        raise RuntimeError(f"benchmark entry {entry} failed (exit code {proc.returncode})")
+    return result
+
+
+def git_commit():
+    try:
+        proc = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=REPO_DIR)
+    except OSError:
+        return None
+    return proc.stdout.strip() or None
+
+
+def read_results(path=RESULTS_FILE):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def run_key(record):
+    """可比较的运行：同一主机、规模、模式、进程数"""
+    return record["host"], record["scale"], record["mode"], record["workers"]
+
+
+def compare(previous, current, max_regression):
+    """打印与上一次的差异，返回超过 max_regression（百分比）的条目"""
+    before = {entry["name"]: entry for entry in previous["entries"]}
+    regressions = []
+    print(f"📊 vs {previous['timestamp']} ({previous.get('commit') or 'unknown commit'}):")
+    for entry in current["entries"]:
+        old = before.get(entry["name"])
+        if old is None or not old["wall_s"]:
+            continue
+        delta = (entry["wall_s"] / old["wall_s"] - 1) * 100
+        rss_delta = entry["peak_rss_mb"] - old["peak_rss_mb"]
+        flag = ""
+        if max_regression is not None and delta > max_regression:
+            regressions.append(entry["name"])
+            flag = " ❗"
+        print(f"   {entry['name']:<22} {old['wall_s']:>8.3f}s -> {entry['wall_s']:>8.3f}s ({delta:+6.1f}%)"
+              f"   rss {rss_delta:+8.1f} MB{flag}")
+    return regressions
+
+
+def print_table(record):
+    print(f"{'entry':<24} {'wall (s)':>9} {'rss (MB)':>9} {'workers (MB)':>13} {'ann/s':>12}")
+    for entry in record["entries"]:
+        print(f"  {entry['name']:<22} {entry['wall_s']:>9.3f} {entry['peak_rss_mb']:>9.1f} "
+              f"{entry['worker_rss_mb']:>13.1f} {entry['throughput']:>12,.0f}")
+
+
+def benchmark(scale, mode, stages, workers, repeat, seed, verbose):
+    fixture_dir, meta = ensure_fixture(scale, seed, need_images="hero" in stages)
+    output_dir = os.path.join(OUTPUT_DIR, scale)
+    shutil.rmtree(output_dir, ignore_errors=True)
+
+    entries = []
+    for entry in plan_entries(stages, mode):
+        print(f"⏱️ [{scale} / {mode}] {entry}")
+        runs = [run_child(entry, fixture_dir, output_dir, mode, workers, verbose) for _ in range(repeat)]
+        wall = statistics.median(run["wall_s"] for run in runs)
+        num_annotations = sum(meta["annotations"][source] for source in runs[0]["sources"])
+        entries.append({
+            "name": entry,
+            "wall_s": round(wall, 4),
+            "wall_runs": [round(run["wall_s"], 4) for run in runs],
+            "peak_rss_mb": round(max(run["peak_rss_mb"] for run in runs), 1),
+            "worker_rss_mb": round(max(run["worker_rss_mb"] for run in runs), 1),
+            "annotations": num_annotations,
+            "throughput": round(num_annotations / wall, 1) if wall else 0.0,
+        })
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "host": platform.node(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "scale": scale,
+        "mode": mode,
+        "workers": workers,
+        "repeat": repeat,
+        "seed": seed,
+        "fixture": {"images": meta["images"], "annotations": meta["annotations"]},
+        "entries": entries,
+    }
+
+
+def main():
+    from shards import NUM_WORKERS
+
+    parser = argparse.ArgumentParser(description="Benchmark the preprocessing stages on synthetic COCO fixtures.")
+    parser.add_argument("--scales", nargs="+", default=list(SCALES), help="fixture sizes in annotations (e.g. 10k 100k 1m)")
+    parser.add_argument("--mode", choices=MODES + ("both",), default="cached",
+                        help="read stages from the columnar cache, from the JSON files, or both")
+    parser.add_argument("--stages", nargs="+", choices=STAGE_NAMES, default=list(STAGE_NAMES))
+    parser.add_argument("--workers", type=int, default=NUM_WORKERS, help="aggregation processes (1 = serial)")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per entry (the median wall time is reported)")
+    parser.add_argument("--seed", type=int, default=synthetic_coco.SEED, help="fixture generator seed")
+    parser.add_argument("--results", default=RESULTS_FILE, help="JSON-lines file results are appended to")
+    parser.add_argument("--max-regression", type=float, default=None,
+                        help="exit non-zero if any entry is slower than the previous comparable run by more than PCT")
+    parser.add_argument("--verbose", action="store_true", help="show the output of each entry")
+    # 子进程内部参数
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--fixture-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--output-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child_main(args)
+        return
+
+    modes = MODES if args.mode == "both" else (args.mode,)
+    history = read_results(args.results)
+    regressions = []
+    for scale in args.scales:
+        for mode in modes:
+            record = benchmark(scale, mode, args.stages, args.workers, max(args.repeat, 1), args.seed, args.verbose)
+            print_table(record)
+            previous = [old for old in history if run_key(old) == run_key(record) and old.get("seed") == record["seed"]]
+            if previous:
+                regressions += [f"{scale}/{mode}/{name}" for name in compare(previous[-1], record, args.max_regression)]
+            os.makedirs(os.path.dirname(args.results) or ".", exist_ok=True)
+            with open(args.results, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            history.append(record)
+
+    print(f"💾 Results appended to {args.results}")
+    if regressions:
+        print(f"❌ Slower than the previous run by more than {args.max_regression}%: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
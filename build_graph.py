@@ -0,0 +1,141 @@
+"""
+增量构建 - 只重新生成输入、参数或代码变化了的输出
+
+预处理的依赖关系：
+
+    COCO JSON ──▶ 列式缓存 (coco_cache / caption_cache) ──▶ 逐图索引 (image_index)
+                                 │
+                                 └──▶ 各阶段输出 (spatial / semantic / pose / hero)
+
+前两层已经各自带指纹（源文件大小 + 修改时间、缓存指纹），失效时自动重建。
+这里补上最后一层：每个阶段的输出记录一个键 = 所读源文件的指纹 + 阶段参数
+(Stage.params) + 输出路径 + 阶段模块及其直接引用的本仓库模块的源码哈希
+（修改 SAMPLE_SIZE / MAX_SAMPLES 等模块常量也会改变键）。
+
+键没有变化、且输出文件仍是上次写出的那些（大小与修改时间一致）时跳过该阶段；
+所有订阅某个源文件的阶段都被跳过时，这个文件连缓存都不会打开。
+
+清单 (src/data/.build_manifest.json)：
+{"version": 1, "stages": {阶段名: {"key": 键, "outputs": {文件: [大小, mtime_ns]}}}}
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import sys
+
+from coco_cache import source_fingerprint
+
+MANIFEST_PATH = os.path.join("src", "data", ".build_manifest.json")
+# 清单格式版本，格式变化时递增以强制全部重建
+MANIFEST_VERSION = 1
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def code_files(stage):
+    """阶段所在模块，以及它直接引用（import 模块或其中的函数 / 类）的本仓库模块的源文件"""
+    module = sys.modules[type(stage).__module__]
+    files = {os.path.abspath(module.__file__)}
+    for value in vars(module).values():
+        dep = value if inspect.ismodule(value) else sys.modules.get(getattr(value, "__module__", None) or "")
+        path = getattr(dep, "__file__", None)
+        if path and os.path.dirname(os.path.abspath(path)) == REPO_DIR:
+            files.add(os.path.abspath(path))
+    return sorted(files)
+
+
+def code_fingerprint(stage):
+    digest = hashlib.sha256()
+    for path in code_files(stage):
+        digest.update(os.path.basename(path).encode("utf-8"))
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def stage_key(stage, paths):
+    """阶段输出的键；所读的源文件不存在时返回 None（该阶段总是重新运行）"""
+    try:
+        sources = {source: source_fingerprint(paths[source]) for source in sorted(stage.sections)}
+    except FileNotFoundError:
+        return None
+    payload = {
+        "sources": sources,
+        "params": stage.params(),
+        "outputs": [os.path.normpath(path) for path in stage.outputs()],
+        "code": code_fingerprint(stage),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def output_fingerprints(paths):
+    """{文件: [大小, mtime_ns]}，目录展开为其中的全部文件；有输出不存在时返回 None"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in names)
+        else:
+            files.append(path)
+    fingerprints = {}
+    for path in sorted(files):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        fingerprints[os.path.normpath(path)] = [st.st_size, st.st_mtime_ns]
+    return fingerprints
+
+
+class BuildManifest:
+    """
+    各阶段上次构建的键与输出指纹。
+
+    - key(stage, paths): 本次运行的键
+    - is_current(stage, key): 键一致且输出未被改动或删除
+    - record(stage, key): 阶段写出后记录
+    - save(): 写回清单
+    """
+
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = path
+        meta = self.read()
+        if meta is None or meta.get("version") != MANIFEST_VERSION:
+            meta = {"version": MANIFEST_VERSION, "stages": {}}
+        self.stages = meta["stages"]
+
+    def read(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def key(self, stage, paths):
+        return stage_key(stage, paths)
+
+    def is_current(self, stage, key):
+        entry = self.stages.get(stage.name)
+        return (
+            key is not None
+            and entry is not None
+            and entry["key"] == key
+            and output_fingerprints(stage.outputs()) == entry["outputs"]
+        )
+
+    def record(self, stage, key):
+        outputs = output_fingerprints(stage.outputs())
+        if key is None or outputs is None:
+            self.stages.pop(stage.name, None)
+        else:
+            self.stages[stage.name] = {"key": key, "outputs": outputs}
+
+    def save(self):
+        # 先写临时文件再替换，避免中断时留下不完整的清单
+        tmp_path = self.path + ".tmp"
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "stages": self.stages}, f, indent=2)
+        os.replace(tmp_path, self.path)
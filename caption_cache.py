@@ -0,0 +1,126 @@
+"""
+描述 (captions) 列式缓存 - 按 image_id 直接取出某张图的全部描述
+
+captions 文件只有主图阶段按图片过滤使用，逐条流式解析整个文件只为取出
+五六条描述。这里第一次读取时把它转换为列：描述文本按原始顺序拼接成一个
+UTF-8 字节块，配合偏移量数组按行切片；再用 coco_cache.ImageRowLookup 把
+image_id 映射到行号。之后取一张（或一百张）图的描述只需几次 mmap 读取。
+
+缓存目录 (src/data/.coco_cache/captions_train2017/)：
+- meta.json                源文件指纹、记录数量
+- images_id.npy            int32
+- images_width.npy         int32
+- images_height.npy        int32
+- images_file_name.npy     unicode
+- ann_id.npy               int64
+- ann_image_id.npy         int32
+- caption_offsets.npy      int64 (N+1)  第 i 条描述位于 captions[offsets[i]:offsets[i + 1]]
+- captions.npy             uint8        全部描述的 UTF-8 字节
+- by_image_*.npy           按图片查找的索引，第一次按图片查找时才生成
+"""
+
+from array import array
+
+import numpy as np
+
+from coco_cache import ColumnCache, cache_dir_for, read_meta, source_fingerprint, write_columns
+from coco_stream import iter_coco
+
+# 缓存格式版本，列定义变化时递增以强制重建
+CACHE_VERSION = 1
+
+
+def is_fresh(path, cache_dir=None):
+    """缓存存在、版本一致且与源文件指纹匹配"""
+    meta = read_meta(cache_dir or cache_dir_for(path))
+    return (
+        meta is not None
+        and meta.get("kind") == "captions"
+        and meta.get("version") == CACHE_VERSION
+        and meta.get("source") == source_fingerprint(path)
+    )
+
+
+def build_caption_cache(path, cache_dir=None):
+    """流式解析 captions JSON 并写出列式缓存，返回缓存目录"""
+    cache_dir = cache_dir or cache_dir_for(path)
+    fingerprint = source_fingerprint(path)
+    print(f"🗄️ Building caption cache for {path} -> {cache_dir}")
+
+    img_id, img_w, img_h, img_files = array("i"), array("i"), array("i"), []
+    ann_id, ann_img = array("q"), array("i")
+    offsets = array("q", [0])
+    blob = bytearray()
+
+    for section, record in iter_coco(path, ("images", "annotations")):
+        if section == "images":
+            img_id.append(record["id"])
+            img_w.append(record["width"])
+            img_h.append(record["height"])
+            img_files.append(record["file_name"])
+        else:
+            ann_id.append(record["id"])
+            ann_img.append(record["image_id"])
+            blob += record["caption"].encode("utf-8")
+            offsets.append(len(blob))
+
+    columns = {
+        "images_id": np.frombuffer(img_id, dtype=np.int32),
+        "images_width": np.frombuffer(img_w, dtype=np.int32),
+        "images_height": np.frombuffer(img_h, dtype=np.int32),
+        "images_file_name": np.array(img_files, dtype=str),
+        "ann_id": np.frombuffer(ann_id, dtype=np.int64),
+        "ann_image_id": np.frombuffer(ann_img, dtype=np.int32),
+        "caption_offsets": np.frombuffer(offsets, dtype=np.int64),
+        "captions": np.frombuffer(bytes(blob), dtype=np.uint8),
+    }
+
+    meta = {
+        "kind": "captions",
+        "version": CACHE_VERSION,
+        "source": fingerprint,
+        "num_images": len(img_files),
+        "num_annotations": len(ann_id),
+        "columns": sorted(columns),
+        "categories": [],
+    }
+    write_columns(cache_dir, columns, meta)
+    print(f"✅ Cached {meta['num_images']} images, {meta['num_annotations']} captions")
+    return cache_dir
+
+
+class CaptionCache(ColumnCache):
+    """描述缓存；rows_for_image 返回该图片的描述行号"""
+
+    def caption(self, row):
+        offsets = self["caption_offsets"]
+        return bytes(self["captions"][offsets[row]:offsets[row + 1]]).decode("utf-8")
+
+    def captions_for_image(self, image_id):
+        """这张图的全部描述（原始顺序）"""
+        return [self.caption(row) for row in self.rows_for_image(image_id).tolist()]
+
+    def iter_records(self, sections=("images", "annotations")):
+        """按 COCO 文件的段顺序产出 (section, record)，与 coco_stream.iter_coco 的格式一致"""
+        if "images" in sections:
+            for record in self.image_records():
+                yield "images", record
+
+        if "annotations" in sections:
+            offsets = self["caption_offsets"].tolist()
+            text = bytes(self["captions"])
+            columns = zip(self["ann_image_id"].tolist(), self["ann_id"].tolist())
+            for row, (image_id, ann_id) in enumerate(columns):
+                yield "annotations", {
+                    "image_id": image_id,
+                    "id": ann_id,
+                    "caption": text[offsets[row]:offsets[row + 1]].decode("utf-8"),
+                }
+
+
+def load_caption_cache(path, cache_dir=None, rebuild=False):
+    """打开 path 对应的描述缓存；缓存缺失或过期时先重建"""
+    cache_dir = cache_dir or cache_dir_for(path)
+    if rebuild or not is_fresh(path, cache_dir):
+        build_caption_cache(path, cache_dir)
+    return CaptionCache(cache_dir)
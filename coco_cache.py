@@ -0,0 +1,364 @@
+"""
+COCO 列式二进制缓存 - 把 instances / person_keypoints JSON 一次性转换为 .npy 列
+
+第一次读取某个 COCO 文件时，流式解析并把每个字段存成一列 NumPy 数组
+（每列一个 .npy 文件），之后的运行直接以 mmap 方式打开这些列，跳过
+JSON 解析。源文件的大小或修改时间变化时缓存自动失效并重建。
+
+缓存目录结构 (src/data/.coco_cache/<文件名>/)：
+- meta.json              源文件指纹、记录数量、categories 原始记录
+- images_id.npy          int32        图像 ID
+- images_width.npy       int32
+- images_height.npy      int32
+- images_file_name.npy   unicode      文件名
+- ann_id.npy             int64        标注 ID（crowd 标注的 ID 超出 int32）
+- ann_image_id.npy       int32
+- ann_category_id.npy    int32
+- ann_bbox.npy           float64 (N,4)
+- ann_area.npy           float64
+- ann_area_is_int.npy    bool         area 在 JSON 中是否写成整数（crowd 标注）
+- ann_iscrowd.npy        uint8
+- ann_keypoints.npy      float32 (N,17,3)   仅关键点文件
+- ann_num_keypoints.npy  int32              仅关键点文件
+- ann_has_keypoints.npy  bool               仅关键点文件，JSON 中是否带有完整的 keypoints 数组
+- by_image_*.npy         按 image_id 查找标注行的索引，第一次按图片查找时才生成（见 ImageRowLookup）
+
+bbox / area 使用 float64：COCO 中的坐标带两位小数，float32 会改变
+下游归一化结果在 4~6 位小数上的舍入，导致输出与直接读 JSON 不一致。
+"""
+
+import argparse
+import json
+import os
+import shutil
+from array import array
+
+import numpy as np
+
+from coco_stream import iter_coco, iter_section
+
+CACHE_DIR_NAME = ".coco_cache"
+# 缓存格式版本，列定义变化时递增以强制重建
+CACHE_VERSION = 2
+
+NUM_KEYPOINTS = 17
+
+
+def cache_dir_for(path):
+    """缓存目录：与源文件同目录下的 .coco_cache/<文件名去掉扩展名>"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(os.path.dirname(path), CACHE_DIR_NAME, stem)
+
+
+def source_fingerprint(path):
+    """源文件指纹（大小 + 修改时间），文件不存在时抛出 FileNotFoundError"""
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def read_meta(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, "meta.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def is_fresh(path, cache_dir=None):
+    """缓存存在、版本一致且与源文件指纹匹配（同目录下的描述缓存 caption_cache 不算）"""
+    meta = read_meta(cache_dir or cache_dir_for(path))
+    return (
+        meta is not None
+        and "kind" not in meta
+        and meta.get("version") == CACHE_VERSION
+        and meta.get("source") == source_fingerprint(path)
+    )
+
+
+class ImageRowLookup:
+    """
+    image_id -> 标注行号：行号按 image_id 稳定排序 (order)，每个 image_id 占据
+    order 中连续的一段 [starts[i], starts[i + 1])，段内保持原始顺序。
+    查找一张图只需一次二分查找和一次切片读取。
+    """
+
+    COLUMNS = ("by_image_order", "by_image_ids", "by_image_starts")
+
+    def __init__(self, order, ids, starts):
+        self.order = order
+        self.ids = ids
+        self.starts = starts
+
+    @classmethod
+    def build(cls, image_ids):
+        order = np.argsort(image_ids, kind="stable")
+        ids, starts = np.unique(np.asarray(image_ids)[order], return_index=True)
+        return cls(order, ids, np.append(starts, len(order)))
+
+    @classmethod
+    def load(cls, cache_dir, image_ids):
+        """从缓存目录打开（mmap）；还没有生成时先由 image_ids 列构建并写入"""
+        paths = [os.path.join(cache_dir, name + ".npy") for name in cls.COLUMNS]
+        if not all(os.path.exists(path) for path in paths):
+            lookup = cls.build(image_ids)
+            for path, values in zip(paths, (lookup.order, lookup.ids, lookup.starts)):
+                # 先写临时文件再替换，避免中断时留下不完整的索引
+                tmp_path = path + ".tmp.npy"
+                np.save(tmp_path, values)
+                os.replace(tmp_path, path)
+        return cls(*(np.load(path, mmap_mode="r") for path in paths))
+
+    def rows(self, image_id):
+        """该图片的标注行号（原始顺序），没有标注时为空数组"""
+        i = int(np.searchsorted(self.ids, image_id))
+        if i == len(self.ids) or self.ids[i] != image_id:
+            return np.zeros(0, dtype=np.int64)
+        return np.asarray(self.order[self.starts[i]:self.starts[i + 1]])
+
+
+def build_cache(path, cache_dir=None):
+    """流式解析 COCO JSON 并写出列式缓存，返回缓存目录"""
+    cache_dir = cache_dir or cache_dir_for(path)
+    fingerprint = source_fingerprint(path)
+    print(f"🗄️ Building columnar cache for {path} -> {cache_dir}")
+
+    img_id, img_w, img_h, img_files = array("i"), array("i"), array("i"), []
+    ann_id, ann_img, ann_cat = array("q"), array("i"), array("i")
+    ann_bbox, ann_area, ann_area_int, ann_crowd = array("d"), array("d"), array("B"), array("B")
+    ann_kps, ann_num_kps, ann_has_kps = array("f"), array("i"), array("B")
+    has_keypoints = False
+    empty_kps = [0.0] * (NUM_KEYPOINTS * 3)
+    categories = []
+
+    for section, record in iter_coco(path):
+        if section == "images":
+            img_id.append(record["id"])
+            img_w.append(record["width"])
+            img_h.append(record["height"])
+            img_files.append(record["file_name"])
+        elif section == "categories":
+            categories.append(record)
+        else:
+            bbox = record.get("bbox", [0.0, 0.0, 0.0, 0.0])
+            ann_id.append(record["id"])
+            ann_img.append(record["image_id"])
+            ann_cat.append(record["category_id"])
+            ann_bbox.extend(bbox)
+            area = record.get("area", bbox[2] * bbox[3])
+            ann_area.append(area)
+            ann_area_int.append(isinstance(area, int))
+            ann_crowd.append(record.get("iscrowd", 0))
+
+            kps = record.get("keypoints")
+            if kps is not None and len(kps) == NUM_KEYPOINTS * 3:
+                has_keypoints = True
+                ann_kps.extend(kps)
+                ann_has_kps.append(1)
+            else:
+                ann_kps.extend(empty_kps)
+                ann_has_kps.append(0)
+            ann_num_kps.append(record.get("num_keypoints", 0))
+
+    columns = {
+        "images_id": np.frombuffer(img_id, dtype=np.int32),
+        "images_width": np.frombuffer(img_w, dtype=np.int32),
+        "images_height": np.frombuffer(img_h, dtype=np.int32),
+        "images_file_name": np.array(img_files, dtype=str),
+        "ann_id": np.frombuffer(ann_id, dtype=np.int64),
+        "ann_image_id": np.frombuffer(ann_img, dtype=np.int32),
+        "ann_category_id": np.frombuffer(ann_cat, dtype=np.int32),
+        "ann_bbox": np.frombuffer(ann_bbox, dtype=np.float64).reshape(-1, 4),
+        "ann_area": np.frombuffer(ann_area, dtype=np.float64),
+        "ann_area_is_int": np.frombuffer(ann_area_int, dtype=np.bool_),
+        "ann_iscrowd": np.frombuffer(ann_crowd, dtype=np.uint8),
+    }
+    if has_keypoints:
+        columns["ann_keypoints"] = np.frombuffer(ann_kps, dtype=np.float32).reshape(-1, NUM_KEYPOINTS, 3)
+        columns["ann_num_keypoints"] = np.frombuffer(ann_num_kps, dtype=np.int32)
+        columns["ann_has_keypoints"] = np.frombuffer(ann_has_kps, dtype=np.bool_)
+
+    meta = {
+        "version": CACHE_VERSION,
+        "source": fingerprint,
+        "num_images": len(img_files),
+        "num_annotations": len(ann_id),
+        "columns": sorted(columns),
+        "categories": categories,
+    }
+    write_columns(cache_dir, columns, meta)
+    print(f"✅ Cached {meta['num_images']} images, {meta['num_annotations']} annotations")
+    return cache_dir
+
+
+def write_columns(cache_dir, columns, meta):
+    """
+    把 {列名: 数组} 逐列存为 .npy 并写出 meta.json。先写到临时目录再整体替换，
+    避免中断时留下半成品缓存；列式缓存、描述缓存与逐图索引共用。
+    """
+    tmp_dir = cache_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for name, values in columns.items():
+        np.save(os.path.join(tmp_dir, name + ".npy"), values)
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.replace(tmp_dir, cache_dir)
+
+
+class ColumnCache:
+    """已构建的列式缓存目录；列在第一次访问时以 mmap 方式打开（CocoCache / CaptionCache 的公共部分）"""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.meta = read_meta(cache_dir)
+        self.categories = self.meta["categories"]
+        self._columns = {}
+        self._lookup = None
+        self._image_lookup = None
+
+    def __contains__(self, name):
+        return name in self.meta["columns"]
+
+    def __getitem__(self, name):
+        if name not in self._columns:
+            if name not in self:
+                raise KeyError(name)
+            path = os.path.join(self.cache_dir, name + ".npy")
+            self._columns[name] = np.load(path, mmap_mode="r")
+        return self._columns[name]
+
+    @property
+    def num_images(self):
+        return self.meta["num_images"]
+
+    @property
+    def num_annotations(self):
+        return self.meta["num_annotations"]
+
+    def rows_for_image(self, image_id):
+        """该图片的标注在缓存中的行号（原始顺序）；按图片查找的索引第一次使用时生成"""
+        if self._lookup is None:
+            self._lookup = ImageRowLookup.load(self.cache_dir, self["ann_image_id"])
+        return self._lookup.rows(image_id)
+
+    def image_row(self, image_id):
+        """image_id 在 images 列中的行号，不存在时返回 None；查找表第一次使用时在内存中生成"""
+        if self._image_lookup is None:
+            self._image_lookup = ImageRowLookup.build(self["images_id"])
+        rows = self._image_lookup.rows(image_id)
+        return int(rows[0]) if len(rows) else None
+
+    def image_records(self):
+        """产出 images 段的全部记录，格式与 coco_stream.iter_coco 相同"""
+        columns = zip(
+            self["images_id"].tolist(),
+            self["images_width"].tolist(),
+            self["images_height"].tolist(),
+            self["images_file_name"].tolist(),
+        )
+        for img_id, width, height, file_name in columns:
+            yield {
+                "id": img_id,
+                "width": width,
+                "height": height,
+                "file_name": file_name,
+            }
+
+
+class CocoCache(ColumnCache):
+    """instances / person_keypoints 的列式缓存"""
+
+    def annotation_records(self, rows=None):
+        """产出指定行（默认全部）的标注记录，格式与 iter_records 的 annotations 相同"""
+        select = (lambda column: column) if rows is None else (lambda column: column[rows])
+        columns = [
+            select(self["ann_id"]).tolist(),
+            select(self["ann_image_id"]).tolist(),
+            select(self["ann_category_id"]).tolist(),
+            select(self["ann_bbox"]).tolist(),
+            select(self["ann_area"]).tolist(),
+            select(self["ann_area_is_int"]).tolist(),
+            select(self["ann_iscrowd"]).tolist(),
+        ]
+        has_keypoints = "ann_keypoints" in self
+        if has_keypoints:
+            columns.append(select(self["ann_keypoints"]).reshape(-1, NUM_KEYPOINTS * 3).astype(np.int64).tolist())
+            columns.append(select(self["ann_num_keypoints"]).tolist())
+
+        for row in zip(*columns):
+            record = {
+                "id": row[0],
+                "image_id": row[1],
+                "category_id": row[2],
+                "bbox": row[3],
+                # 还原 JSON 中的整数写法，保证下游输出与直接读 JSON 一致
+                "area": int(row[4]) if row[5] else row[4],
+                "iscrowd": row[6],
+            }
+            if has_keypoints:
+                record["keypoints"] = row[7]
+                record["num_keypoints"] = row[8]
+            yield record
+
+    def iter_records(self, sections=("images", "annotations", "categories")):
+        """
+        按 COCO 文件的段顺序产出 (section, record)，与 coco_stream.iter_coco
+        的输出格式一致（不含 segmentation 等未缓存的字段），
+        供逐条处理的阶段直接替换 JSON 流使用。
+        """
+        if "images" in sections:
+            for record in self.image_records():
+                yield "images", record
+
+        if "annotations" in sections:
+            for record in self.annotation_records():
+                yield "annotations", record
+
+        if "categories" in sections:
+            for category in self.categories:
+                yield "categories", category
+
+
+def load_cache(path, cache_dir=None, rebuild=False):
+    """打开 path 对应的缓存；缓存缺失或过期时先重建"""
+    cache_dir = cache_dir or cache_dir_for(path)
+    if rebuild or not is_fresh(path, cache_dir):
+        build_cache(path, cache_dir)
+    return CocoCache(cache_dir)
+
+
+def is_caption_file(path):
+    """第一条标注带 caption 字段的是 captions 文件（没有标注时按 instances 处理）"""
+    for record in iter_section(path, "annotations"):
+        return "caption" in record
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build columnar .npy caches for COCO annotation files.")
+    parser.add_argument("paths", nargs="*", help="COCO JSON files (default: instances + person_keypoints + captions)")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the cache is fresh")
+    args = parser.parse_args()
+
+    from coco_pipeline import CACHE_LOADERS, CACHED_SOURCES, SOURCE_PATHS
+
+    if not args.paths:
+        # 默认文件按各自的缓存格式构建（captions 使用 caption_cache）
+        for source in CACHED_SOURCES:
+            CACHE_LOADERS[source](SOURCE_PATHS[source], rebuild=args.force)
+            print(f"✅ Cache for {SOURCE_PATHS[source]} is ready")
+        return
+
+    from caption_cache import load_caption_cache
+
+    for path in args.paths:
+        # 按内容选择缓存格式：描述文件的标注带 caption 字段，没有 category_id
+        loader = load_caption_cache if is_caption_file(path) else load_cache
+        loader(path, rebuild=args.force)
+        print(f"✅ Cache for {path} is ready")
+
+
+if __name__ == "__main__":
+    main()
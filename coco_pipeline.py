@@ -0,0 +1,164 @@
+"""
+单遍预处理流水线 - 每个 COCO 文件只读取一次，分发给多个处理阶段 (Stage)
+
+各脚本 (process_spatial / process_semantic / process_pose / find_image)
+把自己的统计逻辑写成一个 Stage：声明需要哪些文件的哪些段，逐条消费记录，
+最后产出并写入自己的 JSON。流水线按固定顺序流式读取每个文件，把记录
+同时喂给所有订阅了该文件的阶段，这样多个输出只需付一次解析开销。
+
+instances / person_keypoints 默认经由 coco_cache 的列式缓存读取，captions 经由
+caption_cache：第一次运行时构建缓存，之后直接从 mmap 的 .npy 列产出记录，
+跳过 JSON 解析。
+能直接处理整列数组的阶段实现 consume_cache()，拿到整个缓存做向量化计算，
+不再逐条接收记录。
+给出 build_graph.BuildManifest 时增量运行：输入、参数与代码都没有变化的阶段直接跳过。
+"""
+
+import json
+import os
+from abc import ABC, abstractmethod
+
+from caption_cache import load_caption_cache
+from coco_cache import load_cache
+from coco_stream import iter_coco
+
+DATA_DIR = os.path.join("src", "data")
+
+# 文件读取顺序：hero 阶段需要先在 instances 中选出图片，再去过滤关键点/描述
+SOURCE_ORDER = ("instances", "person_keypoints", "captions")
+SOURCE_PATHS = {
+    "instances": os.path.join(DATA_DIR, "instances_train2017.json"),
+    "person_keypoints": os.path.join(DATA_DIR, "person_keypoints_train2017.json"),
+    "captions": os.path.join(DATA_DIR, "captions_train2017.json"),
+}
+# 各文件的列式缓存加载函数；缓存都支持 rows_for_image，按 image_id 取记录只需几次读取
+CACHE_LOADERS = {
+    "instances": load_cache,
+    "person_keypoints": load_cache,
+    "captions": load_caption_cache,
+}
+CACHED_SOURCES = tuple(CACHE_LOADERS)
+
+
+class Stage(ABC):
+    """
+    流水线阶段基类。
+
+    子类需要设置：
+    - name: 阶段名（用于日志）
+    - sections: {source: (section, ...)}，声明订阅的文件及其中的段
+    - output_file / json_kwargs: 输出路径与 json.dump 参数
+    并实现 consume() 与 finalize()（抽象方法：缺少任何一个时构造阶段即报错，
+    不会等到开始读取文件之后）；写出多个文件的阶段覆盖 outputs()，
+    有影响输出内容的参数的阶段覆盖 params()（增量构建据此判断是否需要重新运行）。
+    """
+
+    name = "stage"
+    sections = {}
+    output_file = None
+    json_kwargs = {}
+
+    def __init__(self):
+        # 阶段可以在 end_source 中把自己置为 False，之后不再接收任何数据
+        self.active = True
+
+    @abstractmethod
+    def consume(self, source, section, record):
+        """处理一条记录（记录对象在各阶段间共享，不要修改它）"""
+
+    def consume_cache(self, source, cache):
+        """
+        直接接收整个列式缓存 (coco_cache.CocoCache / caption_cache.CaptionCache)。
+        返回 True 表示已处理，该文件的记录不再逐条分发给本阶段。
+        """
+        return False
+
+    def end_source(self, source):
+        """某个文件读取完毕时调用"""
+
+    @abstractmethod
+    def finalize(self):
+        """返回要写出的数据；返回 None 表示没有可输出的结果"""
+
+    def params(self):
+        """影响输出内容的参数；workers 等只影响速度的参数不算在内"""
+        return {}
+
+    def outputs(self):
+        """写出的文件 / 目录"""
+        return [self.output_file]
+
+    def write(self, data):
+        with open(self.output_file, "w", encoding="utf-8") as f:
+            json.dump(data, f, **self.json_kwargs)
+        print(f"💾 [{self.name}] Saved to {self.output_file}")
+
+
+def run_pipeline(stages, paths=None, use_cache=True, manifest=None, force=False):
+    """
+    按 SOURCE_ORDER 依次读取各文件，并把记录分发给订阅的阶段。
+
+    paths 可覆盖 SOURCE_PATHS 中的默认路径；use_cache=False 时
+    始终直接流式解析 JSON。
+    manifest 为 build_graph.BuildManifest 时，跳过已是最新的阶段（force=True 时全部重新运行），
+    并记录本次写出的输出。
+    返回 {stage.name: finalize() 的结果}，跳过的阶段不在其中。
+    """
+    paths = dict(SOURCE_PATHS, **(paths or {}))
+    active = list(stages)
+
+    keys = {}
+    if manifest is not None:
+        keys = {stage.name: manifest.key(stage, paths) for stage in active}
+        current = [] if force else [stage for stage in active if manifest.is_current(stage, keys[stage.name])]
+        for stage in current:
+            print(f"⏭️ [{stage.name}] Up to date, skipping")
+        active = [stage for stage in active if stage not in current]
+
+    for source in SOURCE_ORDER:
+        users = [stage for stage in active if source in stage.sections]
+        if not users:
+            continue
+
+        path = paths[source]
+        names = ", ".join(stage.name for stage in users)
+        print(f"📂 Reading {path} -> {names}")
+
+        # 只有源文件缺失时跳过订阅它的阶段；阶段自身抛出的异常（包括 FileNotFoundError）照常向上传递
+        if not os.path.isfile(path):
+            print(f"❌ Error: {path} not found, skipping: {names}")
+            active = [stage for stage in active if stage not in users]
+            continue
+
+        cache = None
+        record_users = users
+        if use_cache and source in CACHED_SOURCES:
+            cache = CACHE_LOADERS[source](path)
+            record_users = [stage for stage in users if not stage.consume_cache(source, cache)]
+
+        if record_users:
+            wanted = sorted(set().union(*(stage.sections[source] for stage in record_users)))
+            if cache is not None:
+                records = cache.iter_records(wanted)
+            else:
+                records = iter_coco(path, wanted)
+            for section, record in records:
+                for stage in record_users:
+                    if section in stage.sections[source]:
+                        stage.consume(source, section, record)
+
+        for stage in users:
+            stage.end_source(source)
+        active = [stage for stage in active if stage.active]
+
+    results = {}
+    for stage in active:
+        data = stage.finalize()
+        if data is not None:
+            stage.write(data)
+            if manifest is not None:
+                manifest.record(stage, keys[stage.name])
+        results[stage.name] = data
+    if manifest is not None:
+        manifest.save()
+    return results
@@ -0,0 +1,126 @@
+"""
+COCO 标注流式读取工具 - 逐条产出 images / categories / annotations 记录
+
+COCO 的标注文件 (instances_train2017.json ~450 MB) 如果直接 json.load，
+会在内存中同时展开整棵对象树（尤其是 segmentation 多边形），占用数 GB。
+这里按块读取文件，只在顶层对象上做一个很小的状态机，数组中的每个元素
+用 json.JSONDecoder.raw_decode 单独解析，因此内存占用只和单条记录的大小
+以及读缓冲区大小有关，与文件总大小无关。
+
+注意：官方文件中各段的顺序是 info, licenses, images, annotations,
+categories —— categories 在最后，需要类别名的脚本应在读完后再做映射。
+"""
+
+import json
+from json.decoder import WHITESPACE
+
+# COCO 文件中可以逐条产出的数组段
+SECTIONS = ("images", "annotations", "categories")
+
+# 每次从磁盘读取的字符数
+CHUNK_SIZE = 1 << 20
+
+
+class _Buffer:
+    """带游标的读缓冲区，数据不足时自动从文件补充"""
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """读入下一块数据，丢弃游标之前已经消费的部分；到达文件末尾返回 False"""
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """跳过空白后返回下一个字符（文件结束时返回空串）"""
+        while True:
+            self.pos = WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, chars):
+        ch = self.peek()
+        if ch == "" or ch not in chars:
+            raise ValueError(
+                f"Malformed COCO JSON: expected one of {chars!r}, "
+                f"got {ch!r} near offset {self.pos}"
+            )
+        self.pos += 1
+        return ch
+
+    def decode(self, decoder):
+        """解析游标处的一个完整 JSON 值；缓冲区内数据不完整时继续读取"""
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.fill():
+                    continue
+                raise
+            # 数字等标量可能恰好在缓冲区末尾被截断，需要补充数据再确认
+            if end == len(self.buf) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+def _iter_array(reader, decoder):
+    """逐个产出数组中的元素（调用时游标位于 '[' 之前）"""
+    reader.expect("[")
+    if reader.peek() == "]":
+        reader.pos += 1
+        return
+    while True:
+        yield reader.decode(decoder)
+        if reader.expect(",]") == "]":
+            return
+
+
+def iter_coco(path, sections=SECTIONS, chunk_size=CHUNK_SIZE):
+    """
+    按文件中的出现顺序逐条产出 (section, record)。
+
+    只有 sections 中列出的数组段会被产出，其余的段（info、licenses、
+    不需要的数组）同样是逐条解析后直接丢弃，不会整体驻留内存。
+    文件不存在时抛出 FileNotFoundError，与 open() 的行为一致。
+    """
+    wanted = set(sections)
+    decoder = json.JSONDecoder()
+
+    with open(path, "r", encoding="utf-8-sig") as f:
+        reader = _Buffer(f, chunk_size)
+        reader.expect("{")
+        if reader.peek() == "}":
+            return
+        while True:
+            key = reader.decode(decoder)
+            reader.expect(":")
+            if reader.peek() == "[":
+                for record in _iter_array(reader, decoder):
+                    if key in wanted:
+                        yield key, record
+            else:
+                reader.decode(decoder)
+            if reader.expect(",}") == "}":
+                return
+
+
+def iter_section(path, section, chunk_size=CHUNK_SIZE):
+    """只产出某一个段的记录，例如 iter_section(path, "annotations")"""
+    for _, record in iter_coco(path, (section,), chunk_size):
+        yield record
@@ -1,9 +1,17 @@
-import json
+import argparse
 import os
 import shutil
-from collections import defaultdict
+from array import array
 import heapq
 
+import numpy as np
+from PIL import Image
+
+from coco_cache import load_cache
+from coco_pipeline import Stage, run_pipeline
+from image_index import SCALE_BITS, ImageIndex, load_index
+from thumb_cache import ThumbCache
+
 # ================= 配置路径 =================
 # 你的本地图片路径
 COCO_IMAGE_DIR = r"D:\vlmdata\COCO2017\train2017"
@@ -17,6 +25,8 @@ CAPTIONS_PATH = os.path.join(ANN_DIR, "captions_train2017.json")
 # 输出路径
 OUTPUT_IMAGE_PATH = os.path.join(ANN_DIR, "hero_image.jpg")
 OUTPUT_JSON_PATH = os.path.join(ANN_DIR, "hero_data.json")
+# 候选预览条中每张小图的尺寸（来自缩略图缓存）
+PREVIEW_TILE_SIZE = 128
 
 # ================= 筛选标准 =================
 # 我们寻找一张"讲故事"的完美图片
@@ -24,160 +34,453 @@ TARGET_PERSON_COUNT = (3, 6)  # 人数在 3 到 6 之间
 MIN_TOTAL_OBJECTS = 8         # 至少有 8 个物体（看起来丰富）
 MIN_UNIQUE_CATEGORIES = 4     # 至少有 4 种不同类别的物体（语义丰富）
 
-print("🚀 开始加载 COCO 标注文件... (这可能需要几秒钟)")
-
-# 1. 加载 Instances
-with open(INSTANCES_PATH, 'r') as f:
-    instances_data = json.load(f)
-
-# 建立类别 ID 到 名称 的映射
-cat_id_to_name = {cat['id']: cat['name'] for cat in instances_data['categories']}
-
-# 2. 预处理：按 Image ID 组织标注
-img_anns = defaultdict(list)
-for ann in instances_data['annotations']:
-    img_anns[ann['image_id']].append(ann)
-
-print(f"✅ Instances 加载完毕，共 {len(img_anns)} 张有标注的图片。开始筛选候选者...")
-
-# 3. 筛选算法
-candidates = []
-
-for img_id, anns in img_anns.items():
-    # 统计信息
-    person_count = 0
-    categories = set()
-    bbox_areas = [] # 用于检查尺度多样性
-    
-    for ann in anns:
-        cat_name = cat_id_to_name.get(ann['category_id'])
-        categories.add(cat_name)
-        bbox_areas.append(ann['bbox'][2] * ann['bbox'][3]) # w * h
-        if cat_name == 'person':
-            person_count += 1
-            
-    # --- 筛选条件 ---
+
+# 默认的主图查询条件（ImageIndex.query 的关键字参数）
+DEFAULT_QUERY = {
     # 条件1: 人数合适 (为了展示 Pose)
-    if not (TARGET_PERSON_COUNT[0] <= person_count <= TARGET_PERSON_COUNT[1]):
-        continue
-        
+    'persons': TARGET_PERSON_COUNT,
     # 条件2: 语义丰富 (为了展示 Semantic)
-    if len(categories) < MIN_UNIQUE_CATEGORIES:
-        continue
-        
+    'min_categories': MIN_UNIQUE_CATEGORIES,
     # 条件3: 物体总数 (为了展示 Spatial 这种密集感)
-    if len(anns) < MIN_TOTAL_OBJECTS:
-        continue
-        
+    'min_objects': MIN_TOTAL_OBJECTS,
     # 条件4: 尺度多样性 (Small < 32^2, Large > 96^2)
-    has_small = any(area < 32*32 for area in bbox_areas)
-    has_large = any(area > 96*96 for area in bbox_areas)
-    
-    if not (has_small and has_large):
-        continue
+    'scales': ('small', 'large'),
+}
+
+# 每次送入排名堆的候选图片数量
+RANK_CHUNK = 1 << 14
+
+
+def _column(index, rows, name):
+    return np.asarray(index[name][rows], dtype=np.float64)
+
 
-    # 如果通过所有筛选，计算一个“完美分数”
+# ================= 打分函数 =================
+# 每个函数接收 (index, rows)，返回这些行的分数数组（越大越好）
+SCORERS = {
     # 分数 = 物体数量 + 类别数量 * 2 (我们更看重类别丰富度)
-    score = len(anns) + len(categories) * 2
-    candidates.append((score, img_id, anns))
-
-# 取分数最高的 Top 1
-if not candidates:
-    print("❌ 未找到符合条件的完美图片，请放宽筛选标准。")
-    exit()
-
-# 按分数排序，取最好的一个
-best_candidate = sorted(candidates, key=lambda x: x[0], reverse=True)[0]
-score, best_img_id, best_anns = best_candidate
-
-print(f"🎉 找到最佳 Hero Image! ID: {best_img_id} (得分: {score})")
-
-# ================= 获取详细数据 =================
-
-# 4. 获取对应的图片文件名
-# 在 instances_data['images'] 中查找文件名
-file_name = next((img['file_name'] for img in instances_data['images'] if img['id'] == best_img_id), None)
-if not file_name:
-    print(f"❌ 找不到 ID {best_img_id} 对应的文件名")
-    exit()
-
-src_img_path = os.path.join(COCO_IMAGE_DIR, file_name)
-if not os.path.exists(src_img_path):
-    print(f"❌ 本地图片文件不存在: {src_img_path}")
-    print("请检查 COCO_IMAGE_DIR 路径配置是否正确。")
-    exit()
-
-# 5. 加载 Keypoints (仅针对这张图)
-print("正在提取姿态数据...")
-with open(KEYPOINTS_PATH, 'r') as f:
-    kp_data = json.load(f)
-    
-# 找到对应 image_id 的 keypoints annotation
-hero_keypoints = [ann for ann in kp_data['annotations'] if ann['image_id'] == best_img_id]
-
-# 6. 加载 Captions (仅针对这张图)
-print("正在提取描述数据...")
-with open(CAPTIONS_PATH, 'r') as f:
-    cap_data = json.load(f)
-
-hero_captions = [ann['caption'] for ann in cap_data['annotations'] if ann['image_id'] == best_img_id]
-
-# ================= 生成最终数据结构 =================
-
-# 处理 bbox 数据，增加 scale 标签
-processed_objects = []
-for ann in best_anns:
-    area = ann['bbox'][2] * ann['bbox'][3]
-    scale = "medium"
-    if area < 32 * 32: scale = "small"
-    elif area > 96 * 96: scale = "large"
-    
-    processed_objects.append({
-        "id": ann['id'],
-        "category": cat_id_to_name[ann['category_id']],
-        "bbox": ann['bbox'], # [x, y, w, h]
-        "area": area,
-        "scale": scale,
-        "iscrowd": ann['iscrowd']
-    })
+    'rich': lambda index, rows: _column(index, rows, 'object_count') + _column(index, rows, 'unique_categories') * 2,
+    'objects': lambda index, rows: _column(index, rows, 'object_count'),
+    'categories': lambda index, rows: _column(index, rows, 'unique_categories'),
+    # 关键点总数：适合挑选姿态丰富的图片
+    'keypoints': lambda index, rows: _column(index, rows, 'keypoint_count'),
+}
+
+
+def rank_images(index, query=None, score='rich', k=1):
+    """
+    返回满足 query 的图片中得分最高的 k 张：[(score, image_id), ...]，按得分从高到低。
+    score 为 SCORERS 中的名称或自定义函数 (index, rows) -> 分数数组。
+    候选按块向量化打分后送入大小为 k 的最小堆，内存只与 k 和块大小有关；
+    得分相同时第一条标注出现得更早的图片排在前面（与逐条扫描的顺序一致）。
+    """
+    scorer = SCORERS[score] if isinstance(score, str) else score
+    rows = index.query(**(DEFAULT_QUERY if query is None else query))
+
+    # 堆元素 (分数, -第一条标注位置, image_id)：堆顶是当前第 k 名
+    heap = []
+    for start in range(0, len(rows), RANK_CHUNK):
+        chunk = rows[start:start + RANK_CHUNK]
+        scores = np.asarray(scorer(index, chunk), dtype=np.float64)
+        # 块内只有不低于第 k 高分的候选进入堆（保留同分者，平局由堆比较第一条标注位置）
+        if len(chunk) > k:
+            kth = -np.partition(-scores, k - 1)[k - 1]
+            keep = scores >= kth
+            chunk, scores = chunk[keep], scores[keep]
+        entries = zip(scores.tolist(), (-index['first_annotation'][chunk]).tolist(), index['image_id'][chunk].tolist())
+        for entry in entries:
+            if len(heap) < k:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+
+    return [(score, image_id) for score, _, image_id in sorted(heap, reverse=True)]
+
+
+def select_best_image(index, query=None, score='rich'):
+    """筛选算法：返回得分最高的 (score, img_id)，没有候选时返回 None"""
+    ranked = rank_images(index, query, score, k=1)
+    return ranked[0] if ranked else None
 
-# 简化 keypoints 数据
-processed_poses = []
-for ann in hero_keypoints:
-    # COCO keypoints 格式: [x1, y1, v1, x2, y2, v2, ...]
-    # v=0: not labeled, v=1: labeled but not visible, v=2: labeled and visible
-    if ann['num_keypoints'] > 0:
-        processed_poses.append({
+
+def spatial_objects(annotations, cat_id_to_name):
+    """处理 bbox 数据，增加 scale 标签"""
+    processed_objects = []
+    for ann in annotations:
+        area = ann['bbox'][2] * ann['bbox'][3]
+        scale = "medium"
+        if area < 32 * 32: scale = "small"
+        elif area > 96 * 96: scale = "large"
+
+        processed_objects.append({
             "id": ann['id'],
-            "keypoints": ann['keypoints'],
-            "bbox": ann['bbox'] # 人体的框，用于对齐
+            "category": cat_id_to_name[ann['category_id']],
+            "bbox": ann['bbox'], # [x, y, w, h]
+            "area": area,
+            "scale": scale,
+            "iscrowd": ann['iscrowd']
         })
+    return processed_objects
 
-hero_data = {
-    "meta": {
-        "image_id": best_img_id,
-        "file_name": file_name,
-        "captions": hero_captions
-    },
-    "spatial": processed_objects, # 用于场景一
-    "semantic": {
-        # 简单构建一个共现列表，实际前端可视化时可以只连接这些物体
-        "categories": list(set(obj['category'] for obj in processed_objects))
-    },
-    "pose": processed_poses # 用于场景三
-}
 
-# ================= 写入文件 =================
+def pose_records(keypoint_annotations):
+    """简化 keypoints 数据"""
+    processed_poses = []
+    for ann in keypoint_annotations:
+        # COCO keypoints 格式: [x1, y1, v1, x2, y2, v2, ...]
+        # v=0: not labeled, v=1: labeled but not visible, v=2: labeled and visible
+        if ann['num_keypoints'] > 0:
+            processed_poses.append({
+                "id": ann['id'],
+                "keypoints": ann['keypoints'],
+                "bbox": ann['bbox'] # 人体的框，用于对齐
+            })
+    return processed_poses
+
+
+def load_scene(image_id, instances_cache, keypoints_cache=None):
+    """
+    由列式缓存按 image_id 直接取出一张图的场景数据（格式同 hero_data.json 的
+    meta / spatial / pose，不含描述），图片不存在时返回 None。
+    供批量生成图层等需要多张图片的工具使用。
+    """
+    row = instances_cache.image_row(image_id)
+    if row is None:
+        return None
+    cat_id_to_name = {cat['id']: cat['name'] for cat in instances_cache.categories}
+    annotations = instances_cache.annotation_records(instances_cache.rows_for_image(image_id))
+    keypoints = []
+    if keypoints_cache is not None and 'ann_keypoints' in keypoints_cache:
+        keypoints = keypoints_cache.annotation_records(keypoints_cache.rows_for_image(image_id))
+    return {
+        "meta": {
+            "image_id": image_id,
+            "file_name": str(instances_cache['images_file_name'][row]),
+        },
+        "spatial": spatial_objects(annotations, cat_id_to_name),
+        "pose": pose_records(keypoints),
+    }
+
+
+class HeroStage(Stage):
+    """
+    门户主图阶段：在 instances 中选出最佳图片，
+    再从 keypoints / captions 中只提取这张图的数据。
+    """
+
+    name = 'hero'
+    sections = {
+        'instances': ('images', 'annotations', 'categories'),
+        'person_keypoints': ('annotations',),
+        'captions': ('annotations',),
+    }
+    json_kwargs = {'indent': 2, 'ensure_ascii': False}
+
+    def __init__(self, output_file=OUTPUT_JSON_PATH, output_image=OUTPUT_IMAGE_PATH, query=None, score='rich',
+                 keypoints_path=KEYPOINTS_PATH):
+        super().__init__()
+        self.output_file = output_file
+        self.output_image = output_image
+        # 索引的关键点计数列来自这个文件的列式缓存（不存在时为 0）
+        self.keypoints_path = keypoints_path
+        # 主图查询条件与打分函数（None 表示 DEFAULT_QUERY）
+        self.query = query
+        self.score = score
+
+        # 只保留筛选需要的字段
+        self.categories = []
+        self.cat_id_to_name = {}
+        # 逐图特征索引：使用缓存时直接打开持久化的索引，逐条读取 JSON 时读完后在内存中构建
+        self.index = None
+        # instances 标注列（缓存的 mmap 列，或逐条读取时累积的 typed array）
+        self.ann_columns = None
+        # 使用缓存时按 image_id 查找标注行（coco_cache.CocoCache.rows_for_image）
+        self.instances_cache = None
+        self.buffers = {
+            'images_id': array('q'),
+            'images_file_name': [],
+            'ann_id': array('q'),
+            'ann_image_id': array('q'),
+            'ann_category_id': array('q'),
+            'ann_bbox': array('d'),
+            'ann_iscrowd': array('B'),
+        }
+
+        self.best = None
+        self.file_name = None
+        self.src_img_path = None
+        self.hero_keypoints = []
+        self.hero_captions = []
+
+    def consume_cache(self, source, cache):
+        if source == 'person_keypoints':
+            if 'ann_keypoints' not in cache:
+                return False
+            # 按 image_id 直接取出主图的关键点标注，不再扫描整列
+            self.hero_keypoints = list(cache.annotation_records(cache.rows_for_image(self.best[1])))
+            return True
+        if source == 'captions':
+            self.hero_captions = cache.captions_for_image(self.best[1])
+            return True
+        self.categories = list(cache.categories)
+        # 选图在读取 keypoints 之前进行，这里直接打开关键点缓存以填充索引的关键点计数
+        keypoints_cache = load_cache(self.keypoints_path) if os.path.exists(self.keypoints_path) else None
+        self.index = load_index(cache, keypoints_cache)
+        self.ann_columns = {name: cache[name] for name in ('ann_id', 'ann_image_id', 'ann_category_id', 'ann_bbox', 'ann_iscrowd')}
+        self.instances_cache = cache
+        return True
+
+    def consume(self, source, section, record):
+        if source == 'instances':
+            buffers = self.buffers
+            if section == 'images':
+                buffers['images_id'].append(record['id'])
+                buffers['images_file_name'].append(record['file_name'])
+            elif section == 'categories':
+                self.categories.append(record)
+            else:
+                buffers['ann_id'].append(record['id'])
+                buffers['ann_image_id'].append(record['image_id'])
+                buffers['ann_category_id'].append(record['category_id'])
+                buffers['ann_bbox'].extend(record['bbox'])
+                buffers['ann_iscrowd'].append(record['iscrowd'])
+        elif record['image_id'] == self.best[1]:
+            # keypoints / captions 只保留这张图的记录
+            if source == 'person_keypoints':
+                self.hero_keypoints.append(record)
+            else:
+                self.hero_captions.append(record['caption'])
+
+    def end_source(self, source):
+        if source == 'instances':
+            self.choose_image()
+        elif source == 'person_keypoints':
+            print("正在提取描述数据...")
+
+    def build_index(self):
+        """逐条读取 JSON 时，由累积的整列数据在内存中构建索引（没有关键点计数）"""
+        buffers = self.buffers
+        self.ann_columns = {
+            'ann_id': np.frombuffer(buffers['ann_id'], dtype=np.int64),
+            'ann_image_id': np.frombuffer(buffers['ann_image_id'], dtype=np.int64),
+            'ann_category_id': np.frombuffer(buffers['ann_category_id'], dtype=np.int64),
+            'ann_bbox': np.frombuffer(buffers['ann_bbox'], dtype=np.float64).reshape(-1, 4),
+            'ann_iscrowd': np.frombuffer(buffers['ann_iscrowd'], dtype=np.uint8),
+        }
+        self.index = ImageIndex.from_columns(
+            np.frombuffer(buffers['images_id'], dtype=np.int64),
+            buffers['images_file_name'],
+            self.ann_columns['ann_image_id'],
+            self.ann_columns['ann_category_id'],
+            self.ann_columns['ann_bbox'],
+            self.categories,
+        )
+
+    def choose_image(self):
+        # 建立类别 ID 到 名称 的映射
+        self.cat_id_to_name = {cat['id']: cat['name'] for cat in self.categories}
+        if self.index is None:
+            self.build_index()
+        num_annotated = int(np.count_nonzero(self.index['object_count']))
+        print(f"✅ Instances 加载完毕，共 {num_annotated} 张有标注的图片。开始筛选候选者...")
+
+        self.best = select_best_image(self.index, self.query, self.score)
+        if self.best is None:
+            print("❌ 未找到符合条件的完美图片，请放宽筛选标准。")
+            self.active = False
+            return
+
+        score, best_img_id = self.best
+        print(f"🎉 找到最佳 Hero Image! ID: {best_img_id} (得分: {score})")
+
+        # 索引中按 image_id 二分查找文件名
+        self.file_name = self.index.file_name(best_img_id)
+        if not self.file_name:
+            print(f"❌ 找不到 ID {best_img_id} 对应的文件名")
+            self.active = False
+            return
+
+        self.src_img_path = os.path.join(COCO_IMAGE_DIR, self.file_name)
+        if not os.path.exists(self.src_img_path):
+            print(f"❌ 本地图片文件不存在: {self.src_img_path}")
+            print("请检查 COCO_IMAGE_DIR 路径配置是否正确。")
+            self.active = False
+            return
+
+        print("正在提取姿态数据...")
+
+    def best_annotations(self, image_id):
+        """取出这张图的 instances 标注（保持原始顺序）"""
+        columns = self.ann_columns
+        if self.instances_cache is not None:
+            rows = self.instances_cache.rows_for_image(image_id)
+        else:
+            rows = np.flatnonzero(np.asarray(columns['ann_image_id']) == image_id)
+        return [
+            {
+                'id': ann_id,
+                'category_id': category_id,
+                'bbox': bbox,
+                'iscrowd': iscrowd,
+            }
+            for ann_id, category_id, bbox, iscrowd in zip(
+                columns['ann_id'][rows].tolist(),
+                columns['ann_category_id'][rows].tolist(),
+                columns['ann_bbox'][rows].tolist(),
+                columns['ann_iscrowd'][rows].tolist(),
+            )
+        ]
+
+    def finalize(self):
+        _, best_img_id = self.best
+        best_anns = self.best_annotations(best_img_id)
+        processed_objects = spatial_objects(best_anns, self.cat_id_to_name)
+        processed_poses = pose_records(self.hero_keypoints)
+
+        return {
+            "meta": {
+                "image_id": best_img_id,
+                "file_name": self.file_name,
+                "captions": self.hero_captions
+            },
+            "spatial": processed_objects, # 用于场景一
+            "semantic": {
+                # 简单构建一个共现列表，实际前端可视化时可以只连接这些物体
+                "categories": list(set(obj['category'] for obj in processed_objects))
+            },
+            "pose": processed_poses # 用于场景三
+        }
+
+    def params(self):
+        return {'query': self.query, 'score': self.score, 'keypoints_path': self.keypoints_path}
+
+    def outputs(self):
+        return [self.output_file, self.output_image]
+
+    def write(self, hero_data):
+        # 1. 复制图片
+        print(f"正在复制图片: {self.file_name} -> {os.path.basename(self.output_image)}")
+        shutil.copy2(self.src_img_path, self.output_image)
+
+        # 2. 写入 JSON
+        super().write(hero_data)
+
+        print("✅ 全部完成！")
+        print(f"图片位置: {self.output_image}")
+        print(f"数据位置: {self.output_file}")
+
+
+def find_hero_image(query=None, score='rich', output_file=OUTPUT_JSON_PATH, output_image=OUTPUT_IMAGE_PATH):
+    print("🚀 开始流式读取 COCO 标注文件... (这可能需要几秒钟)")
+    run_pipeline([HeroStage(output_file, output_image, query, score)], paths={
+        'instances': INSTANCES_PATH,
+        'person_keypoints': KEYPOINTS_PATH,
+        'captions': CAPTIONS_PATH,
+    })
+
+
+def save_preview_strip(file_names, output_path, tile_size=PREVIEW_TILE_SIZE):
+    """把候选图片按排名横向拼成一条预览图，小图取自缩略图缓存"""
+    img_paths = [os.path.join(COCO_IMAGE_DIR, file_name) for file_name in file_names]
+    with ThumbCache() as thumb_cache:
+        tiles = thumb_cache.tiles(img_paths, tile_size)
+    strip = np.zeros((tile_size, tile_size * len(tiles), 3), dtype=np.uint8)
+    for i, (img_path, tile) in enumerate(zip(img_paths, tiles)):
+        if isinstance(tile, str):
+            print(f"⚠️ 打开图片失败，跳过: {img_path}，错误: {tile}")
+            continue
+        strip[:, i * tile_size:(i + 1) * tile_size] = tile
+    Image.fromarray(strip).save(output_path, quality=90)
+    print(f"🖼️ 候选预览条已保存到: {output_path}")
+
+
+def open_index():
+    """打开 instances 缓存对应的逐图索引（关键点文件存在时一并填充关键点计数）"""
+    keypoints_cache = load_cache(KEYPOINTS_PATH) if os.path.exists(KEYPOINTS_PATH) else None
+    return load_index(load_cache(INSTANCES_PATH), keypoints_cache)
+
+
+def list_candidates(query=None, score='rich', k=10, preview=None):
+    """
+    只打开缓存与索引，打印得分最高的 k 张候选图片（不复制图片、不写 hero 数据）；
+    给出 preview 路径时再把这些候选拼成一条预览图。
+    """
+    index = open_index()
+    ranked = rank_images(index, query, score, k)
+    if not ranked:
+        print("❌ 没有符合条件的图片。")
+        return ranked
+
+    print(f"{'rank':>4}  {'score':>7}  {'image_id':>10}  {'objects':>7}  {'persons':>7}  {'categories':>10}  file_name")
+    for rank, (value, image_id) in enumerate(ranked, 1):
+        row = index.row_of(image_id)
+        print(
+            f"{rank:>4}  {value:>7g}  {image_id:>10}  {int(index['object_count'][row]):>7}  "
+            f"{int(index['person_count'][row]):>7}  {int(index['unique_categories'][row]):>10}  {index.file_name(image_id)}"
+        )
+    if preview:
+        save_preview_strip([index.file_name(image_id) for _, image_id in ranked], preview)
+    return ranked
+
+
+def parse_category(text):
+    """"dog:2" -> ("dog", 2)，省略数量时为 1"""
+    name, _, count = text.rpartition(':') if ':' in text else (text, '', '1')
+    return name, int(count)
+
+
+def parse_range(text):
+    """"3-6" / "3-" / "-6" / "any" -> (最少, 最多)"""
+    if text == 'any':
+        return None
+    low, _, high = text.partition('-') if '-' in text else (text, '', text)
+    return (int(low) if low else None, int(high) if high else None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the per-image index and pick a hero image for a scene.")
+    parser.add_argument('--category', action='append', default=[], metavar='NAME[:COUNT]',
+                        help='required category with an optional minimum count, e.g. dog:2 (repeatable)')
+    parser.add_argument('--persons', type=parse_range, default=TARGET_PERSON_COUNT, metavar='MIN-MAX',
+                        help='person count range, e.g. 3-6, 2-, or "any"')
+    parser.add_argument('--min-objects', type=int, default=MIN_TOTAL_OBJECTS)
+    parser.add_argument('--min-categories', type=int, default=MIN_UNIQUE_CATEGORIES)
+    parser.add_argument('--scales', nargs='*', choices=list(SCALE_BITS), default=list(DEFAULT_QUERY['scales']),
+                        help='scales that must all appear in the image')
+    parser.add_argument('--min-keypoints', type=int, default=None)
+    parser.add_argument('--score', choices=list(SCORERS), default='rich', help='ranking function')
+    parser.add_argument('--top', type=int, metavar='K',
+                        help='only list the K best candidates instead of writing hero data')
+    parser.add_argument('--preview', metavar='PATH',
+                        help='with --top, also save the candidates as a thumbnail strip (uses the thumbnail cache)')
+    parser.add_argument('--output-json', default=OUTPUT_JSON_PATH)
+    parser.add_argument('--output-image', default=OUTPUT_IMAGE_PATH)
+    args = parser.parse_args()
+    if args.top is not None and args.top < 1:
+        parser.error('--top must be at least 1')
+    if args.preview and args.top is None:
+        parser.error('--preview requires --top')
+
+    query = {
+        'categories': dict(parse_category(text) for text in args.category),
+        'persons': args.persons,
+        'min_objects': args.min_objects,
+        'min_categories': args.min_categories,
+        'scales': tuple(args.scales),
+        'min_keypoints': args.min_keypoints,
+    }
+    # 运行前先按索引检查类别名（标注文件缺失时交给后续流程报告）
+    if query['categories'] and os.path.exists(INSTANCES_PATH):
+        known = open_index().category_position
+        unknown = [name for name in query['categories'] if name not in known]
+        if unknown:
+            parser.error(f"unknown categories: {', '.join(unknown)}")
 
-# 1. 复制图片
-print(f"正在复制图片: {file_name} -> hero_image.jpg")
-shutil.copy2(src_img_path, OUTPUT_IMAGE_PATH)
+    if args.top is not None:
+        list_candidates(query, args.score, args.top, args.preview)
+    else:
+        find_hero_image(query, args.score, args.output_json, args.output_image)
 
-# 2. 写入 JSON
-print("正在保存 hero_data.json...")
-with open(OUTPUT_JSON_PATH, 'w', encoding='utf-8') as f:
-    json.dump(hero_data, f, indent=2, ensure_ascii=False)
 
-print("✅ 全部完成！")
-print(f"图片位置: {OUTPUT_IMAGE_PATH}")
-print(f"数据位置: {OUTPUT_JSON_PATH}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
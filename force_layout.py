@@ -0,0 +1,109 @@
+"""
+离线力导向布局 - 用 NumPy 向量化实现 d3-force 的同一组力
+
+与前端 semantic_graph.js 中的 d3.forceSimulation 参数一致：
+- link:    d3.forceLink，distance 固定，strength = 1 / min(两端度数)，按度数分配位移
+- charge:  d3.forceManyBody，精确的两两计算（d3 用 Barnes-Hut 近似）
+- center:  d3.forceCenter，整体平移使重心位于原点
+- collide: d3.forceCollide，按半径推开重叠的节点
+alpha / velocity 衰减也与 d3 的默认值相同，因此前端拿到的布局已接近 d3 的平衡态，
+拖拽时只需从低 alpha 热启动。所有力都是对全部节点 / 边同时计算（Jacobi 式），
+与 d3 逐个节点更新的顺序不同，结果不会逐位相同，但平衡态一致。
+
+节点数较少（80 个类别），两两矩阵计算即可，无需四叉树。
+"""
+
+import numpy as np
+
+# d3.forceSimulation 的默认参数
+ALPHA_MIN = 0.001
+ALPHA_DECAY = 1 - ALPHA_MIN ** (1 / 300)
+VELOCITY_DECAY = 0.4
+
+# d3.forceManyBody 默认的 distanceMin^2，避免距离过近时受力发散
+DISTANCE_MIN2 = 1.0
+
+
+def _jiggle(rng, shape):
+    """d3 在两点重合时加入的微小随机扰动"""
+    return (rng.random(shape) - 0.5) * 1e-6
+
+
+def force_layout(num_nodes, sources, targets, radii, link_distance=30.0, charge=-30.0,
+                 collide_padding=0.0, collide_iterations=1, seed=0, ticks=None):
+    """
+    计算节点坐标，返回 shape 为 (num_nodes, 2) 的数组（重心位于原点）。
+
+    - sources / targets: 边两端的节点下标
+    - radii: 每个节点的碰撞半径（不含 collide_padding），None 表示不启用碰撞力
+    - seed: 初始位置与扰动的随机种子，同一 seed 结果完全一致
+    - ticks: 迭代次数，默认与 d3 相同（alpha 从 1 衰减到 ALPHA_MIN，约 300 次）
+    """
+    rng = np.random.default_rng(seed)
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+
+    # 初始位置：与 d3 的 phyllotaxis 排布同样尺度的圆盘内随机分布
+    radius = 10 * np.sqrt(0.5 + num_nodes)
+    angle = rng.random(num_nodes) * 2 * np.pi
+    dist = radius * np.sqrt(rng.random(num_nodes))
+    pos = np.column_stack([dist * np.cos(angle), dist * np.sin(angle)])
+    vel = np.zeros_like(pos)
+
+    degree = np.bincount(np.concatenate([sources, targets]), minlength=num_nodes).astype(np.float64)
+    if len(sources):
+        link_strength = 1 / np.minimum(degree[sources], degree[targets])
+        bias = degree[sources] / (degree[sources] + degree[targets])
+
+    if radii is not None:
+        collide_r = np.asarray(radii, dtype=np.float64) + collide_padding
+        reach = collide_r[:, None] + collide_r[None, :]
+        r2 = collide_r ** 2
+        # 位移按对方半径平方的占比分配给本节点
+        share = r2[None, :] / (r2[:, None] + r2[None, :])
+        np.fill_diagonal(reach, 0)
+
+    if ticks is None:
+        ticks = int(np.ceil(np.log(ALPHA_MIN) / np.log(1 - ALPHA_DECAY)))
+
+    alpha = 1.0
+    for _ in range(ticks):
+        alpha += -alpha * ALPHA_DECAY
+
+        # link：按预测位置 (x + vx) 把边长拉向 link_distance
+        if len(sources):
+            delta = (pos[targets] + vel[targets]) - (pos[sources] + vel[sources])
+            zero = ~delta.any(axis=1)
+            delta[zero] = _jiggle(rng, (zero.sum(), 2))
+            length = np.sqrt((delta ** 2).sum(axis=1))
+            pull = delta * ((length - link_distance) / length * alpha * link_strength)[:, None]
+            np.add.at(vel, targets, -pull * bias[:, None])
+            np.add.at(vel, sources, pull * (1 - bias)[:, None])
+
+        # charge：两两之间 strength * alpha / 距离 的排斥（strength < 0）
+        diff = pos[None, :, :] - pos[:, None, :]
+        d2 = np.maximum((diff ** 2).sum(axis=2), DISTANCE_MIN2)
+        np.fill_diagonal(d2, np.inf)
+        vel += (diff * (charge * alpha / d2)[:, :, None]).sum(axis=1)
+
+        # center：平移使重心位于原点
+        pos -= pos.mean(axis=0)
+
+        # collide：按预测位置推开重叠的节点
+        if radii is not None:
+            for _ in range(collide_iterations):
+                ahead = pos + vel
+                diff = ahead[:, None, :] - ahead[None, :, :]
+                d2 = (diff ** 2).sum(axis=2)
+                overlap = d2 < reach ** 2
+                if not overlap.any():
+                    break
+                d = np.sqrt(np.where(overlap, d2, 1.0))
+                d = np.where(d == 0, 1e-6, d)
+                push = np.where(overlap, (reach - d) / d, 0.0)
+                vel += (diff * (push * share)[:, :, None]).sum(axis=1)
+
+        vel *= 1 - VELOCITY_DECAY
+        pos += vel
+
+    return pos
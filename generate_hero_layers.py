@@ -1,7 +1,9 @@
+import argparse
 import json
 import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 from PIL import Image, ImageDraw, ImageFont
 
@@ -12,6 +14,20 @@ HERO_JSON = DATA_DIR / "hero_data.json"
 OUTPUT_SPATIAL = DATA_DIR / "hero_spatial.png"
 OUTPUT_SEMANTIC = DATA_DIR / "hero_semantic.png"
 OUTPUT_POSE = DATA_DIR / "hero_pose.png"
+# Overlay mode: darkened photo once + cropped transparent layers, stacked by story_main.js
+OUTPUT_BASE = DATA_DIR / "hero_base.jpg"
+OUTPUT_LAYOUT = DATA_DIR / "hero_layers.json"
+BASE_JPEG_QUALITY = 90
+# Batch mode writes <image_id>_<layer>.<ext> plus an index.json here
+OUTPUT_BATCH_DIR = DATA_DIR / "hero_layers"
+
+LAYERS = ("spatial", "semantic", "pose")
+# Output encodings: "png" is lossless, "webp" is much smaller for photo backgrounds
+IMAGE_FORMATS = ("png", "webp")
+WEBP_QUALITY = 80
+# libwebp effort 0-6; 6 is only a few percent smaller but several times slower
+WEBP_METHOD = 4
+NUM_WORKERS = os.cpu_count() or 1
 
 # Visual constants
 CYAN = (0, 255, 255)
@@ -56,17 +72,17 @@ CONNECT_CATEGORIES = {
 }
 
 
-def load_data() -> Dict:
-    if not HERO_JSON.exists():
-        raise FileNotFoundError(f"Missing data file: {HERO_JSON}")
-    with HERO_JSON.open("r", encoding="utf-8") as f:
+def load_data(path: Path = HERO_JSON) -> Dict:
+    if not path.exists():
+        raise FileNotFoundError(f"Missing data file: {path}")
+    with path.open("r", encoding="utf-8") as f:
         return json.load(f)
 
 
-def load_base_image() -> Image.Image:
-    if not HERO_IMAGE.exists():
-        raise FileNotFoundError(f"Missing base image: {HERO_IMAGE}")
-    image = Image.open(HERO_IMAGE).convert("RGBA")
+def load_base_image(path: Path = HERO_IMAGE) -> Image.Image:
+    if not path.exists():
+        raise FileNotFoundError(f"Missing base image: {path}")
+    image = Image.open(path).convert("RGBA")
     overlay = Image.new(
         "RGBA",
         image.size,
@@ -75,6 +91,14 @@ def load_base_image() -> Image.Image:
     return Image.alpha_composite(image, overlay)
 
 
+def save_layer(image: Image.Image, output: Path, image_format: str = "png", optimize: bool = False) -> None:
+    """Save a layer as PNG (optionally optimized) or lossy WebP."""
+    if image_format == "webp":
+        image.save(output, "WEBP", quality=WEBP_QUALITY, method=WEBP_METHOD)
+    else:
+        image.save(output, "PNG", optimize=optimize)
+
+
 def clamp_box(
     x1: float, y1: float, x2: float, y2: float, width: int, height: int
 ) -> Tuple[float, float, float, float]:
@@ -86,8 +110,7 @@ def clamp_box(
     )
 
 
-def draw_spatial_layer(base: Image.Image, data: Dict) -> None:
-    image = base.copy()
+def paint_spatial(image: Image.Image, data: Dict) -> None:
     draw = ImageDraw.Draw(image, "RGBA")
     font = ImageFont.load_default()
     width, height = image.size
@@ -122,12 +145,8 @@ def draw_spatial_layer(base: Image.Image, data: Dict) -> None:
             draw.rectangle([x1, y1, bg_x2, bg_y2], fill=CYAN + (255,))
             draw.text((x1 + pad, y1 + pad - 1), label, fill=(0, 0, 0), font=font)
 
-    image.save(OUTPUT_SPATIAL)
-
 
-
-def draw_semantic_layer(base: Image.Image, data: Dict) -> None:
-    image = base.copy()
+def paint_semantic(image: Image.Image, data: Dict) -> None:
     draw = ImageDraw.Draw(image, "RGBA")
 
     centers = []
@@ -171,11 +190,8 @@ def draw_semantic_layer(base: Image.Image, data: Dict) -> None:
             width=1,
         )
 
-    image.save(OUTPUT_SEMANTIC)
 
-
-def draw_pose_layer(base: Image.Image, data: Dict) -> None:
-    image = base.copy()
+def paint_pose(image: Image.Image, data: Dict) -> None:
     draw = ImageDraw.Draw(image, "RGBA")
     joint_radius = 3
 
@@ -212,17 +228,222 @@ def draw_pose_layer(base: Image.Image, data: Dict) -> None:
                     width=1,
                 )
 
-    image.save(OUTPUT_POSE)
+
+LAYER_PAINTERS = {
+    "spatial": paint_spatial,
+    "semantic": paint_semantic,
+    "pose": paint_pose,
+}
+
+
+def draw_layer(layer: str, base: Image.Image, data: Dict, output: Path, **save_options) -> None:
+    """Full-frame layer: the annotations drawn straight onto a copy of the darkened photo."""
+    image = base.copy()
+    LAYER_PAINTERS[layer](image, data)
+    save_layer(image, output, **save_options)
+
+
+def draw_spatial_layer(base: Image.Image, data: Dict, output: Path = OUTPUT_SPATIAL, **save_options) -> None:
+    draw_layer("spatial", base, data, output, **save_options)
+
+
+def draw_semantic_layer(base: Image.Image, data: Dict, output: Path = OUTPUT_SEMANTIC, **save_options) -> None:
+    draw_layer("semantic", base, data, output, **save_options)
+
+
+def draw_pose_layer(base: Image.Image, data: Dict, output: Path = OUTPUT_POSE, **save_options) -> None:
+    draw_layer("pose", base, data, output, **save_options)
+
+
+def draw_overlay(layer: str, size: Tuple[int, int], data: Dict) -> Tuple[Optional[Image.Image], Optional[Tuple[int, int]]]:
+    """
+    Overlay layer: the annotations alone on a transparent canvas, cropped to
+    the bounding box of the painted pixels. Returns (image, (x, y) offset),
+    or (None, None) when the layer has nothing to draw.
+    """
+    image = Image.new("RGBA", size, (0, 0, 0, 0))
+    LAYER_PAINTERS[layer](image, data)
+    box = image.getchannel("A").getbbox()
+    if box is None:
+        return None, None
+    return image.crop(box), box[:2]
+
+
+def render_layers(image_path: Path, data: Dict, outputs: Dict[str, Path], **save_options) -> Dict[str, Path]:
+    """Darken the photo once and draw every layer in `outputs` on top of it."""
+    base = load_base_image(image_path)
+    for layer, output in outputs.items():
+        draw_layer(layer, base, data, output, **save_options)
+    return outputs
+
+
+def render_overlays(
+    image_path: Path, data: Dict, outputs: Dict[str, Path], base_output: Path, **save_options
+) -> Dict:
+    """
+    Write the darkened photo once (JPEG) and each layer as a cropped
+    transparent overlay. Returns the layout the front end needs to stack
+    them: image size, base file, and per-layer file + offset + size
+    (None for empty layers).
+    """
+    base = load_base_image(image_path)
+    base.convert("RGB").save(base_output, "JPEG", quality=BASE_JPEG_QUALITY)
+    layout = {"width": base.width, "height": base.height, "base": base_output.name, "layers": {}}
+    for layer, output in outputs.items():
+        overlay, offset = draw_overlay(layer, base.size, data)
+        if overlay is None:
+            layout["layers"][layer] = None
+            continue
+        save_layer(overlay, output, **save_options)
+        layout["layers"][layer] = {
+            "file": output.name,
+            "x": offset[0],
+            "y": offset[1],
+            "width": overlay.width,
+            "height": overlay.height,
+        }
+    return layout
+
+
+def render_scene(
+    task: Tuple[Path, Dict, Dict[str, Path], Optional[Path], Dict]
+) -> Tuple[int, Optional[str], Optional[Dict]]:
+    """
+    Process-pool entry point: render one scene, report (image_id, error or None,
+    overlay layout or None). A base path switches the scene to overlay mode.
+    """
+    image_path, data, outputs, base_output, save_options = task
+    try:
+        if base_output is not None:
+            layout = render_overlays(image_path, data, outputs, base_output, **save_options)
+        else:
+            layout = None
+            render_layers(image_path, data, outputs, **save_options)
+    except Exception as e:
+        return data["meta"]["image_id"], str(e), None
+    return data["meta"]["image_id"], None, layout
+
+
+def read_manifest(path: Path) -> List[int]:
+    """Image ids from a JSON list or a text file with one id per line (# starts a comment)."""
+    text = path.read_text(encoding="utf-8")
+    if text.lstrip().startswith("["):
+        return [int(image_id) for image_id in json.loads(text)]
+    ids = []
+    for line in text.splitlines():
+        line = line.split("#", 1)[0].strip()
+        if line:
+            ids.append(int(line))
+    return ids
+
+
+def render_batch(
+    image_ids: List[int],
+    output_dir: Path = OUTPUT_BATCH_DIR,
+    image_format: str = "png",
+    optimize: bool = False,
+    workers: int = NUM_WORKERS,
+    overlay: bool = True,
+) -> Dict:
+    """
+    Render all three layers for every image id across a process pool.
+
+    Annotations are looked up per image in the columnar caches, so the
+    COCO JSON files are not re-parsed. Writes an index.json that maps each
+    image id to its file name and layer images, and returns that index.
+    With overlay=True each image gets a darkened <id>_base.jpg plus cropped
+    transparent <id>_<layer>_overlay files, and the index records their offsets.
+    """
+    # Imported here so the single-image mode keeps working without the caches
+    from coco_cache import load_cache
+    from find_image import COCO_IMAGE_DIR, INSTANCES_PATH, KEYPOINTS_PATH, load_scene
+
+    instances = load_cache(INSTANCES_PATH)
+    keypoints = load_cache(KEYPOINTS_PATH) if os.path.exists(KEYPOINTS_PATH) else None
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    save_options = {"image_format": image_format, "optimize": optimize}
+    tasks = []
+    index = {}
+    # A repeated id would render twice into the same files
+    for image_id in dict.fromkeys(image_ids):
+        data = load_scene(image_id, instances, keypoints)
+        if data is None:
+            print(f"Skipping unknown image id {image_id}")
+            continue
+        suffix = "_overlay" if overlay else ""
+        outputs = {layer: output_dir / f"{image_id}_{layer}{suffix}.{image_format}" for layer in LAYERS}
+        base_output = output_dir / f"{image_id}_base.jpg" if overlay else None
+        tasks.append((Path(COCO_IMAGE_DIR) / data["meta"]["file_name"], data, outputs, base_output, save_options))
+        index[str(image_id)] = {
+            "file_name": data["meta"]["file_name"],
+            "layers": {layer: output.name for layer, output in outputs.items()},
+        }
+
+    if workers <= 1 or len(tasks) <= 1:
+        results = [render_scene(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(render_scene, tasks))
+
+    for image_id, error, layout in results:
+        if error is not None:
+            print(f"Failed to render image {image_id}: {error}")
+            index.pop(str(image_id), None)
+        elif layout is not None:
+            index[str(image_id)].update(layout)
+
+    with (output_dir / "index.json").open("w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2)
+    print(f"Rendered {len(index) * len(LAYERS)} layers for {len(index)} images in {output_dir}.")
+    return index
 
 
 def main() -> None:
-    data = load_data()
-    base = load_base_image()
+    parser = argparse.ArgumentParser(description="Render the spatial / semantic / pose hero layers.")
+    parser.add_argument("--manifest", type=Path, help="render every image id listed in this file (batch mode)")
+    parser.add_argument("--image-id", type=int, action="append", default=[], help="image id to render (repeatable)")
+    parser.add_argument("--output-dir", type=Path, default=OUTPUT_BATCH_DIR)
+    parser.add_argument("--format", choices=IMAGE_FORMATS, default="png")
+    parser.add_argument("--optimize", action="store_true", help="spend more time compressing PNG output")
+    parser.add_argument("--workers", type=int, default=NUM_WORKERS, help="render processes (1 = serial)")
+    parser.add_argument("--full-frame", action="store_true",
+                        help="write full-frame layers instead of cropped transparent overlays over one darkened base")
+    args = parser.parse_args()
+    overlay = not args.full_frame
+
+    image_ids = list(args.image_id)
+    if args.manifest:
+        image_ids += read_manifest(args.manifest)
+    if image_ids:
+        render_batch(image_ids, args.output_dir, args.format, args.optimize, args.workers, overlay)
+        return
 
-    draw_spatial_layer(base, data)
-    draw_semantic_layer(base, data)
-    draw_pose_layer(base, data)
-    print("Generated hero_spatial.png, hero_semantic.png, and hero_pose.png in src/data.")
+    data = load_data()
+    outputs = {
+        "spatial": OUTPUT_SPATIAL,
+        "semantic": OUTPUT_SEMANTIC,
+        "pose": OUTPUT_POSE,
+    }
+    if overlay:
+        outputs = {layer: output.with_name(f"{output.stem}_overlay.png") for layer, output in outputs.items()}
+    if args.format != "png":
+        outputs = {layer: output.with_suffix(f".{args.format}") for layer, output in outputs.items()}
+    save_options = {"image_format": args.format, "optimize": args.optimize}
+
+    if overlay:
+        layout = render_overlays(HERO_IMAGE, data, outputs, OUTPUT_BASE, **save_options)
+        with OUTPUT_LAYOUT.open("w", encoding="utf-8") as f:
+            json.dump(layout, f, indent=2)
+        print(f"Generated {OUTPUT_BASE.name}, {OUTPUT_LAYOUT.name} and overlays in {DATA_DIR}.")
+        return
+
+    render_layers(HERO_IMAGE, data, outputs, **save_options)
+    # The frontend prefers hero_layers.json, so a stale one would hide the new full frames
+    if OUTPUT_LAYOUT.exists():
+        OUTPUT_LAYOUT.unlink()
+        print(f"Removed stale {OUTPUT_LAYOUT.name}.")
+    print(f"Generated {', '.join(output.name for output in outputs.values())} in {DATA_DIR}.")
 
 
 if __name__ == "__main__":
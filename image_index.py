@@ -0,0 +1,256 @@
+"""
+逐图特征索引 - 为主图检索预先算好每张图片的标注统计，查询时只做向量化比较
+
+由 coco_cache 的 instances 列式缓存（可选再加 person_keypoints 缓存）构建，
+每列一个 .npy 文件，保存在 instances 缓存目录下的 image_index/ 中，
+之后以 mmap 方式打开。源缓存的指纹变化时自动重建（instances 缓存重建时
+整个目录会被替换，索引随之失效）。
+
+列（按 image_id 升序，每张图片一行，包括没有标注的图片）：
+- image_id           int64
+- file_name          unicode
+- person_count       uint16   person 标注数
+- object_count       uint16   标注总数（含 crowd 标注）
+- unique_categories  uint8    不同类别数
+- scale_mask         uint8    出现过的尺度：bit0 small / bit1 medium / bit2 large（按 bbox 宽 x 高）
+- category_bits      uint64 (N, W)  类别位图，第 k 位对应 categories 中第 k 个类别（按 ID 升序）
+- category_counts    uint8 (N, C)   每个类别的标注数（超过 255 记为 255）
+- keypoint_count     uint32   该图所有 person 标注的 num_keypoints 之和（没有关键点缓存时为 0）
+- first_annotation   int64    该图第一条标注在 annotations 中的位置（没有标注为 -1），
+                              用于按原始顺序打破得分平局
+"""
+
+import os
+
+import numpy as np
+
+from coco_cache import read_meta, write_columns
+
+INDEX_DIR_NAME = "image_index"
+# 索引格式版本，列定义变化时递增以强制重建
+INDEX_VERSION = 1
+
+# 尺度划分与 find_image 一致：Small < 32^2，Large > 96^2（按 bbox 宽 x 高）
+SMALL_AREA = 32 * 32
+LARGE_AREA = 96 * 96
+SCALE_BITS = {"small": 1, "medium": 2, "large": 4}
+
+COUNT_MAX = np.iinfo(np.uint8).max
+
+
+def index_dir_for(instances_cache):
+    return os.path.join(instances_cache.cache_dir, INDEX_DIR_NAME)
+
+
+def scale_bits(bboxes):
+    """每个 bbox 的尺度位 (SCALE_BITS)"""
+    area = bboxes[:, 2] * bboxes[:, 3]
+    return np.where(area < SMALL_AREA, SCALE_BITS["small"],
+                    np.where(area > LARGE_AREA, SCALE_BITS["large"], SCALE_BITS["medium"])).astype(np.uint8)
+
+
+def locate(keys, values):
+    """values 在升序数组 keys 中的下标，以及是否找到"""
+    pos = np.searchsorted(keys, values)
+    found = pos < len(keys)
+    found[found] = keys[pos[found]] == values[found]
+    return pos, found
+
+
+def build_columns(images_id, images_file_name, ann_image_id, ann_category_id, ann_bbox, categories,
+                  kp_image_id=None, kp_num_keypoints=None):
+    """由 images / annotations 的整列数据计算全部索引列，返回 {列名: 数组}"""
+    order = np.argsort(np.asarray(images_id), kind="stable")
+    image_ids = np.asarray(images_id, dtype=np.int64)[order]
+    file_names = np.asarray(images_file_name, dtype=str)[order]
+    num_images = len(image_ids)
+
+    cat_ids = np.array(sorted(category["id"] for category in categories), dtype=np.int64)
+    num_cats = len(cat_ids)
+
+    # 只统计图片和类别都存在的标注
+    ann_image_id = np.asarray(ann_image_id, dtype=np.int64)
+    ann_category_id = np.asarray(ann_category_id, dtype=np.int64)
+    row, image_found = locate(image_ids, ann_image_id)
+    col, category_found = locate(cat_ids, ann_category_id)
+    valid = image_found & category_found
+    positions = np.flatnonzero(valid)
+    row, col = row[valid], col[valid]
+
+    counts = np.bincount(row * num_cats + col, minlength=num_images * num_cats).reshape(num_images, num_cats)
+    present = counts > 0
+
+    names = {category["id"]: category["name"] for category in categories}
+    person = [k for k, cat_id in enumerate(cat_ids.tolist()) if names[cat_id] == "person"]
+    person_count = counts[:, person[0]] if person else np.zeros(num_images, dtype=np.int64)
+
+    # 类别位图：按位打包后补齐到 8 字节的整数倍，再按小端 uint64 读取
+    words = -(-num_cats // 64)
+    packed = np.packbits(present, axis=1, bitorder="little")
+    padded = np.zeros((num_images, words * 8), dtype=np.uint8)
+    padded[:, :packed.shape[1]] = packed
+    category_bits = padded.view("<u8").reshape(num_images, words)
+
+    bits = scale_bits(np.asarray(ann_bbox, dtype=np.float64)[positions])
+    scale_mask = np.zeros(num_images, dtype=np.uint8)
+    for bit in SCALE_BITS.values():
+        scale_mask |= np.where(np.bincount(row[bits == bit], minlength=num_images) > 0, bit, 0).astype(np.uint8)
+
+    first_annotation = np.full(num_images, -1, dtype=np.int64)
+    uniq_rows, first = np.unique(row, return_index=True)
+    first_annotation[uniq_rows] = positions[first]
+
+    keypoint_count = np.zeros(num_images, dtype=np.uint32)
+    if kp_image_id is not None:
+        kp_image_id = np.asarray(kp_image_id, dtype=np.int64)
+        kp_row, kp_valid = locate(image_ids, kp_image_id)
+        keypoint_count = np.bincount(
+            kp_row[kp_valid], weights=np.asarray(kp_num_keypoints)[kp_valid], minlength=num_images
+        ).astype(np.uint32)
+
+    return {
+        "image_id": image_ids,
+        "file_name": file_names,
+        "person_count": person_count.astype(np.uint16),
+        "object_count": np.bincount(row, minlength=num_images).astype(np.uint16),
+        "unique_categories": present.sum(axis=1).astype(np.uint8),
+        "scale_mask": scale_mask,
+        "category_bits": category_bits,
+        "category_counts": np.minimum(counts, COUNT_MAX).astype(np.uint8),
+        "keypoint_count": keypoint_count,
+        "first_annotation": first_annotation,
+    }
+
+
+class ImageIndex:
+    """逐图特征索引；列为 {列名: 数组}（来自 mmap 的 .npy 或内存中刚算好的结果）"""
+
+    def __init__(self, columns, categories, meta=None):
+        self.columns = columns
+        self.categories = sorted(categories, key=lambda category: category["id"])
+        self.meta = meta or {}
+        self.category_position = {category["name"]: k for k, category in enumerate(self.categories)}
+
+    @classmethod
+    def from_columns(cls, images_id, images_file_name, ann_image_id, ann_category_id, ann_bbox, categories,
+                     kp_image_id=None, kp_num_keypoints=None):
+        """不落盘，直接由整列数据构建（例如不使用缓存、逐条读取 JSON 时）"""
+        columns = build_columns(images_id, images_file_name, ann_image_id, ann_category_id, ann_bbox,
+                                categories, kp_image_id, kp_num_keypoints)
+        return cls(columns, categories)
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __len__(self):
+        return len(self.columns["image_id"])
+
+    def row_of(self, image_id):
+        """image_id 所在的行，不存在时返回 None"""
+        image_ids = self.columns["image_id"]
+        row = int(np.searchsorted(image_ids, image_id))
+        return row if row < len(image_ids) and image_ids[row] == image_id else None
+
+    def file_name(self, image_id):
+        row = self.row_of(image_id)
+        return None if row is None else str(self.columns["file_name"][row])
+
+    def query(self, categories=None, persons=None, min_objects=None, min_categories=None, scales=(),
+              min_keypoints=None):
+        """
+        返回满足全部条件的行号（升序）：
+        - categories:     {类别名: 最少标注数}，例如 {"dog": 2, "frisbee": 1}
+        - persons:        (最少, 最多) 人数，任一端为 None 表示不限
+        - min_objects:    最少标注数
+        - min_categories: 最少不同类别数
+        - scales:         必须同时出现的尺度，例如 ("small", "large")
+        - min_keypoints:  最少关键点总数
+        类别存在性先用位图整字比较，只有要求数量 > 1 的类别才读取计数列。
+        """
+        mask = np.ones(len(self), dtype=bool)
+
+        if categories:
+            unknown = [name for name in categories if name not in self.category_position]
+            if unknown:
+                raise KeyError(f"unknown categories: {unknown}")
+            required = np.zeros(self.columns["category_bits"].shape[1], dtype=np.uint64)
+            for name in categories:
+                k = self.category_position[name]
+                required[k // 64] |= np.uint64(1) << np.uint64(k % 64)
+            mask &= ((self.columns["category_bits"] & required) == required).all(axis=1)
+            for name, count in categories.items():
+                if count > 1:
+                    mask &= self.columns["category_counts"][:, self.category_position[name]] >= min(count, COUNT_MAX)
+
+        if persons is not None:
+            low, high = persons
+            if low is not None:
+                mask &= self.columns["person_count"] >= low
+            if high is not None:
+                mask &= self.columns["person_count"] <= high
+        if min_objects is not None:
+            mask &= self.columns["object_count"] >= min_objects
+        if min_categories is not None:
+            mask &= self.columns["unique_categories"] >= min_categories
+        if scales:
+            bits = np.uint8(sum(SCALE_BITS[name] for name in set(scales)))
+            mask &= (self.columns["scale_mask"] & bits) == bits
+        if min_keypoints is not None:
+            mask &= self.columns["keypoint_count"] >= min_keypoints
+
+        return np.flatnonzero(mask)
+
+
+def is_fresh(index_dir, instances_cache, keypoints_cache=None):
+    """版本一致、instances 缓存指纹一致；给出 keypoints 缓存时其指纹也需一致"""
+    meta = read_meta(index_dir)
+    return (
+        meta is not None
+        and meta.get("version") == INDEX_VERSION
+        and meta.get("instances") == instances_cache.meta["source"]
+        and (keypoints_cache is None or meta.get("person_keypoints") == keypoints_cache.meta["source"])
+    )
+
+
+def build_index(instances_cache, keypoints_cache=None, index_dir=None):
+    """由列式缓存计算索引并写出，返回索引目录"""
+    index_dir = index_dir or index_dir_for(instances_cache)
+    print(f"🗂️ Building image feature index -> {index_dir}")
+
+    kp_columns = {}
+    if keypoints_cache is not None:
+        kp_columns = {
+            "kp_image_id": keypoints_cache["ann_image_id"],
+            "kp_num_keypoints": keypoints_cache["ann_num_keypoints"],
+        }
+    columns = build_columns(
+        instances_cache["images_id"],
+        instances_cache["images_file_name"],
+        instances_cache["ann_image_id"],
+        instances_cache["ann_category_id"],
+        instances_cache["ann_bbox"],
+        instances_cache.categories,
+        **kp_columns,
+    )
+
+    meta = {
+        "version": INDEX_VERSION,
+        "instances": instances_cache.meta["source"],
+        "person_keypoints": keypoints_cache.meta["source"] if keypoints_cache is not None else None,
+        "num_images": len(columns["image_id"]),
+        "columns": sorted(columns),
+        "categories": instances_cache.categories,
+    }
+    write_columns(index_dir, columns, meta)
+    print(f"✅ Indexed {meta['num_images']} images")
+    return index_dir
+
+
+def load_index(instances_cache, keypoints_cache=None, rebuild=False):
+    """打开（必要时先重建）instances 缓存对应的逐图索引，各列以 mmap 方式读取"""
+    index_dir = index_dir_for(instances_cache)
+    if rebuild or not is_fresh(index_dir, instances_cache, keypoints_cache):
+        build_index(instances_cache, keypoints_cache, index_dir)
+    meta = read_meta(index_dir)
+    columns = {name: np.load(os.path.join(index_dir, name + ".npy"), mmap_mode="r") for name in meta["columns"]}
+    return ImageIndex(columns, meta["categories"], meta)
@@ -0,0 +1,71 @@
+"""
+在线统计量 - 分块更新、可合并的带掩码均值 / 方差 (Welford / Chan 并行合并)
+
+每个元素（例如每个关键点的 x / y）独立计数，掩码为 False 的值不参与统计。
+数据可以一块一块地送入 update()，不同进程 / 分片各自累积后再用 merge()
+合并，结果与一次性计算全部数据一致（只差浮点舍入），内存只与元素形状有关。
+"""
+
+import numpy as np
+
+
+def block_moments(values, mask):
+    """一块数据的 (有效计数, 均值, 离差平方和)"""
+    mask = np.broadcast_to(mask, values.shape)
+    count = mask.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(mask, values, 0.0).sum(axis=0) / count
+    mean = np.where(count > 0, mean, 0.0)
+    m2 = (np.where(mask, values - mean, 0.0) ** 2).sum(axis=0)
+    return count, mean, m2
+
+
+class MaskedMoments:
+    """
+    带掩码的在线均值 / 总体方差。
+
+    - rows:  送入的总行数（含全部被掩码的行）
+    - count: 每个元素的有效值数量
+    - mean / m2: 每个元素的均值与离差平方和
+    """
+
+    def __init__(self, shape):
+        self.rows = 0
+        self.count = np.zeros(shape, dtype=np.int64)
+        self.mean = np.zeros(shape)
+        self.m2 = np.zeros(shape)
+
+    @classmethod
+    def from_block(cls, values, mask):
+        """只含这一块数据的累积器；在子进程中计算，主进程 merge() 的结果与直接 update() 相同"""
+        moments = cls(values.shape[1:])
+        moments.rows = len(values)
+        moments.count, moments.mean, moments.m2 = block_moments(values, mask)
+        return moments
+
+    def update(self, values, mask):
+        """送入一块数据：values 形状为 (n, *shape)，mask 可广播到 values"""
+        self._combine(len(values), *block_moments(values, mask))
+
+    def merge(self, other):
+        """合并另一个累积器（例如其他进程的结果）"""
+        self._combine(other.rows, other.count, other.mean, other.m2)
+        return self
+
+    def _combine(self, rows, count, mean, m2):
+        total = self.count + count
+        with np.errstate(invalid="ignore", divide="ignore"):
+            weight = np.where(total > 0, count / total, 0.0)
+        delta = mean - self.mean
+        self.mean = self.mean + delta * weight
+        self.m2 = self.m2 + m2 + delta ** 2 * self.count * weight
+        self.count = total
+        self.rows += rows
+
+    def result(self):
+        """返回 (均值, 总体标准差)，没有有效值的元素为 NaN"""
+        valid = self.count > 0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(valid, self.mean, np.nan)
+            std = np.where(valid, np.sqrt(self.m2 / self.count), np.nan)
+        return mean, std
@@ -0,0 +1,62 @@
+"""
+一次性生成全部前端数据 - 每个 COCO 文件只解析一次
+
+等价于依次运行 process_spatial.py / process_semantic.py / process_pose.py /
+find_image.py，但 instances_train2017.json 只读一遍（空间、语义、主图
+三个阶段共用），person_keypoints 也只读一遍（姿态、主图共用）。
+
+输出：
+- spatial_data.bin (+ spatial_pyramid/) / semantic_data.json (+ semantic_cube.bin) / pose_stats.json / hero_data.json
+
+默认增量运行（见 build_graph.py）：源文件、阶段参数与代码都没有变化、输出也没有被
+改动的阶段直接跳过；--force 全部重新生成。
+"""
+
+import argparse
+
+from build_graph import MANIFEST_PATH, BuildManifest
+from coco_pipeline import SOURCE_PATHS, run_pipeline
+from find_image import HeroStage
+from process_pose import PoseStage
+from process_semantic import SemanticStage
+from process_spatial import SpatialStage
+from shards import NUM_WORKERS
+
+STAGES = {
+    "spatial": SpatialStage,
+    "semantic": SemanticStage,
+    "pose": PoseStage,
+    "hero": HeroStage,
+}
+# 按分片并行聚合的阶段（接受 workers 参数）
+SHARDED_STAGES = ("spatial", "semantic", "pose")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regenerate all COCO-Verse data files in one pass.")
+    parser.add_argument(
+        "--stages",
+        nargs="+",
+        choices=list(STAGES),
+        default=list(STAGES),
+        help="stages to run (default: all)",
+    )
+    for source, path in SOURCE_PATHS.items():
+        parser.add_argument(f"--{source.replace('_', '-')}", default=path, help=f"path to {source} JSON")
+    parser.add_argument("--no-cache", action="store_true", help="parse the JSON files directly, bypassing the columnar cache")
+    parser.add_argument("--workers", type=int, default=NUM_WORKERS, help="aggregation processes (1 = serial)")
+    parser.add_argument("--force", action="store_true", help="rerun every stage even if its outputs are up to date")
+    parser.add_argument("--manifest", default=MANIFEST_PATH, help="build manifest used to skip up-to-date stages")
+    args = parser.parse_args()
+
+    paths = {source: getattr(args, source) for source in SOURCE_PATHS}
+    # hero 在读取 instances 时就要打开关键点缓存（填充索引的关键点计数），需要知道实际的关键点文件
+    stage_kwargs = {name: {"workers": args.workers} for name in SHARDED_STAGES}
+    stage_kwargs["hero"] = {"keypoints_path": paths["person_keypoints"]}
+    stages = [STAGES[name](**stage_kwargs.get(name, {})) for name in args.stages]
+    run_pipeline(stages, paths=paths, use_cache=not args.no_cache, manifest=BuildManifest(args.manifest),
+                 force=args.force)
+
+
+if __name__ == "__main__":
+    main()
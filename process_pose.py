@@ -1,15 +1,28 @@
-import json
 import numpy as np
-from collections import defaultdict
-import random # 导入 random 模块
+from array import array
+
+from coco_pipeline import Stage, run_pipeline
+from online_stats import MaskedMoments
+from sampling import StratifiedReservoirSampler
+from shards import NUM_WORKERS, map_shards, range_shards
 
 # 假设的输入文件路径（请根据您的项目结构调整）
 INPUT_FILE = 'src/data/person_keypoints_train2017.json'
 OUTPUT_FILE = 'src/data/pose_stats.json' # 修改输出文件名以区分
-MAX_SAMPLES = 5000 # 新增：定义最大样本数量
+MAX_SAMPLES = 5000 # 前端散点图使用的标注采样数量（统计量基于全部标注）
+SAMPLE_SEED = 42 # 采样随机种子，保证每次生成的结果一致
+SAMPLE_ALLOCATION = 'proportional' # 按类别成比例分配样本名额
 
 # COCO 关键点的数量
 NUM_KEYPOINTS = 17
+# 每次送入在线统计的标注数量，内存占用只与块大小有关；
+# 使用列式缓存时每块即一个分片，由进程池并行计算部分结果
+CHUNK_SIZE = 1 << 16
+# 缓存路径传给 pose_partial() 的列，顺序与其参数一致
+CACHE_COLUMNS = ('ann_id', 'ann_category_id', 'ann_bbox', 'ann_keypoints', 'ann_has_keypoints')
+
+# 尺度名称，与 classify_scale 的返回值一致
+SCALE_NAMES = ('small', 'medium', 'large')
 
 def classify_scale(area):
     """
@@ -26,204 +39,268 @@ def classify_scale(area):
     else:
         return 'large'
 
+def classify_scales(areas):
+    """classify_scale 的数组版本，返回 SCALE_NAMES 的下标"""
+    return (areas >= 1024).astype(np.int64) + (areas > 9216)
+
 def get_category_name(category_id, categories_map):
     """根据 category_id 获取名称，处理缺失或不匹配的情况"""
     return categories_map.get(category_id, 'unknown')
 
-def normalize_keypoint(kps, bbox):
+def normalize_keypoints(keypoints, bboxes):
     """
-    将关键点坐标 (x, y) 归一化到边界框 (bbox) 空间。
+    将一批关键点坐标 (x, y) 归一化到各自的边界框 (bbox) 空间。
+    keypoints: (N, 17, 3)，bboxes: (N, 4) [x_min, y_min, w, h]。
+    返回 (N, 17, 2) 的归一化坐标，不可见的关键点 (v == 0) 为 NaN，
+    以及 (N, 17) 的可见性掩码。
     """
-    if not bbox or bbox[2] == 0 or bbox[3] == 0:
-        return None
-
-    # bbox[0] = x_min, bbox[1] = y_min, bbox[2] = w, bbox[3] = h
-    normalized_kps = []
-    
-    for i in range(0, len(kps), 3):
-        x, y, v = kps[i:i+3]
-        
-        # 仅处理可见的关键点 (v > 0)
-        if v > 0:
-            norm_x = (x - bbox[0]) / bbox[2]
-            norm_y = (y - bbox[1]) / bbox[3]
-            normalized_kps.extend([norm_x, norm_y, v])
-        else:
-            # 保持不可见点的格式
-            normalized_kps.extend([np.nan, np.nan, v]) # 使用 NaN 来标记不可见的坐标
-    
-    return normalized_kps
-
-def process_pose_data():
-    print(f"开始加载数据: {INPUT_FILE}...")
-    try:
-        with open(INPUT_FILE, 'r') as f:
-            data = json.load(f)
-    except FileNotFoundError:
-        print(f"错误: 找不到文件 {INPUT_FILE}。请检查路径。")
-        return
-    except json.JSONDecodeError:
-        print(f"错误: 文件 {INPUT_FILE} 不是有效的 JSON 格式。")
-        return
-
-    # --- 准备 COCO 映射数据 ---
-    # 1. 构建 Category ID 到名称的映射
-    categories_map = {cat['id']: cat['name'] for cat in data.get('categories', [])}
-    
-    # 2. 提取关键点元数据 (假设人是第一个类别)
-    person_category = next((c for c in data.get('categories', []) if c['name'] == 'person'), None)
-    if not person_category:
-        print("错误: COCO JSON 中未找到 'person' 类别元数据。无法继续。")
-        return
-        
-    KEYPOINT_NAMES = person_category['keypoints']
-    SKELETON_CONNECTIONS = person_category['skeleton']
-
-    # ⭐ 新增：处理标注以获取随机子集
-    all_annotations = data.get('annotations', [])
-    if not all_annotations:
-        print("错误: JSON 文件中未找到 'annotations' 列表。")
-        return
-        
-    original_annotation_count = len(all_annotations)
-    
-    # 随机洗牌
-    random.shuffle(all_annotations)
-    
-    # 截取前 MAX_SAMPLES 个标注
-    sampled_annotations = all_annotations[:MAX_SAMPLES]
-    sampled_count = len(sampled_annotations)
-    
-    print(f"原始标注数量: {original_annotation_count}。将随机处理 {sampled_count} 个标注。")
-
-    # --- 初始化用于存储前端所需数据的结构 ---
-    all_normalized_coords = []
-    keypoint_visibility_counts = np.zeros(NUM_KEYPOINTS)
-    total_annotations = 0
-    
-    # 收集用于前端图表的原始标注数据
-    frontend_annotations = [] 
-    
-    # 用于构建 categories 列表的统计结构
-    category_stats = defaultdict(lambda: {
-        'count': 0,
-        'scale_distribution': {'small': 0, 'medium': 0, 'large': 0}
-    })
-
-    print("开始处理采样的标注...")
-    # 遍历随机抽取的标注
-    for annotation in sampled_annotations:
-        # 确保是关键点标注，并且关键点数量正确
-        if 'keypoints' in annotation and len(annotation['keypoints']) == NUM_KEYPOINTS * 3:
-            
-            # 关键点和边界框
-            kps = annotation['keypoints']
-            bbox = annotation['bbox']
-            
-            # 归一化（注意：这里的归一化是针对边界框的）
-            normalized_kps = normalize_keypoint(kps, bbox)
-            
-            if normalized_kps is not None:
-                total_annotations += 1
-                
-                # 获取类别信息
-                category_id = annotation.get('category_id')
-                category_name = get_category_name(category_id, categories_map)
-                
-                # 计算尺度
-                area = bbox[2] * bbox[3] # 边界框面积
-                scale = classify_scale(area)
-
-                # --- 1. 提取坐标和更新统计量 (与之前逻辑相同) ---
-                coords = []
-                for i in range(NUM_KEYPOINTS):
-                    x, y, v = normalized_kps[i*3 : i*3 + 3]
-                    
-                    if v > 0:
-                        coords.append([x, y])
-                        keypoint_visibility_counts[i] += 1
-                    else:
-                        coords.append([np.nan, np.nan]) # 保持 NaN 标记
-                        
-                all_normalized_coords.append(coords)
-                
-                # --- 2. 收集用于前端的 Annotation 数据 ---
-                # 计算中心点 (使用归一化后的中心，即 0.5, 0.5)
-                # 注: 这里假设图片尺寸未知，使用一个占位值，但计算相对位置需要原始图片信息
-                # 为简化，保持原逻辑，并假设边界框坐标是相对于整个图片的。
-                img_w = 1 # 假设图片归一化到 1
-                img_h = 1 # 假设图片归一化到 1
-                
-                # 警告：这里 cx/cy/area 的归一化依赖于一个假设的图片尺寸，如果 COCO 文件没有图片尺寸，
-                # 这些值可能不准确。在您的原始代码中，这一点也存在。
-                cx_img_normalized = (bbox[0] + bbox[2] / 2) / img_w 
-                cy_img_normalized = (bbox[1] + bbox[3] / 2) / img_h
-                area_img_normalized = (bbox[2] * bbox[3]) / (img_w * img_h)
-
-                frontend_annotations.append({
-                    "id": annotation['id'],
-                    "category": category_name,
-                    "cx": cx_img_normalized,        # 目标中心点 X (0-1)
-                    "cy": cy_img_normalized,        # 目标中心点 Y (0-1)
-                    "area": area_img_normalized,    # 目标相对面积 (0-1)
-                    "scale": scale,
-                    # 'kps': normalized_kps # 可以选择不保存，以减小文件大小
-                })
-                
-                # --- 3. 更新类别统计 ---
-                category_stats[category_name]['count'] += 1
-                category_stats[category_name]['scale_distribution'][scale] += 1
-
-
-    if not all_normalized_coords:
-        print("未找到有效关键点标注。")
-        return
-
-    # --- 最终统计计算 ---
-    all_coords_np = np.array(all_normalized_coords)
-    # 使用 np.nanmean 和 np.nanstd 来计算平均姿态和标准差（忽略 NaN 值）
-    mean_pose = np.nanmean(all_coords_np, axis=0)
-    std_dev_pose = np.nanstd(all_coords_np, axis=0)
-    visibility_prob = keypoint_visibility_counts / total_annotations
-
-    # --- 格式化 Categories 列表 ---
-    sorted_categories = sorted(
-        category_stats.items(), 
-        key=lambda item: item[1]['count'], 
-        reverse=True
+    visible = keypoints[:, :, 2] > 0
+    origin = bboxes[:, None, :2]
+    size = bboxes[:, None, 2:4]
+    coords = (keypoints[:, :, :2] - origin) / size
+    coords[~visible] = np.nan # 使用 NaN 来标记不可见的坐标
+    return coords, visible
+
+def pose_partial(ids, cat_ids, bboxes, keypoints, has_keypoints=None):
+    """
+    处理一块标注，返回可合并的部分结果：筛选有效标注（关键点数量正确、边界框宽高非 0），
+    批量归一化后计算这一块的在线矩、类别尺度计数与待采样的条目。
+    has_keypoints 标记 JSON 中是否带有完整的关键点数组（缓存中对应 ann_has_keypoints 列），
+    没有关键点的标注在缓存中以全 0 填充，两条路径都据此把它们排除在统计之外。
+    """
+    partial = {'num_annotations': len(ids), 'moments': {}, 'scale_counts': [], 'sample': None}
+    valid = (bboxes[:, 2] != 0) & (bboxes[:, 3] != 0)
+    if has_keypoints is not None:
+        valid &= np.asarray(has_keypoints, dtype=bool)
+    rows = np.flatnonzero(valid)
+    if not len(rows):
+        return partial
+
+    bboxes = np.asarray(bboxes[rows], dtype=np.float64)
+    coords, visible = normalize_keypoints(np.asarray(keypoints[rows], dtype=np.float64), bboxes)
+    areas = bboxes[:, 2] * bboxes[:, 3] # 边界框面积
+    scales = classify_scales(areas)
+
+    partial['moments']['all'] = MaskedMoments.from_block(coords, visible[:, :, None])
+    for k, name in enumerate(SCALE_NAMES):
+        in_scale = scales == k
+        if in_scale.any():
+            partial['moments'][name] = MaskedMoments.from_block(coords[in_scale], visible[in_scale][:, :, None])
+
+    cat_ids = np.asarray(cat_ids[rows])
+    uniq_cats, cat_index = np.unique(cat_ids, return_inverse=True)
+    counts = np.bincount(
+        cat_index.reshape(-1) * len(SCALE_NAMES) + scales, minlength=len(uniq_cats) * len(SCALE_NAMES)
+    ).reshape(len(uniq_cats), len(SCALE_NAMES))
+    partial['scale_counts'] = list(zip(uniq_cats.tolist(), counts))
+
+    # 注: 图片尺寸未知，cx / cy / area 使用原始像素坐标（相当于图片尺寸为 1）
+    items = np.rec.fromarrays(
+        [np.asarray(ids[rows]), cat_ids, bboxes[:, 0] + bboxes[:, 2] / 2,
+         bboxes[:, 1] + bboxes[:, 3] / 2, areas, scales],
+        names='id,category_id,cx,cy,area,scale',
     )
-    
-    frontend_categories = []
-    for name, stats in sorted_categories:
-        frontend_categories.append({
-            'name': name,
-            'count': stats['count'],
-            'scale_distribution': stats['scale_distribution']
-        })
-
-    # --- 构造最终 JSON 对象 ---
-    pose_stats = {
-        'keypoints': KEYPOINT_NAMES,
-        'skeleton': SKELETON_CONNECTIONS,
-        'total_annotations': total_annotations,
-        'mean_pose': mean_pose.tolist(),
-        'std_dev_pose': std_dev_pose.tolist(),
-        'visibility_prob': visibility_prob.tolist(),
-        
-        # 包含前端所需的核心数据
-        'categories': frontend_categories,
-        'annotations': frontend_annotations 
-    }
-
-    # 保存到 JSON 文件
-    with open(OUTPUT_FILE, 'w') as f:
-        json.dump(pose_stats, f, indent=4)
-        
-    print(f"\n✅ 姿态统计数据处理完成。已保存至 {OUTPUT_FILE}")
-    print(f"总计处理了 {total_annotations} 条有效标注 (基于 {MAX_SAMPLES} 个随机样本)。")
-    print(f"总类别数：{len(frontend_categories)}")
+    partial['sample'] = (cat_ids, items)
+    return partial
+
+class PoseStage(Stage):
+    """姿态统计阶段：消费 person_keypoints 的 annotations / categories"""
+
+    name = 'pose'
+    sections = {'person_keypoints': ('annotations', 'categories')}
+    json_kwargs = {'indent': 4}
+
+    def __init__(self, output_file=OUTPUT_FILE, max_samples=MAX_SAMPLES, seed=SAMPLE_SEED, workers=NUM_WORKERS):
+        super().__init__()
+        self.output_file = output_file
+        self.max_samples = max_samples
+        self.seed = seed
+        self.workers = workers
+        self.categories = []
+        # 来自列式缓存的整列数据（mmap，按块读取）
+        self.columns = None
+        # 逐条读取 JSON 时先累积到紧凑的 typed array，满一块就送入统计
+        self.buffers = self.new_buffers()
+
+        # 全部标注及各尺度的在线均值 / 方差（每个关键点的 x / y）
+        self.moments = {name: MaskedMoments((NUM_KEYPOINTS, 2)) for name in ('all',) + SCALE_NAMES}
+        # category_id -> 各尺度数量
+        self.scale_counts = {}
+        self.num_annotations = 0
+        # 前端散点图使用的分层蓄水池采样，item 为 (id, category_id, cx, cy, area, scale)
+        self.sampler = StratifiedReservoirSampler(max_samples, SAMPLE_ALLOCATION, seed)
+
+    @staticmethod
+    def new_buffers():
+        return {
+            'ann_id': array('q'),
+            'ann_category_id': array('q'),
+            'ann_bbox': array('d'),
+            'ann_keypoints': array('d'),
+            'has_keypoints': array('B'),
+        }
+
+    def consume_cache(self, source, cache):
+        if 'ann_keypoints' not in cache:
+            return False
+        self.categories = list(cache.categories)
+        self.columns = {name: cache[name] for name in CACHE_COLUMNS}
+        return True
+
+    def consume(self, source, section, record):
+        if section == 'categories':
+            self.categories.append(record)
+            return
+        # 只保留后续用到的字段（丢弃 segmentation 等大字段）
+        buffers = self.buffers
+        kps = record.get('keypoints')
+        has_keypoints = kps is not None and len(kps) == NUM_KEYPOINTS * 3
+        buffers['ann_id'].append(record['id'])
+        buffers['ann_category_id'].append(record.get('category_id'))
+        buffers['ann_bbox'].extend(record['bbox'])
+        buffers['ann_keypoints'].extend(kps if has_keypoints else [0] * (NUM_KEYPOINTS * 3))
+        buffers['has_keypoints'].append(has_keypoints)
+        if len(buffers['ann_id']) >= CHUNK_SIZE:
+            self.flush()
+
+    def flush(self):
+        buffers = self.buffers
+        self.merge(pose_partial(
+            np.frombuffer(buffers['ann_id'], dtype=np.int64),
+            np.frombuffer(buffers['ann_category_id'], dtype=np.int64),
+            np.frombuffer(buffers['ann_bbox'], dtype=np.float64).reshape(-1, 4),
+            np.frombuffer(buffers['ann_keypoints'], dtype=np.float64).reshape(-1, NUM_KEYPOINTS, 3),
+            np.frombuffer(buffers['has_keypoints'], dtype=np.uint8).astype(bool),
+        ))
+        self.buffers = self.new_buffers()
+
+    def merge(self, partial):
+        """按块的原始顺序合并 pose_partial() 的结果（采样器的随机键因此与逐块处理时相同）"""
+        self.num_annotations += partial['num_annotations']
+        for name, moments in partial['moments'].items():
+            self.moments[name].merge(moments)
+        for cat_id, dist in partial['scale_counts']:
+            self.scale_counts[cat_id] = self.scale_counts.get(cat_id, 0) + dist
+        if partial['sample'] is not None:
+            self.sampler.add_batch(*partial['sample'])
+
+    def finalize(self):
+        if self.columns is not None:
+            columns = [self.columns[name] for name in CACHE_COLUMNS]
+            for partial in map_shards(pose_partial, range_shards(len(columns[0]), CHUNK_SIZE), columns,
+                                      workers=self.workers):
+                self.merge(partial)
+        else:
+            self.flush()
+
+        # --- 准备 COCO 映射数据 ---
+        # 1. 构建 Category ID 到名称的映射
+        categories_map = {cat['id']: cat['name'] for cat in self.categories}
+
+        # 2. 提取关键点元数据 (假设人是第一个类别)
+        person_category = next((c for c in self.categories if c['name'] == 'person'), None)
+        if not person_category:
+            print("错误: COCO JSON 中未找到 'person' 类别元数据。无法继续。")
+            return
+
+        KEYPOINT_NAMES = person_category['keypoints']
+        SKELETON_CONNECTIONS = person_category['skeleton']
+
+        if not self.num_annotations:
+            print("错误: JSON 文件中未找到 'annotations' 列表。")
+            return
+
+        total_annotations = self.moments['all'].rows
+        print(f"原始标注数量: {self.num_annotations}。在线统计了全部 {total_annotations} 个有效标注。")
+        if not total_annotations:
+            print("未找到有效关键点标注。")
+            return
+
+        # --- 最终统计：全部标注与各尺度 ---
+        def pose_summary(moments):
+            mean_pose, std_dev_pose = moments.result()
+            return {
+                'total_annotations': moments.rows,
+                'mean_pose': mean_pose.tolist(),
+                'std_dev_pose': std_dev_pose.tolist(),
+                # 每个关键点 x / y 的有效计数相同，取 x 的计数
+                'visibility_prob': (moments.count[:, 0] / moments.rows).tolist() if moments.rows else [],
+            }
+
+        overall = pose_summary(self.moments['all'])
+
+        # --- 类别与尺度统计（全部有效标注） ---
+        category_stats = {}
+        for cat_id, dist in self.scale_counts.items():
+            stats = category_stats.setdefault(get_category_name(cat_id, categories_map), {
+                'count': 0,
+                'scale_distribution': dict.fromkeys(SCALE_NAMES, 0)
+            })
+            stats['count'] += int(dist.sum())
+            for name, n in zip(SCALE_NAMES, dist.tolist()):
+                stats['scale_distribution'][name] += n
+
+        # --- 收集用于前端图表的标注数据（分层蓄水池采样，数量受 max_samples 限制） ---
+        frontend_annotations = [
+            {
+                "id": ann_id,
+                "category": get_category_name(cat_id, categories_map),
+                "cx": cx,        # 目标中心点 X
+                "cy": cy,        # 目标中心点 Y
+                "area": area,    # 目标面积
+                "scale": SCALE_NAMES[scale],
+            }
+            for ann_id, cat_id, cx, cy, area, scale in self.sampler.sample()
+        ]
+        print(f"为前端随机采样 {len(frontend_annotations)} 个标注。")
+
+        # --- 格式化 Categories 列表 ---
+        sorted_categories = sorted(
+            category_stats.items(),
+            key=lambda item: item[1]['count'],
+            reverse=True
+        )
+
+        frontend_categories = []
+        for name, stats in sorted_categories:
+            frontend_categories.append({
+                'name': name,
+                'count': stats['count'],
+                'scale_distribution': stats['scale_distribution']
+            })
+
+        # --- 构造最终 JSON 对象 ---
+        pose_stats = {
+            'keypoints': KEYPOINT_NAMES,
+            'skeleton': SKELETON_CONNECTIONS,
+            **overall,
+
+            # 按尺度 (small / medium / large) 的同类统计
+            'by_scale': {name: pose_summary(self.moments[name]) for name in SCALE_NAMES},
+
+            # 包含前端所需的核心数据
+            'categories': frontend_categories,
+            'annotations': frontend_annotations
+        }
+
+        return pose_stats
+
+    def params(self):
+        return {'max_samples': self.max_samples, 'seed': self.seed}
+
+    def write(self, pose_stats):
+        # 保存到 JSON 文件
+        super().write(pose_stats)
+
+        print(f"\n✅ 姿态统计数据处理完成。已保存至 {self.output_file}")
+        print(f"总计统计了 {pose_stats['total_annotations']} 条有效标注 (前端样本 {len(pose_stats['annotations'])} 个)。")
+        print(f"总类别数：{len(pose_stats['categories'])}")
+
+
+def process_pose_data(workers=NUM_WORKERS):
+    run_pipeline([PoseStage(workers=workers)], paths={'person_keypoints': INPUT_FILE})
 
 
 if __name__ == '__main__':
     # 这是一个示例调用
-    process_pose_data()
\ No newline at end of file
+    process_pose_data()
@@ -1,76 +1,505 @@
-﻿import json
+﻿import argparse
+import json
 import os
-import itertools
-from collections import defaultdict
+from array import array
+
+import numpy as np
+
+from coco_cache import ImageRowLookup
+from coco_pipeline import Stage, run_pipeline
+from force_layout import force_layout
+from shards import NUM_WORKERS, SHARD_SIZE, image_shards, map_shards
 
 DATA_DIR = os.path.join("src", "data")
 INPUT_FILE = os.path.join(DATA_DIR, "instances_train2017.json")
 OUTPUT_FILE = os.path.join(DATA_DIR, "semantic_data.json")
+# 分层共现立方体（按切片存放的上三角计数），元数据写在 semantic_data.json 的 "cube" 中
+CUBE_FILE = os.path.join(DATA_DIR, "semantic_cube.bin")
+
+# 关联度指标保留的小数位
+METRIC_DIGITS = 4
+# 每次参与矩阵乘法的图片数量，控制 incidence 块的内存 (块大小 x 类别数 float32)
+INCIDENCE_BLOCK = 1 << 15
+
+# 共现立方体的分层维度：每张图片按 主导物体（面积最大的标注）的超类、
+# 标注数量分桶、是否含 crowd 标注 落入一个切片
+OBJECT_COUNT_BUCKETS = (1, 2, 4, 8, 16)  # 各桶下界：1 / 2-3 / 4-7 / 8-15 / 16+
+CROWD_LABELS = ("no_crowd", "crowd")
+
+# 默认剪枝策略：每个类别保留共现次数最多的 TOP_K 个邻居（见 prune_edges）
+TOP_K = 8
+TOP_K_BY = "value"
+MIN_WEIGHT = 1
+MIN_PMI = None
+DISPARITY_ALPHA = None
+
+# 离线力导向布局，参数与 semantic_graph.js 中的 d3.forceSimulation 一致
+LAYOUT_SEED = 42
+LINK_DISTANCE = 160
+CHARGE_STRENGTH = -450
+NODE_RADIUS_RANGE = (20, 65)  # d3.scaleSqrt 把出现次数映射到节点半径
+COLLIDE_PADDING = 5
+COLLIDE_ITERATIONS = 2
+LAYOUT_DIGITS = 1
+
+# 每对类别的输出列（并列数组，与 pairs["source"] / pairs["target"] 一一对应）
+PAIR_COLUMNS = ("value", "p_target_given_source", "p_source_given_target", "lift", "pmi", "jaccard")
+
+
+def cooccurrence_matrix(image_ids, cat_index, num_cats):
+    """
+    由 (image_id, 类别下标) 构建 图片 x 类别 的 0/1 incidence 矩阵 X，
+    共现矩阵即 X^T X：对角线为每个类别出现的图片数，非对角为两两共现的图片数。
+    X 按图片分块构建（同一图片同一类别的多个标注重复置 1 即可，无需去重），
+    float32 累加对不超过 2^24 的计数是精确的。
+    返回 (共现矩阵 int64, 有标注的图片数)。
+    """
+    uniq_images, image_index = np.unique(image_ids, return_inverse=True)
+    image_index = image_index.reshape(-1)
+    num_images = len(uniq_images)
+    block_of = image_index // INCIDENCE_BLOCK
+
+    co = np.zeros((num_cats, num_cats), dtype=np.float32)
+    block = np.zeros((min(INCIDENCE_BLOCK, num_images), num_cats), dtype=np.float32)
+    for b in range(-(-num_images // INCIDENCE_BLOCK)):
+        in_block = block_of == b
+        block[:] = 0
+        block[image_index[in_block] - b * INCIDENCE_BLOCK, cat_index[in_block]] = 1
+        co += block.T @ block
+    return co.astype(np.int64), num_images
+
+
+def bucket_labels(lower_bounds):
+    """分桶下界 -> 标签，例如 (1, 2, 4) -> ["1", "2-3", "4+"]"""
+    labels = []
+    for low, high in zip(lower_bounds, lower_bounds[1:]):
+        labels.append(str(low) if high - low == 1 else f"{low}-{high - 1}")
+    labels.append(f"{lower_bounds[-1]}+")
+    return labels
+
+
+def image_strata(image_index, num_images, cat_index, areas, iscrowd, cat_super):
+    """
+    每张图片所在的切片下标（按 [主导超类][数量分桶][crowd] 行优先展开）：
+    - 主导超类：面积最大的标注所属类别的超类（面积相同时取先出现的）
+    - 数量分桶：图片中的标注总数（含 crowd 标注）按 OBJECT_COUNT_BUCKETS 分桶
+    - crowd：图片中是否有 iscrowd 标注
+    """
+    # 按 (图片, 面积降序) 排序后，每张图片的第一条即面积最大的标注
+    order = np.lexsort((-areas, image_index))
+    first = np.searchsorted(image_index[order], np.arange(num_images))
+    dominant = cat_super[cat_index[order[first]]]
+
+    num_objects = np.bincount(image_index, minlength=num_images)
+    bucket = np.searchsorted(OBJECT_COUNT_BUCKETS, num_objects, side="right") - 1
+    crowd = np.bincount(image_index, weights=iscrowd > 0, minlength=num_images) > 0
+
+    num_buckets = len(OBJECT_COUNT_BUCKETS)
+    return (dominant * num_buckets + bucket) * len(CROWD_LABELS) + crowd
+
+
+def cooccurrence_cube(image_ids, cat_index, num_cats, areas, iscrowd, cat_super, num_supers):
+    """
+    按切片计算共现矩阵：返回 (cube, 每个切片的图片数)，cube 形状为 (切片数, 类别数, 类别数)。
+    每张图片只属于一个切片，因此 cube.sum(axis=0) 就是全局共现矩阵。
+    """
+    uniq_images, image_index = np.unique(image_ids, return_inverse=True)
+    image_index = image_index.reshape(-1)
+    num_strata = num_supers * len(OBJECT_COUNT_BUCKETS) * len(CROWD_LABELS)
+    strata = image_strata(image_index, len(uniq_images), cat_index, areas, iscrowd, cat_super)
+
+    # 按切片把标注排成连续的段，每段单独做 incidence 矩阵乘法
+    ann_strata = strata[image_index]
+    order = np.argsort(ann_strata, kind="stable")
+    bounds = np.concatenate(([0], np.cumsum(np.bincount(ann_strata, minlength=num_strata))))
+
+    cube = np.zeros((num_strata, num_cats, num_cats), dtype=np.int64)
+    images = np.zeros(num_strata, dtype=np.int64)
+    for k in np.flatnonzero(np.diff(bounds)).tolist():
+        segment = order[bounds[k]:bounds[k + 1]]
+        cube[k], images[k] = cooccurrence_matrix(image_index[segment], cat_index[segment], num_cats)
+    return cube, images
+
+
+def cube_partial(image_ids, category_ids, areas, iscrowd, cat_ids, cat_super, num_supers):
+    """
+    一个分片（若干张图片的全部标注）的 (共现立方体, 每个切片的图片数)。
+    主导超类、数量分桶与 crowd 只取决于同一张图片的标注，因此按图片分片后
+    各分片的整数计数直接相加，就等于对全部标注调用 cooccurrence_cube。
+    """
+    category_ids = np.asarray(category_ids, dtype=np.int64)
+    # 不在 categories 中的标注不参与统计
+    known = np.isin(category_ids, cat_ids)
+    cat_index = np.searchsorted(cat_ids, category_ids[known])
+    return cooccurrence_cube(
+        np.asarray(image_ids, dtype=np.int64)[known],
+        cat_index,
+        len(cat_ids),
+        np.asarray(areas, dtype=np.float64)[known],
+        np.asarray(iscrowd, dtype=np.uint8)[known],
+        cat_super,
+        num_supers,
+    )
+
+
+def write_cube(path, cube):
+    """每个切片只写上三角（含对角线，行优先），uint32 小端，切片依次存放"""
+    rows, cols = np.triu_indices(cube.shape[1])
+    cube[:, rows, cols].astype("<u4").tofile(path)
+
+
+def cube_metadata(path, cat_ids, super_names, images):
+    num_cats = len(cat_ids)
+    return {
+        "file": os.path.basename(path),
+        "dtype": "uint32",
+        "byte_order": "little",
+        "layout": "slice-major; per slice the upper triangle of the category x category matrix "
+                  "(diagonal included, row-major), categories in ascending id order",
+        "categories": [int(cat_id) for cat_id in cat_ids],
+        "slice_length": num_cats * (num_cats + 1) // 2,
+        "dims": [
+            {"name": "dominant_supercategory", "labels": list(super_names)},
+            {"name": "object_count", "labels": bucket_labels(OBJECT_COUNT_BUCKETS)},
+            {"name": "crowd", "labels": list(CROWD_LABELS)},
+        ],
+        # 每个切片的图片数（与切片同序），用于在筛选后重新计算 lift / PMI
+        "images": images.tolist(),
+    }
+
+
+def association_metrics(co, num_images):
+    """
+    由共现矩阵一次性算出：
+    - conditional[a, b] = P(b | a) = C_ab / C_a
+    - lift[a, b]        = P(a, b) / (P(a) P(b)) = C_ab N / (C_a C_b)
+    - pmi[a, b]         = log2(lift)
+    - jaccard[a, b]     = C_ab / (C_a + C_b - C_ab)
+    没有共现 (C_ab == 0) 的位置为 0（pmi 无定义，同样置 0）。
+    """
+    counts = np.diag(co).astype(np.float64)
+    co = co.astype(np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        conditional = co / counts[:, None]
+        lift = co * num_images / np.outer(counts, counts)
+        pmi = np.log2(lift)
+        jaccard = co / (counts[:, None] + counts[None, :] - co)
+    present = co > 0
+    return {
+        name: np.where(present, values, 0.0)
+        for name, values in (
+            ("conditional", conditional),
+            ("lift", lift),
+            ("pmi", pmi),
+            ("jaccard", jaccard),
+        )
+    }
+
+
+def disparity_alpha(weights):
+    """
+    Disparity filter (Serrano et al., 2009) 的显著性：
+    节点 i 的强度 s_i、度 k_i，边 (i, j) 的 alpha_ij = (1 - w_ij / s_i) ^ (k_i - 1)，
+    即在 i 的权重均匀随机分配的零假设下，这条边至少这么重的概率。
+    weights 为对称的非负权重矩阵（对角为 0），返回同形状的 alpha 矩阵（无边处为 1）。
+    只有一条边的节点 (k_i == 1) 无法判断，alpha 记为 0（保留）。
+    """
+    strength = weights.sum(axis=1, keepdims=True)
+    degree = (weights > 0).sum(axis=1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        share = np.where(weights > 0, weights / strength, 0.0)
+    alpha = (1.0 - share) ** np.maximum(degree - 1, 0)
+    alpha[(weights > 0) & (degree == 1)] = 0.0
+    alpha[weights == 0] = 1.0
+    return alpha
+
+
+def prune_edges(co, metrics, top_k=TOP_K, top_k_by=TOP_K_BY, min_weight=MIN_WEIGHT,
+                min_pmi=MIN_PMI, disparity=DISPARITY_ALPHA):
+    """
+    返回共现图中保留的边（对称的布尔矩阵，对角为 False）。每个启用的策略都是一层过滤，
+    边需要全部通过：
+    - min_weight: 共现次数至少为 min_weight
+    - min_pmi:    PMI 至少为 min_pmi
+    - top_k:      属于任一端点按 top_k_by（value / lift / pmi / jaccard）排序的前 k 个邻居
+    - disparity:  disparity filter 的 alpha 在任一端点小于该显著性水平（骨干网络）
+    取 None 表示不启用对应策略。
+    """
+    weights = co.astype(np.float64)
+    np.fill_diagonal(weights, 0)
+    keep = weights > 0
+    if min_weight is not None:
+        keep &= weights >= min_weight
+    if min_pmi is not None:
+        keep &= metrics["pmi"] >= min_pmi
+    if disparity is not None:
+        alpha = disparity_alpha(weights)
+        significant = alpha < disparity
+        keep &= significant | significant.T
+    if top_k is not None:
+        score = weights if top_k_by == "value" else metrics[top_k_by]
+        # 已被前面的策略剔除的边不占用名额
+        score = np.where(keep, score, -np.inf)
+        k = min(top_k, len(score))
+        ranked = np.zeros_like(keep)
+        if k > 0:
+            top = np.argpartition(-score, k - 1, axis=1)[:, :k]
+            np.put_along_axis(ranked, top, True, axis=1)
+        keep &= ranked | ranked.T
+    return keep
+
 
-def process_semantic_data():
-    print(f"Loading data from {INPUT_FILE} (this can take a moment)...")
-    try:
-        with open(INPUT_FILE, "r", encoding="utf-8") as f:
-            coco_data = json.load(f)
-    except FileNotFoundError:
-        print(f"Error: {INPUT_FILE} not found. Please place the file in src/data.")
-        return
-
-    print("Data loaded. Building category maps...")
-
-    categories = {cat["id"]: cat["name"] for cat in coco_data["categories"]}
-    print(f"Found {len(categories)} categories.")
-
-    img_to_cats = defaultdict(set)
-    annotations = coco_data["annotations"]
-    total_anns = len(annotations)
-
-    for i, ann in enumerate(annotations):
-        img_to_cats[ann["image_id"]].add(ann["category_id"])
-        if i and i % 100000 == 0:
-            print(f"Processed {i}/{total_anns} annotations...")
-
-    co_occurrence = defaultdict(int)
-    category_counts = defaultdict(int)
-
-    print("Computing co-occurrence counts...")
-    for cats in img_to_cats.values():
-        unique_cats = list(cats)
-        for cat in unique_cats:
-            category_counts[cat] += 1
-        if len(unique_cats) > 1:
-            for u, v in itertools.combinations(sorted(unique_cats), 2):
-                co_occurrence[(u, v)] += 1
+def pruning_options(top_k=TOP_K, top_k_by=TOP_K_BY, min_weight=MIN_WEIGHT, min_pmi=MIN_PMI,
+                    disparity=DISPARITY_ALPHA):
+    """剪枝参数（prune_edges 的关键字参数），未给出的取模块默认值"""
+    return {
+        "top_k": top_k,
+        "top_k_by": top_k_by,
+        "min_weight": min_weight,
+        "min_pmi": min_pmi,
+        "disparity": disparity,
+    }
+
+
+def node_radii(counts, radius_range=NODE_RADIUS_RANGE):
+    """与前端 d3.scaleSqrt().domain(extent(count)).range(radius_range) 相同的节点半径"""
+    roots = np.sqrt(np.maximum(np.asarray(counts, dtype=np.float64), 1))
+    low, high = roots.min(), roots.max()
+    t = (roots - low) / (high - low) if high > low else np.full_like(roots, 0.5)
+    return radius_range[0] + t * (radius_range[1] - radius_range[0])
+
+
+def layout_nodes(counts, sources, targets, seed=LAYOUT_SEED):
+    """在剪枝后的边上计算力导向布局，返回每个节点的 (x, y)，重心位于原点"""
+    return force_layout(
+        len(counts), sources, targets, node_radii(counts),
+        link_distance=LINK_DISTANCE,
+        charge=CHARGE_STRENGTH,
+        collide_padding=COLLIDE_PADDING,
+        collide_iterations=COLLIDE_ITERATIONS,
+        seed=seed,
+    )
+
+
+def build_semantic_graph(categories, co, num_images, pruning=None, layout_seed=LAYOUT_SEED):
+    """
+    由类别表 {id: name} 与按类别 ID 排序的共现矩阵生成 semantic_data：
+    - nodes: 每个类别一个节点，x / y 为在剪枝后的边上离线计算的布局坐标
+    - pairs: 所有有共现的类别对 (source ID < target ID)，按列存为并列数组
+    - edges: 剪枝后保留的边在 pairs 中的下标（力导向图只使用这些边）
+    - pruning: 使用的剪枝参数与边数
+    """
+    pruning = pruning_options(**(pruning or {}))
+    cat_ids = np.array(sorted(categories), dtype=np.int64)
+    metrics = association_metrics(co, num_images)
+    counts = dict(zip(cat_ids.tolist(), np.diag(co).tolist()))
+
+    # 上三角 (source ID < target ID) 中有共现的类别对
+    upper = np.triu(co, k=1)
+    src, dst = np.nonzero(upper)
+    keep = prune_edges(co, metrics, **pruning)
+    edges = np.flatnonzero(keep[src, dst])
+
+    # 节点按 categories 的顺序输出；布局在按类别 ID 排序的下标上计算
+    order = np.searchsorted(cat_ids, list(categories))
+    positions = layout_nodes(np.diag(co), src[edges], dst[edges], layout_seed)
+    positions = np.round(positions[order], LAYOUT_DIGITS).tolist()
 
     nodes = [
         {
             "id": cat_id,
             "name": name,
-            "count": category_counts[cat_id],
+            "count": counts[cat_id],
             "group": 1,
+            "x": x,
+            "y": y,
         }
-        for cat_id, name in categories.items()
+        for (cat_id, name), (x, y) in zip(categories.items(), positions)
     ]
+    pair_values = {
+        "value": upper[src, dst],
+        "p_target_given_source": metrics["conditional"][src, dst],
+        "p_source_given_target": metrics["conditional"][dst, src],
+        "lift": metrics["lift"][src, dst],
+        "pmi": metrics["pmi"][src, dst],
+        "jaccard": metrics["jaccard"][src, dst],
+    }
+    pairs = {"source": cat_ids[src].tolist(), "target": cat_ids[dst].tolist()}
+    for name in PAIR_COLUMNS:
+        values = pair_values[name]
+        pairs[name] = values.tolist() if name == "value" else np.round(values, METRIC_DIGITS).tolist()
 
-    min_edge_weight = min(co_occurrence.values()) if co_occurrence else 0
-    max_edge_weight = max(co_occurrence.values()) if co_occurrence else 0
-
-    links = [
-        {"source": source, "target": target, "value": weight}
-        for (source, target), weight in co_occurrence.items()
-    ]
-
-    output_data = {"nodes": nodes, "links": links}
+    edges = edges.tolist()
 
+    min_edge_weight = int(upper[src, dst].min()) if len(src) else 0
+    max_edge_weight = int(upper[src, dst].max()) if len(src) else 0
     print(
-        f"Done. Nodes: {len(nodes)}, links: {len(links)} "
-        f"(edge weights {min_edge_weight}~{max_edge_weight}, no edges filtered)."
+        f"Done. Nodes: {len(nodes)}, pairs: {len(src)} (edge weights {min_edge_weight}~{max_edge_weight}), "
+        f"edges kept after pruning: {len(edges)}."
     )
 
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(output_data, f, ensure_ascii=False, indent=2)
+    return {
+        "nodes": nodes,
+        "num_images": num_images,
+        "pairs": pairs,
+        "edges": edges,
+        "pruning": {**pruning, "num_pairs": len(src), "num_edges": len(edges)},
+        "layout": {"seed": layout_seed, "link_distance": LINK_DISTANCE, "charge": CHARGE_STRENGTH},
+    }
+
+
+class SemanticStage(Stage):
+    """语义共现阶段：每个类别一个节点，每对共现的类别一条边，另写出分层共现立方体"""
+
+    name = "semantic"
+    sections = {"instances": ("annotations", "categories")}
+    # 紧凑输出：不缩进、不加空格（类别对已按列存放）
+    json_kwargs = {"ensure_ascii": False, "separators": (",", ":")}
+
+    def __init__(self, output_file=OUTPUT_FILE, pruning=None, cube_file=CUBE_FILE, workers=NUM_WORKERS):
+        super().__init__()
+        self.output_file = output_file
+        self.cube_file = cube_file
+        self.workers = workers
+        self.cube = None
+        self.pruning = pruning_options(**(pruning or {}))
+        # categories 段位于文件末尾，边读边收集即可
+        self.categories = {}
+        self.supercategories = {}
+        # 来自列式缓存的整列数据与按图片查找的索引；逐条读取 JSON 时先累积到紧凑的 typed array
+        self.columns = None
+        self.lookup = None
+        self.image_ids = array("q")
+        self.category_ids = array("q")
+        self.areas = array("d")
+        self.iscrowd = array("B")
+
+    def add_category(self, record):
+        self.categories[record["id"]] = record["name"]
+        self.supercategories[record["id"]] = record.get("supercategory", "unknown")
+
+    def consume_cache(self, source, cache):
+        for record in cache.categories:
+            self.add_category(record)
+        self.columns = {
+            "image_id": cache["ann_image_id"],
+            "category_id": cache["ann_category_id"],
+            "area": cache["ann_area"],
+            "iscrowd": cache["ann_iscrowd"],
+        }
+        self.lookup = ImageRowLookup.load(cache.cache_dir, cache["ann_image_id"])
+        return True
+
+    def consume(self, source, section, record):
+        if section == "categories":
+            self.add_category(record)
+            return
+        self.image_ids.append(record["image_id"])
+        self.category_ids.append(record["category_id"])
+        self.areas.append(record.get("area", 0))
+        self.iscrowd.append(record.get("iscrowd", 0))
+        if len(self.image_ids) % 100000 == 0:
+            print(f"Processed {len(self.image_ids)} annotations...")
+
+    def finalize(self):
+        if self.columns is not None:
+            columns = [self.columns[name] for name in ("image_id", "category_id", "area", "iscrowd")]
+            lookup = self.lookup
+        else:
+            columns = [
+                np.frombuffer(self.image_ids, dtype=np.int64),
+                np.frombuffer(self.category_ids, dtype=np.int64),
+                np.frombuffer(self.areas, dtype=np.float64),
+                np.frombuffer(self.iscrowd, dtype=np.uint8),
+            ]
+            lookup = ImageRowLookup.build(columns[0])
+
+        categories = self.categories
+        print(f"Data loaded. Found {len(categories)} categories, {len(columns[0])} annotations.")
+
+        # 类别按 ID 排序编号；超类按首次出现的顺序编号
+        cat_ids = np.array(sorted(categories), dtype=np.int64)
+        super_names = list(dict.fromkeys(self.supercategories[cat_id] for cat_id in categories))
+        cat_super = np.array([super_names.index(self.supercategories[cat_id]) for cat_id in cat_ids.tolist()])
+
+        # 按图片分片并行计算，各分片的整数计数相加
+        shards = image_shards(lookup, SHARD_SIZE)
+        print(f"Computing co-occurrence cube ({len(shards)} shards, {self.workers} workers)...")
+        num_strata = len(super_names) * len(OBJECT_COUNT_BUCKETS) * len(CROWD_LABELS)
+        cube = np.zeros((num_strata, len(cat_ids), len(cat_ids)), dtype=np.int64)
+        images = np.zeros(num_strata, dtype=np.int64)
+        shared = (cat_ids, cat_super, len(super_names))
+        for shard_cube, shard_images in map_shards(cube_partial, shards, columns, shared, self.workers):
+            cube += shard_cube
+            images += shard_images
+        self.cube = cube
+        data = build_semantic_graph(categories, cube.sum(axis=0), int(images.sum()), self.pruning)
+        data["cube"] = cube_metadata(self.cube_file, cat_ids, super_names, images)
+        print(f"Cube: {len(super_names)} supercategories x {len(OBJECT_COUNT_BUCKETS)} object-count buckets "
+              f"x {len(CROWD_LABELS)} crowd flags ({np.count_nonzero(images)} non-empty slices).")
+        return data
+
+    def params(self):
+        return {"pruning": self.pruning}
+
+    def outputs(self):
+        return [self.output_file, self.cube_file]
+
+    def write(self, data):
+        super().write(data)
+        if self.cube is not None:
+            write_cube(self.cube_file, self.cube)
+            size = os.path.getsize(self.cube_file) / (1024 * 1024)
+            print(f"💾 [{self.name}] Saved co-occurrence cube to {self.cube_file} ({size:.2f} MB)")
+
+
+def process_semantic_data(pruning=None, workers=NUM_WORKERS):
+    run_pipeline([SemanticStage(pruning=pruning, workers=workers)], paths={"instances": INPUT_FILE})
+
+
+def convert_json(json_path, num_images, pruning=None, output_file=OUTPUT_FILE):
+    """
+    把旧版 semantic_data.json（nodes + links 列表）转换为新格式，不重新读取 COCO 标注：
+    节点的 count 即共现矩阵对角线，links 即非对角元素。旧文件没有记录图片数，需要给出。
+    旧文件没有逐图信息，因此不生成分层共现立方体。
+    """
+    with open(json_path, "r", encoding="utf-8-sig") as f:
+        data = json.load(f)
+
+    categories = {node["id"]: node["name"] for node in data["nodes"]}
+    cat_ids = sorted(categories)
+    index = {cat_id: i for i, cat_id in enumerate(cat_ids)}
+    co = np.zeros((len(cat_ids), len(cat_ids)), dtype=np.int64)
+    for node in data["nodes"]:
+        co[index[node["id"]], index[node["id"]]] = node["count"]
+    for link in data["links"]:
+        a, b = index[link["source"]], index[link["target"]]
+        co[a, b] = co[b, a] = link["value"]
+
+    stage = SemanticStage(output_file, pruning)
+    stage.write(build_semantic_graph(categories, co, num_images, stage.pruning))
+    print("⚠️ 旧文件没有逐图信息，输出不含分层共现立方体 (cube)，前端的分层筛选将不可用；"
+          "请用 process_semantic.py（不加 --from-json）从 COCO 标注重新生成")
 
-    print(f"Saved semantic graph data to: {OUTPUT_FILE}")
 
 if __name__ == "__main__":
-    process_semantic_data()
+    parser = argparse.ArgumentParser(description="Generate the semantic co-occurrence graph.")
+    parser.add_argument("--top-k", type=int, default=TOP_K, help="neighbors kept per category (0 disables)")
+    parser.add_argument("--top-k-by", choices=("value", "lift", "pmi", "jaccard"), default=TOP_K_BY,
+                        help="score used to rank neighbors for --top-k")
+    parser.add_argument("--min-weight", type=int, default=MIN_WEIGHT, help="minimum co-occurrence count")
+    parser.add_argument("--min-pmi", type=float, default=MIN_PMI, help="minimum PMI (log2)")
+    parser.add_argument("--disparity", type=float, default=DISPARITY_ALPHA, metavar="ALPHA",
+                        help="keep only the disparity-filter backbone at this significance level")
+    parser.add_argument("--from-json", metavar="PATH", help="convert an existing semantic_data.json instead of reading COCO")
+    parser.add_argument("--num-images", type=int, help="number of annotated images (required with --from-json)")
+    parser.add_argument("--workers", type=int, default=NUM_WORKERS, help="aggregation processes (1 = serial)")
+    args = parser.parse_args()
+
+    pruning = pruning_options(args.top_k or None, args.top_k_by, args.min_weight, args.min_pmi, args.disparity)
+    if args.from_json:
+        if args.num_images is None:
+            parser.error("--from-json requires --num-images")
+        convert_json(args.from_json, args.num_images, pruning)
+    else:
+        process_semantic_data(pruning, args.workers)
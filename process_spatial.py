@@ -3,23 +3,40 @@
 生成用于空间/尺度分析的 JSON 数据文件
 
 输出数据结构：
-- spatial_data.json: 包含采样的标注数据、类别统计、空间网格聚合
+- spatial_data.bin: 列式二进制 —— 采样标注按列存放 (Float32 / Uint16 等)，
+  类别 / 超类统计、尺度直方图与类别字典放在文件开头的 JSON 头中
+- spatial_pyramid/: 多分辨率中心点热力图金字塔 (uint32 二进制，每个分辨率一个文件)
+  与描述其布局的 index.json，前端按需只取当前分辨率、当前类别的那一段
 """
 
+import argparse
 import json
 import os
-import random
-from collections import defaultdict
+import struct
 import math
+from array import array
+
+import numpy as np
+
+from coco_pipeline import Stage, run_pipeline
+from quantiles import BOX_PERCENTILES, QUANTILE_KEYS, grouped_quantiles
+from sampling import ALLOCATIONS, StratifiedReservoirSampler
+from shards import NUM_WORKERS, SHARD_SIZE, map_shards, range_shards
 
 DATA_DIR = os.path.join("src", "data")
 INPUT_FILE = os.path.join(DATA_DIR, "instances_train2017.json")
-OUTPUT_FILE = os.path.join(DATA_DIR, "spatial_data.json")
+OUTPUT_FILE = os.path.join(DATA_DIR, "spatial_data.bin")
+PYRAMID_DIR = os.path.join(DATA_DIR, "spatial_pyramid")
 
 # 采样数量：控制前端性能，同时保证代表性
 SAMPLE_SIZE = 8000
-# 空间网格分辨率 (用于热力图预聚合)
-GRID_SIZE = 20
+# 按类别分层采样的名额分配策略 (equal / proportional / sqrt) 与随机种子
+SAMPLE_ALLOCATION = "equal"
+SAMPLE_SEED = 42
+# 分块送入采样器，随机键等临时数组只占 O(块大小) 内存
+SAMPLE_CHUNK = 1 << 16
+# 热力图金字塔各层每边的格子数 (均须整除最细一层)
+HEATMAP_LEVELS = (8, 16, 32, 64, 128)
 
 # COCO 官方尺度阈值 (像素面积)
 SCALE_THRESHOLDS = {
@@ -27,6 +44,26 @@ SCALE_THRESHOLDS = {
     "medium": 96 * 96,     # 1024 ~ 9216
     "large": float("inf")  # > 9216
 }
+SCALE_NAMES = ("small", "medium", "large")
+
+# 二进制输出：文件头标识、格式版本与标注列定义 (列名, 小端 dtype)
+BINARY_MAGIC = b"CVSP"
+BINARY_VERSION = 1
+ANNOTATION_COLUMNS = (
+    ("id", "<f8"),          # crowd 标注的 ID 超出 uint32，float64 可精确表示
+    ("image_id", "<u4"),
+    ("category", "<u2"),    # dictionaries.category 的下标
+    ("cx", "<f4"),
+    ("cy", "<f4"),
+    ("width", "<f4"),
+    ("height", "<f4"),
+    ("area", "<f4"),
+    ("aspect_ratio", "<f4"),
+    ("raw_area", "<f4"),
+    ("scale", "u1"),        # dictionaries.scale 的下标
+)
+# 类别/超类摘要中 area_stats / aspect_ratio_stats 的字段顺序
+STAT_KEYS = ("mean", "min", "max", "median", "p5", "p25", "p75", "p95")
 
 
 def get_scale_category(area):
@@ -39,235 +76,636 @@ def get_scale_category(area):
         return "large"
 
 
-def process_spatial_data():
-    print(f"📂 Loading data from {INPUT_FILE}...")
-    
-    try:
-        with open(INPUT_FILE, "r", encoding="utf-8") as f:
-            coco_data = json.load(f)
-    except FileNotFoundError:
-        print(f"❌ Error: {INPUT_FILE} not found.")
-        print("Please place instances_train2017.json in src/data/")
-        return
-
-    # 构建类别映射
-    categories = {cat["id"]: cat["name"] for cat in coco_data["categories"]}
-    # 构建超类映射 (COCO 80类 -> 12个超类)
-    supercategories = {cat["id"]: cat.get("supercategory", "other") 
-                       for cat in coco_data["categories"]}
-    
-    # 构建图像尺寸映射
-    image_dims = {img["id"]: (img["width"], img["height"]) 
-                  for img in coco_data["images"]}
-    
-    print(f"✅ Loaded {len(categories)} categories, {len(image_dims)} images")
-    
-    annotations = coco_data["annotations"]
-    print(f"📊 Total annotations: {len(annotations)}")
-    
-    # ========== 1. 处理所有标注，计算归一化坐标 ==========
-    processed_anns = []
-    category_stats = defaultdict(lambda: {
-        "count": 0,
-        "areas": [],
-        "aspect_ratios": [],
-        "scale_dist": {"small": 0, "medium": 0, "large": 0}
-    })
-    
-    # 空间网格计数 (按类别)
-    spatial_grids = defaultdict(lambda: [[0] * GRID_SIZE for _ in range(GRID_SIZE)])
-    global_grid = [[0] * GRID_SIZE for _ in range(GRID_SIZE)]
-    
-    for ann in annotations:
-        img_id = ann["image_id"]
-        cat_id = ann["category_id"]
-        bbox = ann["bbox"]  # [x, y, width, height]
-        area = ann.get("area", bbox[2] * bbox[3])
-        
-        if img_id not in image_dims:
-            continue
-            
-        img_w, img_h = image_dims[img_id]
-        if img_w <= 0 or img_h <= 0:
-            continue
-        
-        # 计算归一化中心坐标 (0~1)
-        cx = (bbox[0] + bbox[2] / 2) / img_w
-        cy = (bbox[1] + bbox[3] / 2) / img_h
-        
+def compute_histogram(values, bins=30):
+    """对 log(area) 做分桶统计"""
+    if not values:
+        return []
+    log_vals = [math.log10(max(v, 1e-8)) for v in values]
+    min_v, max_v = min(log_vals), max(log_vals)
+    if min_v == max_v:
+        return [{"x": min_v, "count": len(values)}]
+
+    bin_width = (max_v - min_v) / bins
+    hist = [0] * bins
+    for v in log_vals:
+        idx = min(int((v - min_v) / bin_width), bins - 1)
+        hist[idx] += 1
+
+    return [
+        {"x": round(min_v + (i + 0.5) * bin_width, 4), "count": c}
+        for i, c in enumerate(hist) if c > 0
+    ]
+
+
+def classify_scales(areas):
+    """向量化的 get_scale_category：返回 0/1/2 分别对应 small/medium/large"""
+    bounds = [SCALE_THRESHOLDS["small"], SCALE_THRESHOLDS["medium"]]
+    return np.searchsorted(bounds, areas, side="right")
+
+
+def normalize_annotations(columns):
+    """
+    整列计算归一化几何量。columns 使用 coco_cache 的列名
+    (images_id / images_width / images_height / ann_*)。
+
+    返回 dict：rows 为有效标注在原始顺序中的下标，其余数组与 rows 一一对应。
+    与逐条处理时一致：图像不存在或宽高非正的标注被跳过。
+    """
+    img_ids = np.asarray(columns["images_id"], dtype=np.int64)
+    ann_img = np.asarray(columns["ann_image_id"], dtype=np.int64)
+
+    # image_id -> 图像行号（重复 ID 以最后一次出现为准，与 dict 构建一致）
+    order = np.argsort(img_ids, kind="stable")
+    sorted_ids = img_ids[order]
+    pos = np.searchsorted(sorted_ids, ann_img, side="right") - 1
+    found = pos >= 0
+    if len(sorted_ids):
+        found &= sorted_ids[np.maximum(pos, 0)] == ann_img
+    img_row = order[np.maximum(pos, 0)] if len(order) else pos
+
+    valid = found
+    if len(order):
+        widths = np.asarray(columns["images_width"], dtype=np.float64)[img_row]
+        heights = np.asarray(columns["images_height"], dtype=np.float64)[img_row]
+        valid = found & (widths > 0) & (heights > 0)
+    rows = np.flatnonzero(valid)
+    if not len(rows):
+        empty = np.zeros(0)
+        return {"rows": rows, "cx": empty, "cy": empty, "norm_w": empty, "norm_h": empty,
+                "rel_area": empty, "aspect_ratio": empty, "scale": rows}
+
+    img_w = widths[rows]
+    img_h = heights[rows]
+    bbox = np.asarray(columns["ann_bbox"], dtype=np.float64)[rows]
+    x, y, w, h = bbox[:, 0], bbox[:, 1], bbox[:, 2], bbox[:, 3]
+
+    return {
+        "rows": rows,
+        # 归一化中心坐标 (0~1)
+        "cx": (x + w / 2) / img_w,
+        "cy": (y + h / 2) / img_h,
         # 归一化宽高
-        norm_w = bbox[2] / img_w
-        norm_h = bbox[3] / img_h
-        
+        "norm_w": w / img_w,
+        "norm_h": h / img_h,
         # 相对面积 (占图像面积的比例)
-        rel_area = (bbox[2] * bbox[3]) / (img_w * img_h)
-        
+        "rel_area": (w * h) / (img_w * img_h),
         # 宽高比
-        aspect_ratio = bbox[2] / max(bbox[3], 1)
-        
-        # 尺度分类
-        scale_cat = get_scale_category(area)
-        
-        # 更新类别统计
-        stats = category_stats[cat_id]
-        stats["count"] += 1
-        stats["areas"].append(rel_area)
-        stats["aspect_ratios"].append(aspect_ratio)
-        stats["scale_dist"][scale_cat] += 1
-        
-        # 更新空间网格
-        grid_x = min(int(cx * GRID_SIZE), GRID_SIZE - 1)
-        grid_y = min(int(cy * GRID_SIZE), GRID_SIZE - 1)
-        spatial_grids[cat_id][grid_y][grid_x] += 1
-        global_grid[grid_y][grid_x] += 1
-        
-        # 保存处理后的标注
-        processed_anns.append({
-            "id": ann["id"],
-            "image_id": img_id,
-            "category_id": cat_id,
-            "category": categories[cat_id],
-            "supercategory": supercategories[cat_id],
-            "cx": round(cx, 4),
-            "cy": round(cy, 4),
-            "width": round(norm_w, 4),
-            "height": round(norm_h, 4),
-            "area": round(rel_area, 6),
-            "aspect_ratio": round(aspect_ratio, 3),
-            "raw_area": area,
-            "scale": scale_cat
-        })
-    
-    print(f"✅ Processed {len(processed_anns)} valid annotations")
-    
-    # ========== 2. 随机采样以控制前端数据量 ==========
-    print("🔄 Sampling annotations...")
-    if len(processed_anns) > SAMPLE_SIZE:
-        # 分层采样：确保每个类别都有代表
-        sampled = []
-        cats_list = list(category_stats.keys())
-        per_cat = max(SAMPLE_SIZE // len(cats_list), 50)
-        
-        by_cat = defaultdict(list)
-        for ann in processed_anns:
-            by_cat[ann["category_id"]].append(ann)
-        
-        sampled_ids = set()
-        for cat_id in cats_list:
-            cat_anns = by_cat[cat_id]
-            sample_n = min(len(cat_anns), per_cat)
-            cat_sampled = random.sample(cat_anns, sample_n)
-            sampled.extend(cat_sampled)
-            for a in cat_sampled:
-                sampled_ids.add(a["id"])
-        
-        # 如果还不够，随机补充（使用 set 快速判断）
-        if len(sampled) < SAMPLE_SIZE:
-            remaining = [a for a in processed_anns if a["id"] not in sampled_ids]
-            extra = min(SAMPLE_SIZE - len(sampled), len(remaining))
-            if extra > 0:
-                sampled.extend(random.sample(remaining, extra))
-        
-        processed_anns = sampled[:SAMPLE_SIZE]
-        print(f"📉 Sampled down to {len(processed_anns)} annotations")
-    
-    # ========== 3. 计算类别统计摘要 ==========
-    print("📈 Computing category statistics...")
-    category_summary = []
-    for cat_id, stats in category_stats.items():
-        if stats["count"] == 0:
-            continue
-        
-        areas = stats["areas"]
-        ratios = stats["aspect_ratios"]
-        
-        category_summary.append({
-            "id": cat_id,
-            "name": categories[cat_id],
-            "supercategory": supercategories[cat_id],
-            "count": stats["count"],
-            "area_stats": {
-                "mean": round(sum(areas) / len(areas), 6),
-                "min": round(min(areas), 6),
-                "max": round(max(areas), 6),
-                "median": round(sorted(areas)[len(areas) // 2], 6)
-            },
-            "aspect_ratio_stats": {
-                "mean": round(sum(ratios) / len(ratios), 3),
-                "min": round(min(ratios), 3),
-                "max": round(max(ratios), 3)
-            },
-            "scale_distribution": stats["scale_dist"]
-        })
-    
-    # 按数量排序
-    category_summary.sort(key=lambda x: -x["count"])
-    
-    # ========== 4. 生成空间网格数据 (Top 10 类别) ==========
-    top_categories = [c["id"] for c in category_summary[:10]]
-    grid_data = {
-        "global": global_grid,
-        "by_category": {
-            categories[cat_id]: spatial_grids[cat_id] 
-            for cat_id in top_categories
+        "aspect_ratio": w / np.maximum(h, 1),
+        # 尺度分类 (基于标注的 area 字段)
+        "scale": classify_scales(np.asarray(columns["ann_area"], dtype=np.float64)[rows]),
+    }
+
+
+def group_by_first_appearance(keys):
+    """
+    把 keys 编码为 0..C-1 的组号，组的顺序按首次出现的先后
+    （与 dict 按插入顺序累积统计时的顺序一致）。
+    返回 (组号数组, 按组顺序排列的 key)。
+    """
+    uniq, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    appearance = np.argsort(first, kind="stable")
+    rank = np.empty_like(appearance)
+    rank[appearance] = np.arange(len(appearance))
+    return rank[inverse.reshape(-1)], uniq[appearance]
+
+
+def group_order(groups, num_groups):
+    """按组号稳定排序的下标；组数很少时转成 uint16，argsort 走 radix sort"""
+    if num_groups <= np.iinfo(np.uint16).max:
+        groups = groups.astype(np.uint16)
+    return np.argsort(groups, kind="stable")
+
+
+def key_index(keys, values):
+    """values 中每个元素在 keys（互不相同）中的下标"""
+    keys = np.asarray(keys)
+    sorter = np.argsort(keys, kind="stable")
+    return sorter[np.searchsorted(keys, values, sorter=sorter)] if len(keys) else np.zeros(len(values), dtype=np.int64)
+
+
+def group_segments(keys, columns):
+    """
+    按 key 稳定分组：返回 {key: {列名: 该 key 的值（保持原始顺序）}}，key 按首次出现的顺序。
+    各分片的结果按分片顺序交给 merge_segments()，就等于对整列做一次稳定分组。
+    """
+    groups, group_keys = group_by_first_appearance(keys)
+    order = group_order(groups, len(group_keys))
+    bounds = np.concatenate(([0], np.cumsum(np.bincount(groups, minlength=len(group_keys)))))
+    columns = {name: column[order] for name, column in columns.items()}
+    return {
+        key: {name: column[bounds[g]:bounds[g + 1]] for name, column in columns.items()}
+        for g, key in enumerate(group_keys.tolist())
+    }
+
+
+def merge_segments(parts):
+    """
+    按分片顺序合并 group_segments() 的结果，返回
+    (按首次出现顺序排列的 key, 每组数量, {列名: 各组的值按组连续排列、组内保持原始顺序})。
+    """
+    pieces = {}
+    for part in parts:
+        for key, columns in part.items():
+            pieces.setdefault(key, []).append(columns)
+    keys = list(pieces)
+    if not keys:
+        return keys, np.zeros(0, dtype=np.int64), {}
+    names = list(pieces[keys[0]][0])
+    grouped = {name: np.concatenate([columns[name] for key in keys for columns in pieces[key]]) for name in names}
+    counts = np.array([sum(len(columns[names[0]]) for columns in pieces[key]) for key in keys], dtype=np.int64)
+    return keys, counts, grouped
+
+
+def grouped_stats(grouped_values, counts, percentiles=BOX_PERCENTILES):
+    """
+    分组均值 + 精确分位数 (min / p5 / p25 / median / p75 / p95 / max)。
+    grouped_values 中组 g 占据连续的 counts[g] 个元素（merge_segments() 的结果，组内保持原始顺序）。
+    均值用 bincount 加权求和，每组按原始顺序逐项累加，结果与 Python sum() 相同；
+    分位数由 quantiles.grouped_quantiles 逐组做选择，median 仍取排序后第 n//2 个。
+    """
+    groups = np.repeat(np.arange(len(counts)), counts)
+    sums = np.bincount(groups, weights=grouped_values, minlength=len(counts))
+    quantiles = grouped_quantiles(grouped_values, counts, percentiles)
+
+    stats = {"mean": (sums / counts).tolist()}
+    for j, p in enumerate(percentiles):
+        stats[QUANTILE_KEYS[p]] = quantiles[:, j].tolist()
+    return stats
+
+
+def summarize_groups(grouped, counts):
+    """每组的数量、面积 / 宽高比统计（含箱线图分位数）与尺度分布；grouped 为 merge_segments() 的结果"""
+    num_groups = len(counts)
+    area_stats = grouped_stats(grouped["rel_area"], counts)
+    ratio_stats = grouped_stats(grouped["aspect_ratio"], counts)
+    groups = np.repeat(np.arange(num_groups), counts)
+    scale_dist = np.bincount(
+        groups * len(SCALE_NAMES) + grouped["scale"], minlength=num_groups * len(SCALE_NAMES)
+    ).reshape(num_groups, len(SCALE_NAMES)).tolist()
+
+    return [
+        {
+            "count": int(counts[g]),
+            "area_stats": {key: round(area_stats[key][g], 6) for key in STAT_KEYS},
+            "aspect_ratio_stats": {key: round(ratio_stats[key][g], 3) for key in STAT_KEYS},
+            "scale_distribution": dict(zip(SCALE_NAMES, scale_dist[g]))
+        }
+        for g in range(num_groups)
+    ]
+
+
+def pyramid_cells(cx, cy, finest=max(HEATMAP_LEVELS)):
+    """中心点在最细一层 (finest x finest) 中的格子下标（行优先），超出图像范围的归入边缘格子"""
+    grid_x = np.clip(np.floor(cx * finest), 0, finest - 1).astype(np.int64)
+    grid_y = np.clip(np.floor(cy * finest), 0, finest - 1).astype(np.int64)
+    return grid_y * finest + grid_x
+
+
+def build_pyramid(cell_counts, levels=HEATMAP_LEVELS):
+    """
+    由每组最细一层的格子计数 (num_groups, finest * finest) 生成计数金字塔，
+    返回 {边长: (num_groups, 边长, 边长) int64 数组}。粗层由相邻格子求和得到：
+    floor(c * 128) // 16 与 floor(c * 8) 一致，所以与逐层直接计数结果相同。
+    """
+    finest = max(levels)
+    assert all(finest % level == 0 for level in levels)
+    num_groups = len(cell_counts)
+    counts = cell_counts.reshape(num_groups, finest, finest)
+
+    pyramid = {}
+    for level in levels:
+        f = finest // level
+        pyramid[level] = counts.reshape(num_groups, level, f, level, f).sum(axis=(2, 4))
+    return pyramid
+
+
+def write_pyramid(out_dir, series, grids):
+    """
+    写出热力图金字塔：每层一个 level_<边长>.bin，依次存放 series 中每个序列的
+    边长 x 边长 个 uint32 (小端，行优先 [y][x])；index.json 记录序列顺序，
+    第 i 个序列在文件中的字节偏移为 i * 边长 * 边长 * 4。返回写出的各层文件路径。
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    files = {}
+    paths = []
+    for level, grid in grids.items():
+        files[str(level)] = f"level_{level}.bin"
+        paths.append(os.path.join(out_dir, files[str(level)]))
+        grid.astype("<u4").tofile(paths[-1])
+
+    index = {
+        "dtype": "uint32",
+        "byte_order": "little",
+        "layout": "row-major [y][x]",
+        "levels": sorted(grids),
+        "files": files,
+        "series": series,
+        # 每层每个序列的最大格子值，前端直接用作颜色比例尺上限
+        "max": {
+            str(level): grid.reshape(len(series), -1).max(axis=1, initial=0).tolist()
+            for level, grid in grids.items()
+        },
+    }
+    with open(os.path.join(out_dir, "index.json"), "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False)
+    return paths
+
+
+
+def spatial_partial(ann_image_id, ann_category_id, ann_bbox, ann_area,
+                    images_id, images_width, images_height, supercategories):
+    """
+    一个分片（连续的若干条标注）的可合并部分结果：
+    - rows / cat_ids:  有效标注在本片中的行号与类别 ID（主进程据此按原始顺序分层采样）
+    - categories:      按类别 ID 分组的 rel_area / aspect_ratio / scale（group_segments）
+    - supercategories: 同上，按超类名分组
+    - cells:           (类别 ID, 最细一层格子, 标注数)，热力图的稀疏计数
+    """
+    norm = normalize_annotations({
+        "images_id": images_id,
+        "images_width": images_width,
+        "images_height": images_height,
+        "ann_image_id": ann_image_id,
+        "ann_bbox": ann_bbox,
+        "ann_area": ann_area,
+    })
+    cat_ids = np.asarray(ann_category_id, dtype=np.int64)[norm["rows"]]
+    values = {name: norm[name] for name in ("rel_area", "aspect_ratio", "scale")}
+
+    groups, group_cat_ids = group_by_first_appearance(cat_ids)
+    super_labels = np.array([supercategories[cat_id] for cat_id in group_cat_ids.tolist()], dtype=str)[groups]
+
+    finest = max(HEATMAP_LEVELS)
+    cells, counts = np.unique(groups * (finest * finest) + pyramid_cells(norm["cx"], norm["cy"], finest),
+                              return_counts=True)
+    return {
+        "rows": norm["rows"],
+        "cat_ids": cat_ids,
+        "categories": group_segments(cat_ids, values),
+        "supercategories": group_segments(super_labels, values),
+        "cells": (group_cat_ids[cells // (finest * finest)], cells % (finest * finest), counts),
+    }
+
+
+def sample_positions(groups, counts, sample_size=SAMPLE_SIZE, allocation=SAMPLE_ALLOCATION, seed=SAMPLE_SEED):
+    """
+    按类别分层的蓄水池采样，返回被选中标注在有效标注序列中的位置（升序）。
+    各类别数量已知，采样器每层只保留最终名额，同一 seed 结果可复现。
+    """
+    sampler = StratifiedReservoirSampler(
+        sample_size, allocation, seed, counts=dict(enumerate(counts.tolist()))
+    )
+    for start in range(0, len(groups), SAMPLE_CHUNK):
+        sampler.add_batch(groups[start:start + SAMPLE_CHUNK])
+    return sampler.sample()
+
+
+def encode_spatial_binary(data):
+    """
+    把 finalize() 的输出编码为列式二进制：
+    [b"CVSP"][uint32 版本][uint32 头长度][JSON 头][各列数据]
+
+    JSON 头用空格补齐，使列数据区从 8 字节边界开始；每列也按 8 字节对齐，
+    前端可以直接 new Float32Array(buffer, offset, count) 而不复制。
+    列的 offset 相对于列数据区起点。标注的类别 / 尺度存为字典下标，
+    supercategory 由类别字典查出，不再逐条重复。
+    """
+    anns = data["annotations"]
+    cat_index = {cat["id"]: i for i, cat in enumerate(data["categories"])}
+    scale_index = {name: i for i, name in enumerate(SCALE_NAMES)}
+    values = {
+        "category": [cat_index[a["category_id"]] for a in anns],
+        "scale": [scale_index[a["scale"]] for a in anns],
+    }
+
+    blobs, columns, offset = [], [], 0
+    for name, dtype in ANNOTATION_COLUMNS:
+        column = values[name] if name in values else [a[name] for a in anns]
+        blob = np.asarray(column, dtype=dtype).tobytes()
+        blob += b"\0" * (-len(blob) % 8)
+        columns.append({"name": name, "dtype": np.dtype(dtype).name, "offset": offset})
+        blobs.append(blob)
+        offset += len(blob)
+
+    header = {
+        "count": len(anns),
+        "columns": columns,
+        "dictionaries": {
+            "category": [cat["name"] for cat in data["categories"]],
+            "category_id": [cat["id"] for cat in data["categories"]],
+            "supercategory": [cat["supercategory"] for cat in data["categories"]],
+            "scale": list(SCALE_NAMES),
         },
-        "grid_size": GRID_SIZE
+        **{key: value for key, value in data.items() if key != "annotations"},
     }
-    
-    # ========== 5. 生成尺度分布直方图数据 ==========
-    # 对 log(area) 做分桶统计
-    def compute_histogram(values, bins=30):
-        if not values:
-            return []
-        log_vals = [math.log10(max(v, 1e-8)) for v in values]
-        min_v, max_v = min(log_vals), max(log_vals)
-        if min_v == max_v:
-            return [{"x": min_v, "count": len(values)}]
-        
-        bin_width = (max_v - min_v) / bins
-        hist = [0] * bins
-        for v in log_vals:
-            idx = min(int((v - min_v) / bin_width), bins - 1)
-            hist[idx] += 1
-        
-        return [
-            {"x": round(min_v + (i + 0.5) * bin_width, 4), "count": c}
-            for i, c in enumerate(hist) if c > 0
-        ]
-    
-    scale_histograms = {}
-    for cat in category_summary[:20]:  # Top 20 类别的直方图
-        cat_areas = [a["area"] for a in processed_anns if a["category_id"] == cat["id"]]
-        scale_histograms[cat["name"]] = compute_histogram(cat_areas)
-    
-    # ========== 6. 输出最终数据 ==========
-    output_data = {
-        "annotations": processed_anns,
-        "categories": category_summary,
-        "spatial_grid": grid_data,
-        "scale_histograms": scale_histograms,
-        "meta": {
-            "total_annotations": len(coco_data["annotations"]),
-            "sampled_count": len(processed_anns),
-            "grid_resolution": GRID_SIZE,
-            "scale_thresholds": {
-                "small": "< 32x32",
-                "medium": "32x32 ~ 96x96",
-                "large": "> 96x96"
+    header = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    header += b" " * (-(len(header) + 12) % 8)
+    return b"".join([BINARY_MAGIC, struct.pack("<II", BINARY_VERSION, len(header)), header] + blobs)
+
+
+def write_spatial_binary(data, path):
+    with open(path, "wb") as f:
+        f.write(encode_spatial_binary(data))
+
+
+class SpatialStage(Stage):
+    """空间/尺度统计阶段：类别统计 + 空间网格 + 采样标注"""
+
+    name = "spatial"
+    sections = {"instances": ("images", "annotations", "categories")}
+
+    def __init__(self, output_file=OUTPUT_FILE, pyramid_dir=PYRAMID_DIR,
+                 sample_size=SAMPLE_SIZE, allocation=SAMPLE_ALLOCATION, seed=SAMPLE_SEED, workers=NUM_WORKERS):
+        super().__init__()
+        self.output_file = output_file
+        self.pyramid_dir = pyramid_dir
+        self.sample_size = sample_size
+        self.allocation = allocation
+        self.seed = seed
+        self.workers = workers
+        self.pyramid_series = []
+        self.pyramid = {}
+
+        # 构建类别映射 / 超类映射 (COCO 80类 -> 12个超类)
+        self.categories = {}
+        self.supercategories = {}
+
+        # 来自列式缓存的整列数据；逐条读取 JSON 时先累积到紧凑的 typed array
+        self.columns = None
+        self.buffers = {
+            "images_id": array("q"),
+            "images_width": array("q"),
+            "images_height": array("q"),
+            "ann_id": array("q"),
+            "ann_image_id": array("q"),
+            "ann_category_id": array("q"),
+            "ann_bbox": array("d"),
+            "ann_area": array("d"),
+            "ann_area_is_int": array("B"),
+        }
+
+    def add_category(self, cat):
+        self.categories[cat["id"]] = cat["name"]
+        self.supercategories[cat["id"]] = cat.get("supercategory", "other")
+
+    def consume_cache(self, source, cache):
+        self.columns = {name: cache[name] for name in self.buffers}
+        for cat in cache.categories:
+            self.add_category(cat)
+        return True
+
+    def consume(self, source, section, record):
+        buffers = self.buffers
+        if section == "images":
+            buffers["images_id"].append(record["id"])
+            buffers["images_width"].append(record["width"])
+            buffers["images_height"].append(record["height"])
+        elif section == "categories":
+            self.add_category(record)
+        else:
+            bbox = record["bbox"]  # [x, y, width, height]
+            area = record.get("area", bbox[2] * bbox[3])
+            buffers["ann_id"].append(record["id"])
+            buffers["ann_image_id"].append(record["image_id"])
+            buffers["ann_category_id"].append(record["category_id"])
+            buffers["ann_bbox"].extend(bbox)
+            buffers["ann_area"].append(area)
+            buffers["ann_area_is_int"].append(isinstance(area, int))
+
+    def buffered_columns(self):
+        columns = {name: np.frombuffer(buf, dtype=buf.typecode) for name, buf in self.buffers.items()}
+        columns["ann_bbox"] = columns["ann_bbox"].reshape(-1, 4)
+        columns["ann_area_is_int"] = columns["ann_area_is_int"].astype(bool)
+        return columns
+
+    def annotation_records(self, columns, rows):
+        """为采样到的标注（有效标注的行号 rows）生成前端使用的记录，只对采样结果重新归一化、逐条转换"""
+        sampled = {name: columns[name] for name in ("images_id", "images_width", "images_height")}
+        for name in ("ann_image_id", "ann_bbox", "ann_area"):
+            sampled[name] = np.asarray(columns[name])[rows]
+        norm = normalize_annotations(sampled)
+        fields = zip(
+            np.asarray(columns["ann_id"])[rows].tolist(),
+            sampled["ann_image_id"].tolist(),
+            np.asarray(columns["ann_category_id"])[rows].tolist(),
+            norm["cx"].tolist(),
+            norm["cy"].tolist(),
+            norm["norm_w"].tolist(),
+            norm["norm_h"].tolist(),
+            norm["rel_area"].tolist(),
+            norm["aspect_ratio"].tolist(),
+            sampled["ann_area"].tolist(),
+            np.asarray(columns["ann_area_is_int"])[rows].tolist(),
+            norm["scale"].tolist(),
+        )
+        records = []
+        for ann_id, img_id, cat_id, cx, cy, w, h, rel_area, ratio, area, is_int, scale in fields:
+            records.append({
+                "id": ann_id,
+                "image_id": img_id,
+                "category_id": cat_id,
+                "category": self.categories[cat_id],
+                "supercategory": self.supercategories[cat_id],
+                "cx": round(cx, 4),
+                "cy": round(cy, 4),
+                "width": round(w, 4),
+                "height": round(h, 4),
+                "area": round(rel_area, 6),
+                "aspect_ratio": round(ratio, 3),
+                "raw_area": int(area) if is_int else area,
+                "scale": SCALE_NAMES[scale]
+            })
+        return records
+
+    def finalize(self):
+        columns = self.columns if self.columns is not None else self.buffered_columns()
+        categories = self.categories
+        supercategories = self.supercategories
+        total_annotations = len(columns["ann_id"])
+
+        print(f"✅ Loaded {len(categories)} categories, {len(columns['images_id'])} images")
+        print(f"📊 Total annotations: {total_annotations}")
+
+        # ========== 1. 分片并行：归一化坐标、按类别 / 超类分组、热力图计数 ==========
+        shards = range_shards(total_annotations, SHARD_SIZE)
+        ann_columns = [columns[name] for name in ("ann_image_id", "ann_category_id", "ann_bbox", "ann_area")]
+        shared = [columns["images_id"], columns["images_width"], columns["images_height"], supercategories]
+        print(f"🧩 Aggregating {len(shards)} shards with {self.workers} workers...")
+        parts = []
+        for shard, part in zip(shards, map_shards(spatial_partial, shards, ann_columns, shared, self.workers)):
+            part["rows"] = part["rows"] + shard.start
+            parts.append(part)
+
+        # 按分片顺序合并：与整列一次性计算的分组、顺序完全一致
+        rows = np.concatenate([part["rows"] for part in parts] + [np.zeros(0, dtype=np.int64)])
+        cat_ids = np.concatenate([part["cat_ids"] for part in parts] + [np.zeros(0, dtype=np.int64)])
+        group_cat_ids, counts, grouped = merge_segments([part["categories"] for part in parts])
+        num_valid = len(rows)
+        num_groups = len(group_cat_ids)
+        groups = key_index(group_cat_ids, cat_ids)
+        print(f"✅ Processed {num_valid} valid annotations")
+
+        # ========== 2. 随机采样以控制前端数据量 ==========
+        print(f"🔄 Sampling annotations ({self.allocation}, seed={self.seed})...")
+        positions = sample_positions(groups, counts, self.sample_size, self.allocation, self.seed)
+        if len(positions) < num_valid:
+            print(f"📉 Sampled down to {len(positions)} annotations")
+        processed_anns = self.annotation_records(columns, rows[positions])
+
+        # ========== 3. 计算类别统计摘要 ==========
+        print("📈 Computing category statistics...")
+        category_summary = []
+        supercategory_summary = []
+        # 类别组号 -> 超类组号，以及按首次出现顺序排列的超类名
+        cat_super, super_names = np.zeros(0, dtype=np.int64), []
+        if num_groups:
+            summaries = summarize_groups(grouped, counts)
+            for cat_id, summary in zip(group_cat_ids, summaries):
+                category_summary.append({
+                    "id": cat_id,
+                    "name": categories[cat_id],
+                    "supercategory": supercategories[cat_id],
+                    **summary
+                })
+
+            # 超类：各分片已按超类分组，同样按分片顺序合并；类别组号 -> 超类组号
+            super_names, super_counts, super_grouped = merge_segments([part["supercategories"] for part in parts])
+            cat_super = np.array([super_names.index(supercategories[cat_id]) for cat_id in group_cat_ids])
+            summaries = summarize_groups(super_grouped, super_counts)
+            for super_g, (name, summary) in enumerate(zip(super_names, summaries)):
+                supercategory_summary.append({
+                    "name": name,
+                    "categories": [categories[cat_id] for g, cat_id in enumerate(group_cat_ids) if cat_super[g] == super_g],
+                    **summary
+                })
+
+        # 按数量排序
+        category_summary.sort(key=lambda x: -x["count"])
+        supercategory_summary.sort(key=lambda x: -x["count"])
+
+        # ========== 4. 生成热力图金字塔 (全局 + 全部超类 + 全部类别) ==========
+        finest = max(HEATMAP_LEVELS)
+        cell_counts = np.zeros((num_groups, finest * finest), dtype=np.int64)
+        for part in parts:
+            part_cat_ids, cells, cell_hits = part["cells"]
+            np.add.at(cell_counts, (key_index(group_cat_ids, part_cat_ids), cells), cell_hits)
+        cat_pyramid = build_pyramid(cell_counts)
+        group_of = {cat_id: g for g, cat_id in enumerate(group_cat_ids)}
+        cat_rows = [group_of[c["id"]] for c in category_summary]
+        super_of = {name: g for g, name in enumerate(super_names)}
+        super_rows = [super_of[c["name"]] for c in supercategory_summary]
+
+        self.pyramid_series = (
+            [{"kind": "global", "name": "all", "count": num_valid}]
+            + [{"kind": "supercategory", "name": c["name"], "count": c["count"]} for c in supercategory_summary]
+            + [{"kind": "category", "name": c["name"], "count": c["count"]} for c in category_summary]
+        )
+        self.pyramid = {}
+        for level, grid in cat_pyramid.items():
+            super_grid = np.zeros((len(super_names), level, level), dtype=np.int64)
+            np.add.at(super_grid, cat_super, grid)
+            self.pyramid[level] = np.concatenate((
+                grid.sum(axis=0, keepdims=True),
+                super_grid[super_rows],
+                grid[cat_rows],
+            ))
+
+        # ========== 5. 生成尺度分布直方图数据 ==========
+        scale_histograms = {}
+        for cat in category_summary[:20]:  # Top 20 类别的直方图
+            cat_areas = [a["area"] for a in processed_anns if a["category_id"] == cat["id"]]
+            scale_histograms[cat["name"]] = compute_histogram(cat_areas)
+
+        # ========== 6. 输出最终数据 ==========
+        return {
+            "annotations": processed_anns,
+            "categories": category_summary,
+            "supercategories": supercategory_summary,
+            "scale_histograms": scale_histograms,
+            "meta": {
+                "total_annotations": total_annotations,
+                "sampled_count": len(processed_anns),
+                "sampling": {"allocation": self.allocation, "seed": self.seed},
+                "heatmap_levels": list(HEATMAP_LEVELS),
+                "scale_thresholds": {
+                    "small": "< 32x32",
+                    "medium": "32x32 ~ 96x96",
+                    "large": "> 96x96"
+                }
             }
         }
-    }
-    
-    print(f"💾 Saving to {OUTPUT_FILE}...")
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(output_data, f, ensure_ascii=False)
-    
-    file_size = os.path.getsize(OUTPUT_FILE) / (1024 * 1024)
-    print(f"✅ Done! File size: {file_size:.2f} MB")
-    print(f"   - {len(processed_anns)} sampled annotations")
-    print(f"   - {len(category_summary)} categories with stats")
-    print(f"   - {GRID_SIZE}x{GRID_SIZE} spatial grid")
+
+    def params(self):
+        return {"sample_size": self.sample_size, "allocation": self.allocation, "seed": self.seed}
+
+    def outputs(self):
+        return [self.output_file, self.pyramid_dir]
+
+    def write(self, output_data):
+        write_spatial_binary(output_data, self.output_file)
+        print(f"💾 [{self.name}] Saved to {self.output_file}")
+
+        file_size = os.path.getsize(self.output_file) / (1024 * 1024)
+        print(f"✅ Done! File size: {file_size:.2f} MB")
+        print(f"   - {output_data['meta']['sampled_count']} sampled annotations")
+        print(f"   - {len(output_data['categories'])} categories with stats")
+        print(f"   - {len(output_data['supercategories'])} supercategories with stats")
+
+        level_files = write_pyramid(self.pyramid_dir, self.pyramid_series, self.pyramid)
+        pyramid_size = sum(os.path.getsize(path) for path in level_files) / (1024 * 1024)
+        print(f"💾 [{self.name}] Saved heatmap pyramid to {self.pyramid_dir} ({pyramid_size:.2f} MB)")
+        print(f"   - {len(self.pyramid_series)} series x levels {'/'.join(map(str, HEATMAP_LEVELS))}")
+
+
+def process_spatial_data(sample_size=SAMPLE_SIZE, allocation=SAMPLE_ALLOCATION, seed=SAMPLE_SEED,
+                         workers=NUM_WORKERS):
+    stage = SpatialStage(sample_size=sample_size, allocation=allocation, seed=seed, workers=workers)
+    run_pipeline([stage], paths={"instances": INPUT_FILE})
+
+
+def missing_sections(data):
+    """前端依赖、但 data 中缺少的部分（超类统计、分位数、热力图层级）"""
+    missing = []
+    if not data.get("supercategories"):
+        missing.append("supercategories")
+    categories = data.get("categories", [])
+    for stats in ("area_stats", "aspect_ratio_stats"):
+        absent = [key for key in STAT_KEYS if any(key not in cat.get(stats, {}) for cat in categories)]
+        if absent:
+            missing.append(f"categories[].{stats}.{'/'.join(absent)}")
+    if "heatmap_levels" not in data.get("meta", {}):
+        missing.append("meta.heatmap_levels")
+    return missing
+
+
+def convert_json(json_path, output_file=OUTPUT_FILE):
+    """
+    把 spatial_data.json 直接转换为二进制格式，不重新读取 COCO 标注。
+    旧版 JSON 缺少超类统计与分位数等字段时拒绝转换（抛出 ValueError），
+    避免写出前端各部分都为空的文件；这种情况请用 SpatialStage 重新生成。
+    """
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    missing = missing_sections(data)
+    if missing:
+        raise ValueError(f"{json_path} is missing {', '.join(missing)}; "
+                         f"regenerate it from the COCO annotations instead of converting")
+    write_spatial_binary(data, output_file)
+    print(f"💾 Converted {json_path} -> {output_file}")
 
 
 if __name__ == "__main__":
-    process_spatial_data()
+    parser = argparse.ArgumentParser(description="Generate the spatial view data.")
+    parser.add_argument("--from-json", metavar="PATH", help="convert an existing spatial_data.json instead of reading COCO")
+    parser.add_argument("--sample-size", type=int, default=SAMPLE_SIZE, help="number of annotations shipped to the frontend")
+    parser.add_argument("--allocation", choices=ALLOCATIONS, default=SAMPLE_ALLOCATION, help="per-category sample allocation")
+    parser.add_argument("--seed", type=int, default=SAMPLE_SEED, help="sampling seed")
+    parser.add_argument("--workers", type=int, default=NUM_WORKERS, help="aggregation processes (1 = serial)")
+    args = parser.parse_args()
+    if args.from_json:
+        try:
+            convert_json(args.from_json)
+        except ValueError as e:
+            parser.exit(1, f"❌ {e}\n")
+    else:
+        process_spatial_data(args.sample_size, args.allocation, args.seed, args.workers)
@@ -0,0 +1,152 @@
+"""
+可复现的分层蓄水池采样 - 单遍读取，按层 (类别等) 分配样本名额
+
+每条记录到达时分配一个由 seed 决定的随机键，每层只保留键最小的若干条
+（堆实现的蓄水池）。任意一层中键最小的 q 条就是该层的均匀随机样本，
+因此读完之后可以按各层的实际数量重新分配名额、直接截取。
+
+名额分配策略 (allocation)：
+- equal:        各层平均分配
+- proportional: 按层的大小成比例
+- sqrt:         按层大小的平方根成比例（兼顾大类与长尾）
+某层数量不足名额时，多出的名额按同一策略分给其余各层，直到分完或全部取尽。
+
+内存：
+- 预先知道各层数量 (counts) 时，每层只保留最终名额那么多条，总计 O(sample_size)
+- 否则每层最多保留 sample_size 条，读完后再截取
+
+同一 seed、同一输入顺序下结果完全一致，与逐条 add() 还是分块 add_batch() 无关。
+"""
+
+import heapq
+import math
+
+import numpy as np
+
+ALLOCATIONS = ("equal", "proportional", "sqrt")
+
+_WEIGHTS = {
+    "equal": lambda n: 1.0,
+    "proportional": float,
+    "sqrt": math.sqrt,
+}
+
+
+def allocate(counts, sample_size, allocation="equal"):
+    """
+    按策略把 sample_size 个名额分配给各层，返回 {层: 名额}。
+    counts 为 {层: 数量}（按层出现的顺序）；取整用最大余数法，余数相同时先到的层优先。
+    """
+    if allocation not in _WEIGHTS:
+        raise ValueError(f"unknown allocation {allocation!r}, expected one of {ALLOCATIONS}")
+    weight = _WEIGHTS[allocation]
+
+    quotas = {stratum: 0 for stratum in counts}
+    remaining = min(sample_size, sum(counts.values()))
+    open_strata = [stratum for stratum, n in counts.items() if n > 0]
+
+    while remaining > 0 and open_strata:
+        weights = [weight(counts[stratum]) for stratum in open_strata]
+        total = sum(weights)
+        shares = [remaining * w / total for w in weights]
+        give = [int(share) for share in shares]
+        by_remainder = sorted(range(len(open_strata)), key=lambda i: give[i] - shares[i])
+        for i in by_remainder[:remaining - sum(give)]:
+            give[i] += 1
+
+        for stratum, n in zip(open_strata, give):
+            take = min(n, counts[stratum] - quotas[stratum])
+            quotas[stratum] += take
+            remaining -= take
+        open_strata = [stratum for stratum in open_strata if quotas[stratum] < counts[stratum]]
+
+    return quotas
+
+
+class StratifiedReservoirSampler:
+    """
+    分层蓄水池采样器。
+
+    - add(stratum, item): 逐条加入
+    - add_batch(strata, items=None): 整块加入（NumPy 数组），items 省略时为记录序号
+    - sample(): 返回选中的 item 列表，按加入顺序排列
+
+    counts 可选，为 {层: 数量}；给出时各层蓄水池容量即为最终名额。
+    """
+
+    def __init__(self, sample_size, allocation="equal", seed=None, counts=None):
+        if allocation not in _WEIGHTS:
+            raise ValueError(f"unknown allocation {allocation!r}, expected one of {ALLOCATIONS}")
+        self.sample_size = sample_size
+        self.allocation = allocation
+        self.rng = np.random.default_rng(seed)
+        self.counts = dict(counts) if counts is not None else None
+        self.capacities = allocate(self.counts, sample_size, allocation) if counts is not None else None
+
+        # 层 -> 已见数量（保持首次出现顺序）；层 -> 堆 [(-key, seq, item)]
+        self.seen = {}
+        self.reservoirs = {}
+        self.num_seen = 0
+
+    def capacity(self, stratum):
+        if self.capacities is not None:
+            return self.capacities.get(stratum, 0)
+        return self.sample_size
+
+    def _offer(self, stratum, key, seq, item):
+        heap = self.reservoirs.setdefault(stratum, [])
+        if len(heap) < self.capacity(stratum):
+            heapq.heappush(heap, (-key, seq, item))
+        elif heap and key < -heap[0][0]:
+            heapq.heapreplace(heap, (-key, seq, item))
+
+    def add(self, stratum, item):
+        key = self.rng.random()
+        self.seen[stratum] = self.seen.get(stratum, 0) + 1
+        self._offer(stratum, key, self.num_seen, item)
+        self.num_seen += 1
+
+    def add_batch(self, strata, items=None):
+        """
+        整块加入：随机键一次生成（与逐条 add() 取到的随机数序列相同），
+        每层先用 argpartition 选出块内键最小的候选，只有候选进入堆。
+        """
+        strata = np.asarray(strata)
+        n = len(strata)
+        if n == 0:
+            return
+        keys = self.rng.random(n)
+        seqs = np.arange(self.num_seen, self.num_seen + n)
+        items = seqs if items is None else np.asarray(items)
+
+        uniq, first, inverse = np.unique(strata, return_index=True, return_inverse=True)
+        order = np.argsort(inverse.reshape(-1), kind="stable")
+        bounds = np.concatenate(([0], np.cumsum(np.bincount(inverse.reshape(-1), minlength=len(uniq)))))
+
+        for j in np.argsort(first, kind="stable").tolist():
+            stratum = uniq[j].item()
+            members = order[bounds[j]:bounds[j + 1]]
+            self.seen[stratum] = self.seen.get(stratum, 0) + len(members)
+            cap = self.capacity(stratum)
+            if cap == 0:
+                continue
+            if len(members) > cap:
+                members = members[np.argpartition(keys[members], cap - 1)[:cap]]
+            for m in members.tolist():
+                item = items[m]
+                if isinstance(item, np.generic):
+                    item = item.item()
+                self._offer(stratum, keys[m].item(), seqs[m].item(), item)
+
+        self.num_seen += n
+
+    def sample(self):
+        counts = self.counts if self.counts is not None else self.seen
+        quotas = allocate(counts, self.sample_size, self.allocation)
+
+        chosen = []
+        for stratum, heap in self.reservoirs.items():
+            # -key 越大表示键越小；取键最小的 quota 条
+            chosen.extend(heapq.nlargest(quotas.get(stratum, 0), heap))
+        chosen.sort(key=lambda entry: entry[1])
+        return [item for _, _, item in chosen]
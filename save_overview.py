@@ -1,9 +1,15 @@
+import argparse
 import os
-import random
+import re
 from math import ceil
 
+import numpy as np
 from PIL import Image
 
+from coco_cache import load_cache
+from image_index import load_index
+from thumb_cache import MAX_BYTES, NUM_WORKERS, THUMB_CACHE_DIR, ThumbCache, iter_tiles, tile_array
+
 # ================= 配置路径 =================
 # 你的本地图片路径（保持和你原来的脚本一致）
 COCO_IMAGE_DIR = r"D:\vlmdata\COCO2017\train2017"
@@ -11,65 +17,254 @@ COCO_IMAGE_DIR = r"D:\vlmdata\COCO2017\train2017"
 # 输出路径（保持和你原来的脚本一致）
 ANN_DIR = "src/data"
 OUTPUT_IMAGE_PATH = os.path.join(ANN_DIR, "overview.jpg")
+# 按类别 / 超类别分组时，每组一张拼图写到这个目录下按模式区分的子目录（<模式>/<组名>.jpg）
+OUTPUT_SHEET_DIR = os.path.join(ANN_DIR, "overview_sheets")
+# 从标注文件的 images 表中抽样，不必列出整个图片目录（11.8 万个文件）
+INSTANCES_PATH = os.path.join(ANN_DIR, "instances_train2017.json")
 
 # ================= 可调参数 =================
 NUM_IMAGES = 64       # 随机抽取多少张图片来拼（建议是列数的倍数）
 GRID_COLS = 8         # 概览图每行放多少张
 TILE_SIZE = 128       # 每张小图缩放后的尺寸（像素）
+SAMPLE_SEED = 42      # 抽样随机种子，同一种子每次拼出同一张概览图
+
+# 拼图模式：
+# - random:        随机抽取（默认）
+# - category:      每个类别一张拼图，小图为含有该类别的图片
+# - supercategory: 每个超类别一张拼图
+# - embedding:     单张拼图，按每张图片类别直方图的二维嵌入排列，语义相近的图片相邻
+MODES = ("random", "category", "supercategory", "embedding")
+
+
+# ================= 抽样 =================
+def list_image_files(ann_path=INSTANCES_PATH, image_dir=COCO_IMAGE_DIR):
+    """
+    候选图片文件名：优先取标注文件 images 表中的 file_name（经由列式缓存，
+    只读一列），标注文件不存在时才回退为列出图片目录。
+    """
+    if os.path.exists(ann_path):
+        return load_cache(ann_path)["images_file_name"]
+    print(f"⚠️ 找不到标注文件 {ann_path}，改为列出图片目录")
+    with os.scandir(image_dir) as entries:
+        return np.array(sorted(entry.name for entry in entries if entry.name.lower().endswith(".jpg")), dtype=str)
+
+
+def sample_files(file_names, num_images, seed=SAMPLE_SEED):
+    """不放回地随机抽取 num_images 个文件名（数量不足时全部取出、打乱顺序）"""
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(file_names), size=min(num_images, len(file_names)), replace=False)
+    return [str(file_names[i]) for i in picks]
+
+
+# ================= 按标注选图（逐图特征索引） =================
+def load_image_index(ann_path=INSTANCES_PATH):
+    """逐图特征索引（image_index），提供每张图片的文件名与各类别的标注数"""
+    return load_index(load_cache(ann_path))
+
+
+def group_rows(index, by="category"):
+    """
+    {组名: 含有该组任一类别的图片行号}，按类别 ID 顺序；
+    by 为 "category" 或 "supercategory"。
+    """
+    counts = index["category_counts"]
+    groups = {}
+    for k, category in enumerate(index.categories):
+        name = category["name"] if by == "category" else category.get("supercategory", "unknown")
+        groups.setdefault(name, []).append(k)
+    return {name: np.flatnonzero(np.asarray(counts[:, ks]).any(axis=1)) for name, ks in groups.items()}
+
+
+def sample_rows(rows, num_images, rng):
+    """从 rows 中不放回地抽取 num_images 个（保持行号升序）"""
+    if len(rows) <= num_images:
+        return rows
+    return np.sort(rng.choice(rows, size=num_images, replace=False))
+
+
+def histogram_embedding(counts):
+    """
+    每张图片类别直方图的二维嵌入：直方图归一化后取平方根（Hellinger 距离），
+    再做 PCA 投影到前两个主成分。
+    """
+    hist = np.asarray(counts, dtype=np.float64)
+    hist /= np.maximum(hist.sum(axis=1, keepdims=True), 1)
+    hist = np.sqrt(hist)
+    hist -= hist.mean(axis=0)
+    _, _, vt = np.linalg.svd(hist, full_matrices=False)
+    return hist @ vt[:2].T
+
+
+def grid_order(coords, cols):
+    """
+    把二维坐标排进 cols 列的网格：先按 y 切成若干行，每行内按 x 排序，
+    返回按网格行优先顺序排列的下标。
+    """
+    by_y = np.argsort(coords[:, 1], kind="stable")
+    rows = [by_y[i:i + cols] for i in range(0, len(by_y), cols)]
+    return np.concatenate([row[np.argsort(coords[row, 0], kind="stable")] for row in rows])
+
+
+def sheet_file_name(name):
+    """组名 -> 文件名（空格等替换为下划线）"""
+    return re.sub(r"[^0-9A-Za-z_-]+", "_", name).strip("_") + ".jpg"
+
 
 # ================= 生成概览图 =================
-def main():
-    # 1. 收集所有 jpg 图片
-    all_images = [
-        f for f in os.listdir(COCO_IMAGE_DIR)
-        if f.lower().endswith(".jpg")
-    ]
-
-    if not all_images:
-        print("❌ 在 COCO_IMAGE_DIR 下没有找到 jpg 图片，请检查路径。")
-        return
+def load_tiles(img_paths, tile_size, workers=NUM_WORKERS, thumb_cache=None):
+    """每张图片的小图数组（打不开的为错误信息字符串）；给出 thumb_cache 时先查缩略图缓存"""
+    if thumb_cache is not None:
+        return thumb_cache.tiles(img_paths, tile_size)
+    return [tile if isinstance(tile, str) else tile_array(tile, tile_size)
+            for tile in iter_tiles(img_paths, tile_size, workers)]
 
-    # 2. 随机选择图片
-    random.shuffle(all_images)
-    selected = all_images[:min(NUM_IMAGES, len(all_images))]
-    num_selected = len(selected)
 
+def build_mosaic(img_paths, cols=GRID_COLS, tile_size=TILE_SIZE, workers=NUM_WORKERS, thumb_cache=None):
+    """把图片按行优先拼成网格，打不开的图片留黑"""
+    num_selected = len(img_paths)
     # 计算需要多少行
-    rows = ceil(num_selected / GRID_COLS)
+    rows = ceil(num_selected / cols)
 
-    # 3. 创建空白画布
-    canvas_width = GRID_COLS * TILE_SIZE
-    canvas_height = rows * TILE_SIZE
-    overview = Image.new("RGB", (canvas_width, canvas_height), (0, 0, 0))
+    # 创建空白画布
+    canvas_width = cols * tile_size
+    canvas_height = rows * tile_size
+    canvas = np.zeros((canvas_height, canvas_width, 3), dtype=np.uint8)
 
     print(f"🎨 一共选取 {num_selected} 张图片，"
-          f"拼成 {rows} 行 x {GRID_COLS} 列，"
+          f"拼成 {rows} 行 x {cols} 列，"
           f"画布大小：{canvas_width}x{canvas_height}")
 
-    # 4. 逐张缩放并粘贴
-    for idx, fname in enumerate(selected):
-        img_path = os.path.join(COCO_IMAGE_DIR, fname)
-        try:
-            img = Image.open(img_path).convert("RGB")
-        except Exception as e:
-            print(f"⚠️ 打开图片失败，跳过: {img_path}，错误: {e}")
+    for idx, (img_path, tile) in enumerate(zip(img_paths, load_tiles(img_paths, tile_size, workers, thumb_cache))):
+        if isinstance(tile, str):
+            print(f"⚠️ 打开图片失败，跳过: {img_path}，错误: {tile}")
             continue
 
-        # 统一缩放为固定大小
-        img = img.resize((TILE_SIZE, TILE_SIZE), Image.Resampling.LANCZOS)
+        row = idx // cols
+        col = idx % cols
+
+        x = col * tile_size
+        y = row * tile_size
+
+        canvas[y:y + tile_size, x:x + tile_size] = tile
+
+    return Image.fromarray(canvas)
+
+
+def build_sheets(groups, cols=GRID_COLS, tile_size=TILE_SIZE, workers=NUM_WORKERS, thumb_cache=None):
+    """
+    为每组图片各拼一张图，返回 {组名: Image}。
+    所有组的小图去重后一次性取出（缓存 / 进程池只走一遍），再分别粘贴。
+    """
+    unique_paths = sorted(set(path for img_paths in groups.values() for path in img_paths))
+    print(f"🗂️ {len(groups)} 组拼图，共 {len(unique_paths)} 张不同的图片")
+    tiles = dict(zip(unique_paths, load_tiles(unique_paths, tile_size, workers, thumb_cache)))
+
+    sheets = {}
+    for name, img_paths in groups.items():
+        rows = ceil(len(img_paths) / cols)
+        canvas = np.zeros((rows * tile_size, cols * tile_size, 3), dtype=np.uint8)
+        for idx, img_path in enumerate(img_paths):
+            tile = tiles[img_path]
+            if isinstance(tile, str):
+                print(f"⚠️ 打开图片失败，跳过: {img_path}，错误: {tile}")
+                continue
+            x = idx % cols * tile_size
+            y = idx // cols * tile_size
+            canvas[y:y + tile_size, x:x + tile_size] = tile
+        sheets[name] = Image.fromarray(canvas)
+    return sheets
+
+
+def select_images(mode, num_images, cols, seed=SAMPLE_SEED):
+    """
+    按模式选图，返回 {组名: [文件名, ...]}；random / embedding 只有一组 (None)。
+    """
+    if mode == "random":
+        # 1. 收集候选图片
+        all_images = list_image_files()
+        if not len(all_images):
+            return {}
+        # 2. 随机选择图片
+        return {None: sample_files(all_images, num_images, seed)}
+
+    index = load_image_index()
+    file_names = index["file_name"]
+    rng = np.random.default_rng(seed)
 
-        row = idx // GRID_COLS
-        col = idx % GRID_COLS
+    if mode == "embedding":
+        # 只在有标注的图片中抽样，按类别直方图的二维嵌入排列
+        rows = sample_rows(np.flatnonzero(np.asarray(index["object_count"]) > 0), num_images, rng)
+        if not len(rows):
+            return {}
+        coords = histogram_embedding(index["category_counts"][rows])
+        rows = rows[grid_order(coords, cols)]
+        return {None: [str(file_names[row]) for row in rows]}
 
-        x = col * TILE_SIZE
-        y = row * TILE_SIZE
+    groups = {}
+    for name, rows in group_rows(index, mode).items():
+        rows = sample_rows(rows, num_images, rng)
+        if len(rows):
+            groups[name] = [str(file_names[row]) for row in rows]
+    return groups
 
-        overview.paste(img, (x, y))
 
-    # 5. 保存结果
-    os.makedirs(os.path.dirname(OUTPUT_IMAGE_PATH), exist_ok=True)
-    overview.save(OUTPUT_IMAGE_PATH, quality=95)
-    print(f"✅ 概览图已保存到: {OUTPUT_IMAGE_PATH}")
+def main():
+    parser = argparse.ArgumentParser(description="Build the portal overview mosaic from randomly sampled COCO images.")
+    parser.add_argument("--num-images", type=int, default=NUM_IMAGES, help="number of tiles")
+    parser.add_argument("--cols", type=int, default=GRID_COLS, help="tiles per row")
+    parser.add_argument("--tile-size", type=int, default=TILE_SIZE, help="tile edge in pixels")
+    parser.add_argument("--seed", type=int, default=SAMPLE_SEED, help="sampling seed")
+    parser.add_argument("--workers", type=int, default=NUM_WORKERS, help="decode processes (1 = serial)")
+    parser.add_argument("--mode", choices=MODES, default="random",
+                        help="random tiles, one sheet per (super)category, or ordered by category-histogram embedding")
+    parser.add_argument("--output", default=OUTPUT_IMAGE_PATH)
+    parser.add_argument("--output-dir", default=OUTPUT_SHEET_DIR,
+                        help="per-group sheets are written to <output-dir>/<mode>/")
+    parser.add_argument("--thumb-cache", default=THUMB_CACHE_DIR, help="thumbnail cache directory")
+    parser.add_argument("--thumb-cache-mb", type=int, default=MAX_BYTES >> 20, help="size cap per tile size (MB, 0 = bypass the cache)")
+    parser.add_argument("--no-thumb-cache", action="store_true", help="always decode the originals")
+    args = parser.parse_args()
+
+    # 1. 按模式选图
+    groups = select_images(args.mode, args.num_images, args.cols, args.seed)
+
+    if not groups:
+        print("❌ 没有找到候选图片，请检查标注文件或 COCO_IMAGE_DIR 路径。")
+        return
+
+    groups = {name: [os.path.join(COCO_IMAGE_DIR, fname) for fname in selected] for name, selected in groups.items()}
+
+    # 2. 从缩略图缓存取小图（未命中的并行解码、缩放）并粘贴
+    thumb_cache = None
+    if not args.no_thumb_cache:
+        thumb_cache = ThumbCache(args.thumb_cache, args.thumb_cache_mb << 20, args.workers)
+    try:
+        if None in groups:
+            overview = build_mosaic(groups[None], args.cols, args.tile_size, args.workers, thumb_cache)
+        else:
+            sheets = build_sheets(groups, args.cols, args.tile_size, args.workers, thumb_cache)
+    finally:
+        if thumb_cache is not None:
+            thumb_cache.save()
+
+    # 3. 保存结果
+    if None in groups:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        overview.save(args.output, quality=95)
+        print(f"✅ 概览图已保存到: {args.output}")
+        return
+
+    # 每种模式单独一个子目录，并清掉上次运行留下、这次没有生成的拼图，
+    # 目录中只有同一模式、同一次运行的结果
+    sheet_dir = os.path.join(args.output_dir, args.mode)
+    os.makedirs(sheet_dir, exist_ok=True)
+    file_names = {name: sheet_file_name(name) for name in sheets}
+    for entry in os.listdir(sheet_dir):
+        if entry.endswith(".jpg") and entry not in file_names.values():
+            os.remove(os.path.join(sheet_dir, entry))
+    for name, sheet in sheets.items():
+        sheet.save(os.path.join(sheet_dir, file_names[name]), quality=95)
+    print(f"✅ {len(sheets)} 张分组拼图已保存到: {sheet_dir}")
 
 
 if __name__ == "__main__":
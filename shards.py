@@ -0,0 +1,90 @@
+"""
+分片并行聚合 - 按标注分片计算可合并的部分结果，再按分片顺序归并
+
+process_spatial / process_semantic / process_pose 的统计都可以拆成
+「每个分片独立算出部分结果 (partial)」+「主进程按分片顺序合并」两步：
+计数、直方图、共现立方体直接相加；在线矩用 MaskedMoments.merge；
+需要精确分位数的数值按组稳定拼接；分层采样仍在主进程按原始顺序送入。
+
+- 分片边界只由分片大小决定，与进程数无关；合并总是按分片顺序进行，
+  所以 workers=1（在主进程中逐片计算）与任意进程数的结果逐位相同
+- 列式缓存中的列不随任务 pickle：只传 .npy 路径与行号，子进程自己 mmap
+  打开、只读本片；逐条读取 JSON 时没有缓存文件，才把本片的切片随任务发送
+"""
+
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+NUM_WORKERS = os.cpu_count() or 1  # 聚合使用的进程数，1 表示在主进程中逐片计算
+SHARD_SIZE = 1 << 16  # 每个分片的标注数
+
+
+class ColumnRef:
+    """列式缓存中一列（或其中若干行）的引用；子进程按路径 mmap 打开，只读取 rows"""
+
+    def __init__(self, path, rows=slice(None)):
+        self.path = path
+        self.rows = rows
+
+    def read(self):
+        return np.asarray(np.load(self.path, mmap_mode="r")[self.rows])
+
+
+def is_cached_column(column):
+    """np.load(mmap_mode="r") 直接打开的整列（不是切片或计算结果）"""
+    return isinstance(column, np.memmap) and isinstance(column.base, mmap.mmap) and column.filename is not None
+
+
+def column_ref(column, rows=slice(None)):
+    """一列在 rows（slice 或行号数组）上的可 pickle 形式：缓存列传引用，其余传切片"""
+    if is_cached_column(column):
+        return ColumnRef(column.filename, rows)
+    if isinstance(column, np.ndarray):
+        return column[rows]
+    return column
+
+
+def resolve(arg):
+    return arg.read() if isinstance(arg, ColumnRef) else arg
+
+
+def run_shard(task):
+    fn, args = task
+    return fn(*(resolve(arg) for arg in args))
+
+
+def range_shards(num_rows, size=SHARD_SIZE):
+    """[0, num_rows) 按 size 切成连续的行范围"""
+    return [slice(start, min(start + size, num_rows)) for start in range(0, num_rows, size)]
+
+
+def image_shards(lookup, size=SHARD_SIZE):
+    """
+    按图片切分：同一张图片的标注总在同一个分片中（逐图统计因此只在分片内进行）。
+    lookup 为 coco_cache.ImageRowLookup；按 image_id 顺序每攒够约 size 条标注切一刀，
+    每个分片的行号升序（保持原始顺序）。
+    """
+    starts = np.asarray(lookup.starts)
+    total = int(starts[-1]) if len(starts) else 0
+    cuts = starts[np.searchsorted(starts, np.arange(0, total, size))]
+    cuts = np.unique(np.append(cuts, total)).tolist()
+    order = lookup.order
+    return [np.sort(np.asarray(order[a:b])) for a, b in zip(cuts, cuts[1:])]
+
+
+def map_shards(fn, shards, columns, shared=(), workers=NUM_WORKERS):
+    """
+    对每个分片计算 fn(*本片的各列, *shared)，按分片顺序逐个产出结果。
+    columns 为整列数组（每个分片取其中 shards[i] 行），shared 为各分片共用的参数
+    （整列数组同样以引用传给子进程）。fn 须是模块级函数，结果须可 pickle。
+    """
+    shared = [column_ref(arg) for arg in shared]
+    tasks = [(fn, [column_ref(column, rows) for column in columns] + shared) for rows in shards]
+    if workers <= 1 or len(tasks) <= 1:
+        yield from map(run_shard, tasks)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+        yield from pool.map(run_shard, tasks)
@@ -1,6 +1,6 @@
 // src/js/distribution_matrix.js
 import * as d3 from "d3";
-import semanticData from "../data/semantic_data.json";
+import { nodes, pairs, cube, loadCooccurrenceCube, sliceCooccurrence } from "./semantic_data.js";
 
 const barHost = document.getElementById("freq-bar");
 const matrixHost = document.getElementById("cond-matrix");
@@ -8,23 +8,41 @@ const reorderBtn = document.getElementById("matrixReorder");
 const tooltip = d3.select("#tooltip");
 
 if (barHost && matrixHost) {
-  const nodes = semanticData.nodes;
-  const links = semanticData.links;
   const idToName = new Map(nodes.map((n) => [n.id, n.name]));
-  const countMap = new Map(nodes.map((n) => [n.id, n.count || 0]));
-
-  // 双向共现计数，便于取 P(A|B)
-  const pairCounts = new Map();
-  links.forEach((l) => {
-    pairCounts.set(`${l.source}-${l.target}`, l.value);
-    pairCounts.set(`${l.target}-${l.source}`, l.value);
+  let countMap = new Map(nodes.map((n) => [n.id, n.count || 0]));
+
+  // 双向索引的类别对统计："a-b" -> 共现次数、P(a|b)、lift、PMI（由 process_semantic.py 预计算，
+  // 使用全部类别对，不受力导向图的剪枝影响）
+  let pairStats = new Map();
+  const setPair = (a, b, co, pA, pB, lift, pmi) => {
+    const shared = { co, lift, pmi };
+    pairStats.set(`${a}-${b}`, { ...shared, p: pA }); // P(a | b)
+    pairStats.set(`${b}-${a}`, { ...shared, p: pB }); // P(b | a)
+  };
+  pairs.forEach((l) => {
+    setPair(l.source, l.target, l.value, l.p_source_given_target, l.p_target_given_source, l.lift, l.pmi);
   });
 
+  // 用共现立方体的切片（筛选后的图片子集）重新计算计数与各项指标，不需要请求服务器
+  const applySlice = (slice) => {
+    const ids = slice.categories;
+    countMap = new Map(ids.map((id) => [id, slice.cooccurrence(id, id)]));
+    pairStats = new Map();
+    ids.forEach((a, i) => {
+      const countA = countMap.get(a);
+      ids.slice(i + 1).forEach((b) => {
+        const co = slice.cooccurrence(a, b);
+        if (!co) return;
+        const countB = countMap.get(b);
+        const lift = (co * slice.numImages) / (countA * countB);
+        setPair(a, b, co, co / countB, co / countA, lift, Math.log2(lift));
+      });
+    });
+  };
+
   const prob = (a, b) => {
     if (a === b) return 0; // 对角不强调，便于颜色范围聚焦到共现
-    const co = pairCounts.get(`${a}-${b}`) || 0;
-    const denom = countMap.get(b) || 1;
-    return co / denom;
+    return pairStats.get(`${a}-${b}`)?.p || 0;
   };
 
   const asymScore = (id) => {
@@ -46,7 +64,9 @@ if (barHost && matrixHost) {
     const innerWidth = width - margin.left - margin.right;
     const innerHeight = height - margin.top - margin.bottom;
 
-    const sorted = [...nodes].sort((a, b) => d3.descending(a.count, b.count));
+    const sorted = nodes
+      .map((n) => ({ id: n.id, name: n.name, count: countMap.get(n.id) || 0 }))
+      .sort((a, b) => d3.descending(a.count, b.count));
     const x = d3
       .scaleBand()
       .domain(sorted.map((d) => d.name))
@@ -147,7 +167,9 @@ if (barHost && matrixHost) {
           row: rowId,
           col: colId,
           value: prob(rowId, colId),
-          co: pairCounts.get(`${rowId}-${colId}`) || 0,
+          co: pairStats.get(`${rowId}-${colId}`)?.co || 0,
+          lift: pairStats.get(`${rowId}-${colId}`)?.lift || 0,
+          pmi: pairStats.get(`${rowId}-${colId}`)?.pmi || 0,
         });
       });
     });
@@ -187,7 +209,7 @@ if (barHost && matrixHost) {
               d.row
             )} | ${idToName.get(d.col)})</div><div>概率：${p}%</div><div>共现次数：${
               d.co
-            }</div><div>B出现次数：${bCount}</div>`
+            }</div><div>B出现次数：${bCount}</div><div>Lift：${d.lift.toFixed(2)} · PMI：${d.pmi.toFixed(2)}</div>`
           )
           .style("left", `${event.pageX + 12}px`)
           .style("top", `${event.pageY - 12}px`);
@@ -269,7 +291,7 @@ if (barHost && matrixHost) {
         .map((d) => d.id);
     }
     // 默认按频次
-    return [...nodes].sort((a, b) => d3.descending(a.count, b.count)).map((d) => d.id);
+    return [...nodes].sort((a, b) => d3.descending(countMap.get(a.id), countMap.get(b.id))).map((d) => d.id);
   };
 
   const toggleOrder = () => {
@@ -304,8 +326,71 @@ if (barHost && matrixHost) {
     });
   };
 
+  // 分层筛选：每个维度一个下拉框（全部 / 单个取值），选择变化时对立方体切片求和后重绘
+  const initCubeFilters = () => {
+    const bar = document.createElement("div");
+    bar.className = "matrix-filters";
+    bar.style.cssText = "display:flex; gap:12px; flex-wrap:wrap; margin-bottom:8px; font-size:12px; color:#475569;";
+    matrixHost.parentNode.insertBefore(bar, matrixHost);
+
+    const status = document.createElement("span");
+    status.style.cssText = "align-self:center; color:#94a3b8;";
+
+    if (!cube) {
+      // semantic_data.json 不含立方体（由旧文件转换而来）：明确提示，而不是静默隐藏筛选
+      status.textContent = "分层筛选不可用：semantic_data.json 不含共现立方体，请运行 process_semantic.py 重新生成";
+      bar.appendChild(status);
+      return;
+    }
+
+    const selection = cube.dims.map(() => null);
+    const dimTitles = {
+      dominant_supercategory: "主导超类",
+      object_count: "每图标注数",
+      crowd: "Crowd 标注",
+    };
+
+    cube.dims.forEach((dim, d) => {
+      const label = document.createElement("label");
+      label.textContent = `${dimTitles[dim.name] || dim.name} `;
+      const select = document.createElement("select");
+      select.disabled = true;
+      select.innerHTML =
+        `<option value="">全部</option>` +
+        dim.labels.map((name, i) => `<option value="${i}">${name}</option>`).join("");
+      select.addEventListener("change", () => {
+        selection[d] = select.value === "" ? null : Number(select.value);
+        update();
+      });
+      label.appendChild(select);
+      bar.appendChild(label);
+    });
+    bar.appendChild(status);
+
+    let values = null;
+    const update = () => {
+      const slice = sliceCooccurrence(values, selection);
+      applySlice(slice);
+      status.textContent = `${slice.numImages} 张图片`;
+      renderBar();
+      renderMatrix(currentOrder);
+    };
+
+    loadCooccurrenceCube()
+      .then((data) => {
+        values = data;
+        bar.querySelectorAll("select").forEach((select) => (select.disabled = false));
+        status.textContent = `${d3.sum(cube.images)} 张图片`;
+      })
+      .catch((err) => {
+        console.error("共现立方体加载失败:", err);
+        status.textContent = "分层数据加载失败";
+      });
+  };
+
   renderBar();
   renderMatrix(currentOrder);
+  initCubeFilters();
   wireModals();
 
   if (reorderBtn) {
@@ -0,0 +1,89 @@
+// src/js/semantic_data.js
+// 语义共现数据 - 展开 process_semantic.py 输出的按列存储的 semantic_data.json
+//
+// pairs 为所有有共现的类别对（并列数组：source / target / value / 条件概率 / lift / pmi / jaccard），
+// edges 为剪枝后保留的边在 pairs 中的下标。共现矩阵使用全部类别对，力导向图只使用 edges。
+
+import semanticData from "../data/semantic_data.json";
+
+function expandPairs(columns) {
+  const names = Object.keys(columns);
+  return columns.source.map((_, i) => {
+    const row = {};
+    for (const name of names) row[name] = columns[name][i];
+    return row;
+  });
+}
+
+export const nodes = semanticData.nodes;
+export const numImages = semanticData.num_images;
+export const pruning = semanticData.pruning;
+
+// 全部类别对（只读，共享给各视图）
+export const pairs = expandPairs(semanticData.pairs);
+
+// 剪枝后的边：每次调用返回新对象，d3.forceLink 会把 source / target 替换为节点对象
+export function prunedLinks() {
+  return semanticData.edges.map((i) => ({ ...pairs[i] }));
+}
+
+// --- 分层共现立方体 (semantic_cube.bin) ---
+// 每个切片为一组图片（主导超类 x 标注数量分桶 x 是否含 crowd）的共现矩阵上三角（含对角线），
+// 各切片的图片互不重叠，把选中的切片逐项相加就是筛选后子集的共现矩阵。
+
+export const cube = semanticData.cube || null;
+
+let cubePromise = null;
+
+export function loadCooccurrenceCube(url = cube && `./data/${cube.file}`) {
+  if (!cube) return Promise.resolve(null);
+  if (!cubePromise) {
+    cubePromise = fetch(url)
+      .then((response) => {
+        if (!response.ok) throw new Error(`${url}: HTTP ${response.status}`);
+        return response.arrayBuffer();
+      })
+      .then((buffer) => new Uint32Array(buffer))
+      .catch((err) => {
+        cubePromise = null; // 允许稍后重试
+        throw err;
+      });
+  }
+  return cubePromise;
+}
+
+// selection 与 cube.dims 对应，每维为选中的标签下标，null 表示该维不筛选
+export function sliceCooccurrence(values, selection) {
+  const sizes = cube.dims.map((dim) => dim.labels.length);
+  const length = cube.slice_length;
+  const total = new Float64Array(length);
+  let numImages = 0;
+
+  for (let k = 0; k < cube.images.length; k++) {
+    if (!cube.images[k]) continue;
+    // 切片下标按维度行优先展开，最后一维变化最快
+    let rest = k;
+    let selected = true;
+    for (let d = sizes.length - 1; d >= 0; d--) {
+      const label = rest % sizes[d];
+      rest = Math.floor(rest / sizes[d]);
+      if (selection[d] != null && selection[d] !== label) selected = false;
+    }
+    if (!selected) continue;
+    numImages += cube.images[k];
+    const offset = k * length;
+    for (let i = 0; i < length; i++) total[i] += values[offset + i];
+  }
+
+  const n = cube.categories.length;
+  const index = new Map(cube.categories.map((id, i) => [id, i]));
+  // 上三角行优先：第 a 行从 a * n - a * (a - 1) / 2 开始
+  const cell = (a, b) => {
+    let i = index.get(a);
+    let j = index.get(b);
+    if (i > j) [i, j] = [j, i];
+    return total[i * n - (i * (i - 1)) / 2 + (j - i)];
+  };
+
+  return { numImages, categories: cube.categories, cooccurrence: cell };
+}
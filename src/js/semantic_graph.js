@@ -1,6 +1,6 @@
 ﻿// src/js/semantic_graph.js
 import * as d3 from "d3";
-import semanticData from "../data/semantic_data.json";
+import { nodes as semanticNodes, pairs, prunedLinks } from "./semantic_data.js";
 
 // --- 🎨 核心配色配置 (明亮色系 - 适配黑色文字) ---
 const CHART_COLORS = {
@@ -41,6 +41,11 @@ const hoverInfo = d3.select("#hoverInfo");
 const selectionContent = d3.select("#selectionContent");
 const categoryOptions = d3.select("#categoryOptions");
 
+// 节点坐标由 process_semantic.py 离线布局给出，页面加载时直接绘制；
+// 只有拖拽或筛选时才从较低的 alpha 热启动一段简短的力模拟
+const WARM_START_ALPHA = 0.1;
+const WARM_START_DECAY = 0.05;
+
 const LABEL_FONT_FAMILY = "-apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif";
 // 移除 textMeasureCanvas，因为不再依赖它计算半径，改用估算适配字体
 
@@ -77,11 +82,16 @@ svgRoot.call(
 
 tooltip.style("display", "none");
 
-initWithData(semanticData);
+// 力导向图只使用 process_semantic.py 剪枝后保留的边；离线布局以原点为中心，平移到画布中心
+initWithData({
+  nodes: semanticNodes.map((n) => ({ ...n, x: n.x + width / 2, y: n.y + height / 2 })),
+  links: prunedLinks(),
+});
 
 function initWithData(data) {
   nodeById = new Map(data.nodes.map((n) => [n.id, n]));
-  neighborMap = buildNeighborMap(data.links);
+  // 邻居列表与高亮使用全部类别对（与共现矩阵一致），剪枝只决定画出哪些边
+  neighborMap = buildNeighborMap(pairs);
   renderGraph(data);
   initControls(data);
 }
@@ -132,7 +142,7 @@ function initControls(data) {
     updateExcludedList();
   });
 
-  refreshGraphStyles(true);
+  refreshGraphStyles();
 }
 
 function renderGraph(data) {
@@ -173,7 +183,10 @@ function renderGraph(data) {
     .force("charge", d3.forceManyBody().strength(-450))
     .force("center", d3.forceCenter(width / 2, height / 2))
     // ❗碰撞检测：使用新的基于频率的半径
-    .force("collide", d3.forceCollide().radius((d) => nodeRadius(d) + 5).iterations(2));
+    .force("collide", d3.forceCollide().radius((d) => nodeRadius(d) + 5).iterations(2))
+    .alphaDecay(WARM_START_DECAY)
+    .alpha(0)
+    .stop();
 
   // --- 连线 ---
   const link = linkGroup
@@ -247,7 +260,9 @@ function renderGraph(data) {
     updateInfoPanel(null);
   });
 
-  simulation.on("tick", () => {
+  simulation.on("tick", ticked);
+
+  function ticked() {
     link
       .attr("x1", (d) => d.source.x)
       .attr("y1", (d) => d.source.y)
@@ -258,20 +273,28 @@ function renderGraph(data) {
 
     // 文字跟随位置更新，但字号不需要在 tick 中更新
     label.attr("x", (d) => d.x).attr("y", (d) => d.y);
-  });
+  }
 
   refreshVisibility();
   updateExcludedList();
+  ticked();
 
   window.addEventListener(
     "resize",
     debounce(() => {
       const rect = container.getBoundingClientRect();
-      width = Math.max(rect.width, 520);
-      height = Math.max(rect.height, 520);
+      const dx = (Math.max(rect.width, 520) - width) / 2;
+      const dy = (Math.max(rect.height, 520) - height) / 2;
+      width += dx * 2;
+      height += dy * 2;
       svgRoot.attr("width", width).attr("height", height);
+      // 布局不变，整体平移到新的画布中心
+      data.nodes.forEach((n) => {
+        n.x += dx;
+        n.y += dy;
+      });
       simulation.force("center", d3.forceCenter(width / 2, height / 2));
-      simulation.alpha(0.3).restart();
+      ticked();
     }, 200)
   );
 
@@ -285,7 +308,7 @@ function renderGraph(data) {
     const activeLinks = data.links.filter((l) => linkVisible(l));
     simulation.force("link").links(activeLinks);
     if (reheat) {
-      simulation.alpha(0.35).restart();
+      simulation.alpha(WARM_START_ALPHA).restart();
     }
 
     labelGroup.raise();
@@ -408,8 +431,9 @@ function buildNeighborMap(links) {
     const t = nodeId(l.target);
     if (!map.has(s)) map.set(s, []);
     if (!map.has(t)) map.set(t, []);
-    map.get(s).push({ id: t, value: l.value });
-    map.get(t).push({ id: s, value: l.value });
+    // conditional 为 P(邻居 | 当前节点)，由 process_semantic.py 预计算
+    map.get(s).push({ id: t, value: l.value, conditional: l.p_target_given_source, lift: l.lift });
+    map.get(t).push({ id: s, value: l.value, conditional: l.p_source_given_target, lift: l.lift });
   });
   map.forEach((list) => list.sort((a, b) => d3.descending(a.value, b.value)));
   return map;
@@ -429,13 +453,13 @@ function updateInfoPanel(node) {
     .map((n) => {
       const neighbor = nodeById.get(n.id);
       const name = neighbor?.name || n.id;
-      const conditional = node.count ? ((n.value / node.count) * 100).toFixed(1) : 0;
+      const conditional = (n.conditional * 100).toFixed(1);
       return `<li style="margin-bottom:6px; padding-bottom:6px; border-bottom:1px solid #f1f5f9;">
         <div style="display:flex; justify-content:space-between; align-items:center;">
             <span style="font-weight:600; color:#0f172a">${name}</span>
             <span style="font-size:12px; color:#64748b; background:#f1f5f9; padding:2px 6px; border-radius:4px;">P | ${conditional}%</span>
         </div>
-        <div style="font-size:11px; color:#94a3b8; margin-top:2px;">共现 ${n.value} 次</div>
+        <div style="font-size:11px; color:#94a3b8; margin-top:2px;">共现 ${n.value} 次 · Lift ${n.lift.toFixed(2)}</div>
       </li>`;
     })
     .join("");
@@ -487,7 +511,7 @@ function updateExcludedList() {
 
 function drag(simulation) {
   function dragstarted(event) {
-    if (!event.active) simulation.alphaTarget(0.3).restart();
+    if (!event.active) simulation.alphaTarget(WARM_START_ALPHA).restart();
     event.subject.fx = event.subject.x;
     event.subject.fy = event.subject.y;
     d3.select(event.currentTarget).style("cursor", "grabbing");
@@ -0,0 +1,113 @@
+// src/js/spatial_data.js
+// 空间视图数据加载 - 读取 process_spatial.py 输出的列式二进制 spatial_data.bin
+//
+// 文件格式：[b"CVSP"][uint32 版本][uint32 头长度][JSON 头][各列数据]
+// JSON 头包含列定义、类别字典和全部统计摘要；标注按列存放，
+// 直接映射为 TypedArray（不复制、不逐条解析）。
+
+const SPATIAL_DATA_URL = "./data/spatial_data.bin";
+// 还没有用 process_spatial.py 重新生成二进制时，读取旧版逐条记录的 JSON
+// （没有超类统计与分位数，视图中相应部分显示为无数据）
+const LEGACY_JSON_URL = "./data/spatial_data.json";
+const MAGIC = "CVSP";
+const SUPPORTED_VERSION = 1;
+
+const ARRAY_TYPES = {
+    uint8: Uint8Array,
+    uint16: Uint16Array,
+    uint32: Uint32Array,
+    float32: Float32Array,
+    float64: Float64Array,
+};
+
+// 以字典下标存储的列 -> 头中对应的字典
+const DICTIONARY_COLUMNS = {
+    category: "category",
+    scale: "scale",
+};
+
+let loadPromise = null;
+
+// 为列数据生成轻量的行视图类：每行只保存下标，字段通过 getter 从列中读取，
+// 视图代码可以继续使用 d.cx / d.category 这样的写法
+function createRowType(columns, dictionaries) {
+    class SpatialAnnotation {
+        constructor(index) {
+            this.index = index;
+        }
+    }
+
+    for (const [name, values] of Object.entries(columns)) {
+        const dictName = DICTIONARY_COLUMNS[name];
+        const get = dictName
+            ? function () { return dictionaries[dictName][values[this.index]]; }
+            : function () { return values[this.index]; };
+        Object.defineProperty(SpatialAnnotation.prototype, name, { get });
+    }
+
+    const category = columns.category;
+    Object.defineProperty(SpatialAnnotation.prototype, "category_id", {
+        get() { return dictionaries.category_id[category[this.index]]; },
+    });
+    Object.defineProperty(SpatialAnnotation.prototype, "supercategory", {
+        get() { return dictionaries.supercategory[category[this.index]]; },
+    });
+
+    return SpatialAnnotation;
+}
+
+export function decodeSpatialData(buffer) {
+    const view = new DataView(buffer);
+    const magic = new TextDecoder().decode(new Uint8Array(buffer, 0, 4));
+    if (magic !== MAGIC) {
+        throw new Error("spatial_data.bin 文件头错误");
+    }
+    const version = view.getUint32(4, true);
+    if (version !== SUPPORTED_VERSION) {
+        throw new Error(`不支持的 spatial_data.bin 版本: ${version}`);
+    }
+
+    const headerLength = view.getUint32(8, true);
+    const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 12, headerLength)));
+    const { columns: columnDefs, dictionaries, count, ...summary } = header;
+    const dataStart = 12 + headerLength;
+
+    const columns = {};
+    for (const col of columnDefs) {
+        const ArrayType = ARRAY_TYPES[col.dtype];
+        columns[col.name] = new ArrayType(buffer, dataStart + col.offset, count);
+    }
+
+    const Row = createRowType(columns, dictionaries);
+    const annotations = Array.from({ length: count }, (_, i) => new Row(i));
+
+    return {
+        ...summary,           // categories / supercategories / scale_histograms / meta
+        annotations,
+        columns,
+        dictionaries,
+    };
+}
+
+// 加载并解码空间数据（只请求一次，多个视图共享结果）；二进制不存在时退回旧版 JSON
+export function loadSpatialData(url = SPATIAL_DATA_URL) {
+    if (!loadPromise) {
+        loadPromise = fetch(url)
+            .then(response => {
+                if (response.status === 404) {
+                    console.warn(`⚠️ ${url} 不存在，改为读取旧版 ${LEGACY_JSON_URL}`);
+                    return fetch(LEGACY_JSON_URL).then(legacy => {
+                        if (!legacy.ok) throw new Error(`${LEGACY_JSON_URL}: HTTP ${legacy.status}`);
+                        return legacy.json();
+                    });
+                }
+                if (!response.ok) throw new Error(`${url}: HTTP ${response.status}`);
+                return response.arrayBuffer().then(decodeSpatialData);
+            })
+            .catch(err => {
+                loadPromise = null;  // 允许稍后重试
+                throw err;
+            });
+    }
+    return loadPromise;
+}
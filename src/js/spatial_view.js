@@ -3,7 +3,10 @@
 // 解决：视觉层级 / 配色统一 / 响应式 / 交互联动 / 叙事链
 
 import * as d3 from "d3";
-import spatialData from "../data/spatial_data.json";
+import { loadSpatialData } from "./spatial_data.js";
+
+// 列式二进制数据，进入视图时才加载（见 spatial_data.js）
+let spatialData = null;
 
 // ═══════════════════════════════════════════════════════════════════
 // 🎨 统一设计系统 - Design Tokens
@@ -76,6 +79,7 @@ const state = {
     hoveredCategory: null,     // hover 的类别
     clickedCategory: null,     // 点击选中的类别
     isInitialized: false,
+    isLoading: false,
 };
 
 // 图表更新函数
@@ -125,19 +129,170 @@ function computeFilteredScaleDistribution(data) {
     };
 }
 
+// 类别名 -> 全量统计摘要（area_stats / aspect_ratio_stats 含精确分位数）
+let categoryStats = new Map();
+
+// 箱线图坐标范围（对数轴）：相对面积 / 宽高比
+const BOX_DOMAINS = {
+    area: [1e-5, 1],
+    ratio: [0.05, 20],
+};
+
+// 生成一条水平箱线图的 SVG 字符串：须 p5~p95，箱体 p25~p75，中线 median
+function boxPlotSVG(stats, domain, color, width = 150, height = 16) {
+    const x = d3.scaleLog().domain(domain).range([2, width - 2]).clamp(true);
+    const mid = height / 2;
+    const [p5, p25, med, p75, p95] = [stats.p5, stats.p25, stats.median, stats.p75, stats.p95]
+        .map(v => x(Math.max(v, domain[0])));
+    return `
+        <svg width="${width}" height="${height}" style="display:block">
+            <line x1="${p5}" x2="${p95}" y1="${mid}" y2="${mid}" stroke="${color}" stroke-width="1" />
+            <line x1="${p5}" x2="${p5}" y1="${mid - 4}" y2="${mid + 4}" stroke="${color}" />
+            <line x1="${p95}" x2="${p95}" y1="${mid - 4}" y2="${mid + 4}" stroke="${color}" />
+            <rect x="${p25}" y="${mid - 6}" width="${Math.max(1, p75 - p25)}" height="12"
+                  fill="${color}" fill-opacity="0.25" stroke="${color}" rx="2" />
+            <line x1="${med}" x2="${med}" y1="${mid - 6}" y2="${mid + 6}" stroke="${color}" stroke-width="2" />
+        </svg>`;
+}
+
+// 类别的面积 / 宽高比箱线图（基于全部标注的分位数，而非前端采样）
+function categoryBoxPlotsHTML(name) {
+    const cat = categoryStats.get(name);
+    if (!cat) return "";
+    const hasQuantiles = ["area_stats", "aspect_ratio_stats"].every(key =>
+        cat[key] && ["p5", "p25", "median", "p75", "p95"].every(q => cat[key][q] !== undefined));
+    if (!hasQuantiles) {
+        // 旧版数据文件没有分位数：明确提示，而不是静默不显示
+        return `
+        <div style="margin-top:6px;font-size:9px;opacity:0.7">
+            无分位数数据（空间数据为旧版格式，请运行 process_spatial.py 重新生成 spatial_data.bin）
+        </div>`;
+    }
+    const C = DESIGN.colors;
+    const area = cat.area_stats;
+    const ratio = cat.aspect_ratio_stats;
+    return `
+        <div style="margin-top:6px">
+            <div class="sv2-tooltip-row">
+                <span>相对面积</span>
+                <span class="sv2-tooltip-value">中位 ${(area.median * 100).toFixed(2)}%</span>
+            </div>
+            ${boxPlotSVG(area, BOX_DOMAINS.area, C.primaryLight)}
+            <div class="sv2-tooltip-row">
+                <span>宽高比</span>
+                <span class="sv2-tooltip-value">中位 ${ratio.median.toFixed(2)}</span>
+            </div>
+            ${boxPlotSVG(ratio, BOX_DOMAINS.ratio, C.scale.medium)}
+            <div style="font-size:9px;opacity:0.7">箱体 P25–P75 · 须 P5–P95 · 全部 ${cat.count} 个标注</div>
+        </div>`;
+}
+
+// ═══════════════════════════════════════════════════════════════════
+// 🗺️ 热力图金字塔 - 按分辨率 / 类别按需加载
+// ═══════════════════════════════════════════════════════════════════
+// 每层一个 level_<N>.bin，依次存放全局 / 各超类 / 各类别的 N×N uint32 计数，
+// index.json 记录序列顺序。用 Range 请求只取当前渲染的那一段。
+const PYRAMID_BASE = "./data/spatial_pyramid/";
+// 每个格子至少占多少屏幕像素，决定使用哪一层
+const HEATMAP_MIN_CELL_PX = 4;
+
+let pyramidIndexPromise = null;
+const pyramidTiles = new Map();  // "level/kind/name" -> { level, counts, max }
+
+function loadPyramidIndex() {
+    if (!pyramidIndexPromise) {
+        pyramidIndexPromise = d3.json(PYRAMID_BASE + "index.json");
+    }
+    return pyramidIndexPromise;
+}
+
+function pickHeatmapLevel(levels, widthPx) {
+    const fitting = levels.filter(level => widthPx / level >= HEATMAP_MIN_CELL_PX);
+    return fitting.length ? d3.max(fitting) : d3.min(levels);
+}
+
+async function loadHeatmapTile(kind, name, level) {
+    const key = `${level}/${kind}/${name}`;
+    if (pyramidTiles.has(key)) return pyramidTiles.get(key);
+
+    const index = await loadPyramidIndex();
+    const i = index.series.findIndex(s => s.kind === kind && s.name === name);
+    if (i < 0) return null;
+
+    const tileBytes = level * level * 4;
+    const url = PYRAMID_BASE + index.files[level];
+    const response = await fetch(url, {
+        headers: { Range: `bytes=${i * tileBytes}-${(i + 1) * tileBytes - 1}` },
+    });
+    if (!response.ok) throw new Error(`${url}: HTTP ${response.status}`);
+    const buffer = await response.arrayBuffer();
+
+    if (response.status === 206) {
+        pyramidTiles.set(key, { level, counts: new Uint32Array(buffer), max: index.max[level][i] });
+    } else {
+        // 服务器不支持 Range 时拿到的是整层，顺便缓存该层的所有序列
+        index.series.forEach((s, j) => {
+            pyramidTiles.set(`${level}/${s.kind}/${s.name}`, {
+                level,
+                counts: new Uint32Array(buffer, j * tileBytes, level * level),
+                max: index.max[level][j],
+            });
+        });
+    }
+    return pyramidTiles.get(key);
+}
+
+// 金字塔未生成（index.json 缺失）时的回退：用已加载的采样标注在前端计数。
+// 采样只有几千条，只用较粗的几层，避免格子过于稀疏
+const SAMPLE_HEATMAP_LEVELS = [8, 16, 32];
+
+function sampleHeatmapTile(annotations, level) {
+    const counts = new Uint32Array(level * level);
+    for (const d of annotations) {
+        const gx = Math.min(level - 1, Math.max(0, Math.floor(d.cx * level)));
+        const gy = Math.min(level - 1, Math.max(0, Math.floor(d.cy * level)));
+        counts[gy * level + gx]++;
+    }
+    return { level, counts, max: d3.max(counts) || 0 };
+}
+
+// 把一个金字塔格子渲染成 PNG data URL（每格一个像素，由 SVG 拉伸显示）
+function heatmapDataURL(tile) {
+    const { level, counts, max } = tile;
+    const canvas = document.createElement("canvas");
+    canvas.width = level;
+    canvas.height = level;
+    const ctx = canvas.getContext("2d");
+    const image = ctx.createImageData(level, level);
+    const scale = d3.scaleSqrt().domain([0, max || 1]);
+    for (let k = 0; k < counts.length; k++) {
+        if (counts[k] === 0) continue;
+        const color = d3.rgb(d3.interpolateBlues(0.15 + scale(counts[k]) * 0.85));
+        image.data[k * 4] = color.r;
+        image.data[k * 4 + 1] = color.g;
+        image.data[k * 4 + 2] = color.b;
+        image.data[k * 4 + 3] = 255;
+    }
+    ctx.putImageData(image, 0, 0);
+    return canvas.toDataURL();
+}
+
 // ResizeObserver 实例
 let resizeObserver = null;
 
 // ═══════════════════════════════════════════════════════════════════
 // 🚀 初始化入口
 // ═══════════════════════════════════════════════════════════════════
-export function initSpatialView() {
-    if (state.isInitialized) return;
+export async function initSpatialView() {
+    if (state.isInitialized || state.isLoading) return;
+    state.isLoading = true;
     
     try {
+        spatialData = await loadSpatialData();
         if (!spatialData?.annotations) {
             throw new Error("数据格式错误");
         }
+        categoryStats = new Map(spatialData.categories.map(c => [c.name, c]));
         
         console.log("✅ Spatial View v2 - Data loaded:", {
             annotations: spatialData.annotations.length,
@@ -151,6 +306,8 @@ export function initSpatialView() {
     } catch (error) {
         console.error("❌ Spatial View init failed:", error);
         showError("数据加载失败，请先运行 python process_spatial.py");
+    } finally {
+        state.isLoading = false;
     }
 }
 
@@ -856,7 +1013,9 @@ function renderContourChart() {
     if (!container) return;
     
     const C = DESIGN.colors;
-    let svg, g, contourLayer, pointsLayer, xScale, yScale, innerW, innerH, brushG;
+    let svg, g, heatmapLayer, contourLayer, pointsLayer, xScale, yScale, innerW, innerH, brushG;
+    let heatmapRequest = 0;
+    let heatmapFallbackWarned = false;
     
     function setup() {
         const rect = container.getBoundingClientRect();
@@ -901,6 +1060,9 @@ function renderContourChart() {
                 .attr("stroke", C.border).attr("stroke-dasharray", "3,3");
         });
         
+        // 热力图层（全量标注的金字塔计数，位于等高线之下）
+        heatmapLayer = g.append("g").attr("class", "sv2-heatmap");
+        
         // 等高线层
         contourLayer = g.append("g").attr("class", "sv2-contours");
         
@@ -959,7 +1121,43 @@ function renderContourChart() {
         charts.distribution.update();
     }
     
+    // 按当前类别与图表宽度选择金字塔层级，只加载这一段
+    function updateHeatmap() {
+        const request = ++heatmapRequest;
+        const catName = state.clickedCategory
+            || (state.currentCategory !== "all" ? state.currentCategory : null);
+        const [kind, name] = catName ? ["category", catName] : ["global", "all"];
+        
+        loadPyramidIndex()
+            .then(index => loadHeatmapTile(kind, name, pickHeatmapLevel(index.levels, innerW)))
+            .catch(err => {
+                // 金字塔缺失或加载失败：退回前端按采样计数的热力图
+                if (!heatmapFallbackWarned) {
+                    console.warn("⚠️ 热力图金字塔加载失败，改用采样标注在前端计数:", err);
+                    heatmapFallbackWarned = true;
+                }
+                const anns = catName
+                    ? spatialData.annotations.filter(d => d.category === catName)
+                    : spatialData.annotations;
+                return sampleHeatmapTile(anns, pickHeatmapLevel(SAMPLE_HEATMAP_LEVELS, innerW));
+            })
+            .then(tile => {
+                if (request !== heatmapRequest) return;  // 已有更新的请求
+                heatmapLayer.selectAll("image")
+                    .data(tile ? [tile] : [])
+                    .join("image")
+                    .attr("width", innerW)
+                    .attr("height", innerH)
+                    .attr("preserveAspectRatio", "none")
+                    .style("image-rendering", "pixelated")
+                    .attr("opacity", 0.55)
+                    .attr("href", heatmapDataURL);
+            });
+    }
+    
     function update() {
+        updateHeatmap();
+        
         const data = state.currentCategory === "all"
             ? spatialData.annotations
             : spatialData.annotations.filter(d => d.category === state.currentCategory);
@@ -1183,6 +1381,7 @@ function renderDistributionChart() {
                         <span>总计</span>
                         <span class="sv2-tooltip-value">${d.data.total}</span>
                     </div>
+                    ${categoryBoxPlotsHTML(d.data.name)}
                     ${hasFilter ? '<div style="margin-top:4px;font-size:9px;opacity:0.7">* 仅统计选中区域</div>' : ''}
                 `;
                 tooltip.style.left = event.pageX + 10 + "px";
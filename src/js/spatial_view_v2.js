@@ -3,7 +3,10 @@
 // 解决：视觉层级 / 配色统一 / 响应式 / 交互联动 / 叙事链
 
 import * as d3 from "d3";
-import spatialData from "../data/spatial_data.json";
+import { loadSpatialData } from "./spatial_data.js";
+
+// 列式二进制数据，进入视图时才加载（见 spatial_data.js）
+let spatialData = null;
 
 // ═══════════════════════════════════════════════════════════════════
 // 🎨 统一设计系统 - Design Tokens
@@ -74,6 +77,7 @@ const state = {
     selectedRegion: null,      // 空间框选区域
     hoveredCategory: null,     // hover 的类别
     isInitialized: false,
+    isLoading: false,
 };
 
 // 图表更新函数
@@ -89,10 +93,12 @@ let resizeObserver = null;
 // ═══════════════════════════════════════════════════════════════════
 // 🚀 初始化入口
 // ═══════════════════════════════════════════════════════════════════
-export function initSpatialView() {
-    if (state.isInitialized) return;
+export async function initSpatialView() {
+    if (state.isInitialized || state.isLoading) return;
+    state.isLoading = true;
     
     try {
+        spatialData = await loadSpatialData();
         if (!spatialData?.annotations) {
             throw new Error("数据格式错误");
         }
@@ -109,6 +115,8 @@ export function initSpatialView() {
     } catch (error) {
         console.error("❌ Spatial View init failed:", error);
         showError("数据加载失败，请先运行 python process_spatial.py");
+    } finally {
+        state.isLoading = false;
     }
 }
 
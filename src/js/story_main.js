@@ -66,6 +66,9 @@ const portalLayer = document.getElementById("portal-layer");
 // 所有 Hero 帧（和背景图同样方式）
 const heroFrames = document.querySelectorAll("[data-hero-frame]");
 
+// 三个标注图层；整帧 PNG 模式下对应 ./data/hero_<layer>.png
+const HERO_LAYERS = ["spatial", "semantic", "pose"];
+
 // 场景顺序，用于滚轮切换
 const STATE_ORDER = ["intro", "spatial", "semantic", "pose", "handoff"];
 
@@ -74,6 +77,9 @@ const state = {
     layout: null,
     imgSize: null,
     data: null,
+    // generate_hero_layers.py 默认输出的 hero_layers.json：
+    // 压暗底图 + 裁剪后的透明图层及其偏移，没有时回退到整帧 PNG（--full-frame）
+    heroLayers: null,
 };
 
 function debounce(fn, wait = 120) {
@@ -123,6 +129,49 @@ async function loadHeroData() {
     }
 }
 
+async function loadHeroLayers() {
+    try {
+        state.heroLayers = await d3.json("./data/hero_layers.json");
+    } catch (err) {
+        state.heroLayers = null;
+    }
+    return state.heroLayers;
+}
+
+/**
+ * 设置各图层帧的背景：透明图层模式下叠两层背景（上层为裁剪的标注图层，
+ * 下层为共用的压暗底图），否则使用 --full-frame 生成的整帧 PNG；
+ * 整帧 PNG 也不存在时至少显示原图 hero_image.jpg。
+ */
+function applyHeroLayers() {
+    const layout = state.heroLayers;
+    heroFrames.forEach((frame) => {
+        const tag = frame.dataset.heroFrame;
+        if (!HERO_LAYERS.includes(tag)) return;
+        if (!layout) {
+            frame.style.backgroundImage = `url("./data/hero_${tag}.png"), url("./data/hero_image.jpg")`;
+            return;
+        }
+        const layer = layout.layers?.[tag];
+        const base = `url("./data/${layout.base}")`;
+        frame.style.backgroundImage = layer ? `url("./data/${layer.file}"), ${base}` : base;
+    });
+}
+
+/**
+ * 透明图层按原图像素偏移 / 尺寸乘以缩放系数 k 定位；底图铺满整帧。
+ */
+function positionHeroLayers(k) {
+    const layout = state.heroLayers;
+    if (!layout) return;
+    heroFrames.forEach((frame) => {
+        const layer = layout.layers?.[frame.dataset.heroFrame];
+        if (!layer) return;
+        frame.style.backgroundSize = `${layer.width * k}px ${layer.height * k}px, 100% 100%`;
+        frame.style.backgroundPosition = `${layer.x * k}px ${layer.y * k}px, 0 0`;
+    });
+}
+
 function computeLayout() {
     if (!state.imgSize || !stageFrame) return;
 
@@ -163,6 +212,7 @@ function computeLayout() {
     // 透明的 heroImage 只是用来触发 onload 不显示
     applySize(heroImage);
     heroFrames.forEach(applySize);
+    positionHeroLayers(k);
 
     overlaySvg
         .attr("width", frameW)
@@ -386,12 +436,13 @@ async function init() {
     if (!portalLayer || !heroStage || !stageFrame) return;
 
     try {
-        const [imgInfo] = await Promise.all([loadHero(), loadHeroData()]);
+        const [imgInfo] = await Promise.all([loadHero(), loadHeroData(), loadHeroLayers()]);
         state.imgSize = {
             width: state.data?.meta?.width || imgInfo?.width || 1,
             height: state.data?.meta?.height || imgInfo?.height || 1,
         };
 
+        applyHeroLayers();
         computeLayout();
         setStats();
         renderState("intro");
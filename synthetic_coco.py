@@ -0,0 +1,384 @@
+"""
+合成 COCO 标注 - 不下载真实数据集，按任意规模生成 instances / person_keypoints / captions
+
+用于在没有 COCO 原始文件（数 GB）的机器上测试、基准测试预处理脚本（见 benchmark.py）。
+输出与官方 train2017 文件的结构一致：段顺序 info, licenses, images, annotations,
+categories；80 个官方类别 (ID 不连续) 与超类；person 的 17 个关键点与骨架。
+
+分布上尽量接近真实数据：
+- 每张图片的标注数服从均值 OBJECTS_PER_IMAGE 的几何分布（长尾），约 1% 的图片没有标注
+- 类别偏斜：person 占 PERSON_SHARE，其余类别按 Zipf 分布（排名由随机种子决定）；
+  每张图片先选出 1~4 个「场景类别」，标注只在其中取，因此有共现结构、同类多实例
+- bbox 的相对面积取对数均匀分布（small / medium / large 约 4 : 2.5 : 3.5），宽高比对数正态
+- segmentation 为 6~30 个顶点的多边形；约 1% 的 crowd 标注使用 RLE，ID 与官方一样从 900100000000 起
+- person 标注面积越大越可能标注关键点，keypoints 文件包含全部 person 标注（含 num_keypoints 为 0 的）
+- 每张图片 5 条描述，由模板与图中的类别名组成
+- 标注按图片分块打乱后写出，同一张图片的标注不一定相邻（与官方文件一样）
+
+文件按记录流式写出，内存只与图片数有关；同一 seed、同一规模生成的文件逐字节相同。
+
+用法：python synthetic_coco.py --annotations 100000 --output-dir bench/fixtures/100k
+"""
+
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+
+OUTPUT_DIR = os.path.join("bench", "fixtures", "custom")
+FILE_NAMES = {
+    "instances": "instances_train2017.json",
+    "person_keypoints": "person_keypoints_train2017.json",
+    "captions": "captions_train2017.json",
+}
+# 生成参数的说明文件，benchmark.py 据此判断现有夹具能否复用
+META_FILE = "fixture.json"
+# 生成算法的版本，分布或格式变化时递增
+GENERATOR_VERSION = 1
+
+NUM_ANNOTATIONS = 10000
+SEED = 0
+
+OBJECTS_PER_IMAGE = 7.3     # 官方 train2017：86 万标注 / 11.8 万图片
+EMPTY_IMAGE_SHARE = 0.01    # 没有标注的图片比例
+PERSON_SHARE = 0.3          # person 标注占比（官方约 30%）
+ZIPF_EXPONENT = 1.0         # 其余类别的 Zipf 指数
+MAX_SCENE_CATEGORIES = 4    # 每张图片最多几个场景类别
+CROWD_SHARE = 0.01
+CROWD_ID_BASE = 900100000000
+CAPTIONS_PER_IMAGE = 5
+IMAGE_SIZES = ((640, 480), (480, 640), (640, 427), (427, 640), (500, 375), (375, 500), (640, 360), (612, 612))
+# 相对面积 (bbox 面积 / 图片面积) 的对数均匀分布范围
+REL_AREA_RANGE = (1e-4, 0.9)
+# 标注分块打乱的图片数（块内的标注随机排列）
+SHUFFLE_BLOCK = 4096
+
+# 官方 80 个类别：(id, name, supercategory)
+COCO_CATEGORIES = (
+    (1, "person", "person"), (2, "bicycle", "vehicle"), (3, "car", "vehicle"), (4, "motorcycle", "vehicle"),
+    (5, "airplane", "vehicle"), (6, "bus", "vehicle"), (7, "train", "vehicle"), (8, "truck", "vehicle"),
+    (9, "boat", "vehicle"), (10, "traffic light", "outdoor"), (11, "fire hydrant", "outdoor"),
+    (13, "stop sign", "outdoor"), (14, "parking meter", "outdoor"), (15, "bench", "outdoor"),
+    (16, "bird", "animal"), (17, "cat", "animal"), (18, "dog", "animal"), (19, "horse", "animal"),
+    (20, "sheep", "animal"), (21, "cow", "animal"), (22, "elephant", "animal"), (23, "bear", "animal"),
+    (24, "zebra", "animal"), (25, "giraffe", "animal"), (27, "backpack", "accessory"),
+    (28, "umbrella", "accessory"), (31, "handbag", "accessory"), (32, "tie", "accessory"),
+    (33, "suitcase", "accessory"), (34, "frisbee", "sports"), (35, "skis", "sports"),
+    (36, "snowboard", "sports"), (37, "sports ball", "sports"), (38, "kite", "sports"),
+    (39, "baseball bat", "sports"), (40, "baseball glove", "sports"), (41, "skateboard", "sports"),
+    (42, "surfboard", "sports"), (43, "tennis racket", "sports"), (44, "bottle", "kitchen"),
+    (46, "wine glass", "kitchen"), (47, "cup", "kitchen"), (48, "fork", "kitchen"), (49, "knife", "kitchen"),
+    (50, "spoon", "kitchen"), (51, "bowl", "kitchen"), (52, "banana", "food"), (53, "apple", "food"),
+    (54, "sandwich", "food"), (55, "orange", "food"), (56, "broccoli", "food"), (57, "carrot", "food"),
+    (58, "hot dog", "food"), (59, "pizza", "food"), (60, "donut", "food"), (61, "cake", "food"),
+    (62, "chair", "furniture"), (63, "couch", "furniture"), (64, "potted plant", "furniture"),
+    (65, "bed", "furniture"), (67, "dining table", "furniture"), (70, "toilet", "furniture"),
+    (72, "tv", "electronic"), (73, "laptop", "electronic"), (74, "mouse", "electronic"),
+    (75, "remote", "electronic"), (76, "keyboard", "electronic"), (77, "cell phone", "electronic"),
+    (78, "microwave", "appliance"), (79, "oven", "appliance"), (80, "toaster", "appliance"),
+    (81, "sink", "appliance"), (82, "refrigerator", "appliance"), (84, "book", "indoor"),
+    (85, "clock", "indoor"), (86, "vase", "indoor"), (87, "scissors", "indoor"),
+    (88, "teddy bear", "indoor"), (89, "hair drier", "indoor"), (90, "toothbrush", "indoor"),
+)
+KEYPOINT_NAMES = (
+    "nose", "left_eye", "right_eye", "left_ear", "right_ear", "left_shoulder", "right_shoulder",
+    "left_elbow", "right_elbow", "left_wrist", "right_wrist", "left_hip", "right_hip",
+    "left_knee", "right_knee", "left_ankle", "right_ankle",
+)
+SKELETON = (
+    [16, 14], [14, 12], [17, 15], [15, 13], [12, 13], [6, 12], [7, 13], [6, 7], [6, 8], [7, 9],
+    [8, 10], [9, 11], [2, 3], [1, 2], [1, 3], [2, 4], [3, 5], [4, 6], [5, 7],
+)
+# 关键点在 bbox 中的大致位置 (x, y)，生成时加抖动
+KEYPOINT_LAYOUT = (
+    (0.5, 0.08), (0.55, 0.06), (0.45, 0.06), (0.6, 0.08), (0.4, 0.08), (0.68, 0.22), (0.32, 0.22),
+    (0.75, 0.38), (0.25, 0.38), (0.78, 0.52), (0.22, 0.52), (0.62, 0.55), (0.38, 0.55),
+    (0.62, 0.75), (0.38, 0.75), (0.62, 0.95), (0.38, 0.95),
+)
+# person 标注面积达到该值（像素）时几乎一定标注了关键点
+KEYPOINT_AREA = 6000
+
+CAPTION_SUBJECTS = ("A", "The", "One", "This")
+CAPTION_ADJECTIVES = ("small", "large", "red", "white", "old", "young", "busy", "quiet")
+CAPTION_VERBS = ("sitting near", "standing next to", "in front of", "on top of", "beside", "behind")
+CAPTION_PLACES = ("in a park.", "on a street.", "in a kitchen.", "at the beach.", "in a room.", "on a field.")
+
+INFO = {
+    "description": "Synthetic COCO-style dataset",
+    "url": "",
+    "version": "1.0",
+    "year": 2017,
+    "contributor": "synthetic_coco.py",
+    "date_created": "2017/09/01",
+}
+LICENSES = [{"url": "", "id": 1, "name": "Synthetic"}]
+
+
+def parse_count(text):
+    """"10k" / "1M" / "250000" -> 整数"""
+    text = str(text).strip().lower()
+    scale = {"k": 1000, "m": 1000000}.get(text[-1:], 1)
+    return int(float(text[:-1] if scale > 1 else text) * scale)
+
+
+def category_weights(rng):
+    """各类别（与 COCO_CATEGORIES 同序）的抽取概率：person 固定占比，其余按 Zipf，排名随机"""
+    others = len(COCO_CATEGORIES) - 1
+    zipf = 1.0 / np.arange(1, others + 1) ** ZIPF_EXPONENT
+    weights = np.empty(len(COCO_CATEGORIES))
+    weights[0] = PERSON_SHARE
+    weights[1:] = rng.permutation(zipf) / zipf.sum() * (1 - PERSON_SHARE)
+    return weights
+
+
+def objects_per_image(rng, num_annotations):
+    """每张图片的标注数（几何分布，总数恰好为 num_annotations），再混入少量空图片"""
+    counts = np.zeros(0, dtype=np.int64)
+    while counts.sum() < num_annotations:
+        more = rng.geometric(1 / OBJECTS_PER_IMAGE, size=int(num_annotations / OBJECTS_PER_IMAGE) + 16)
+        counts = np.concatenate((counts, more))
+    total = np.cumsum(counts)
+    num_images = int(np.searchsorted(total, num_annotations)) + 1
+    counts = counts[:num_images]
+    counts[-1] -= total[num_images - 1] - num_annotations
+    empty = np.zeros(int(round(num_images * EMPTY_IMAGE_SHARE)), dtype=np.int64)
+    return rng.permutation(np.concatenate((counts, empty)))
+
+
+def make_images(rng, counts):
+    """images 表：不连续、乱序的 ID（与官方一样），尺寸取常见的几种"""
+    num_images = len(counts)
+    ids = rng.choice(num_images * 5, size=num_images, replace=False) + 1
+    sizes = np.array(IMAGE_SIZES)[rng.integers(len(IMAGE_SIZES), size=num_images)]
+    return ids, sizes[:, 0], sizes[:, 1]
+
+
+def polygon(rng, x, y, w, h):
+    """bbox 内接椭圆上带抖动的多边形，[[x1, y1, x2, y2, ...]]"""
+    n = int(rng.integers(6, 31))
+    angles = np.sort(rng.random(n)) * 2 * np.pi
+    radius = 0.5 * (0.8 + 0.2 * rng.random(n))
+    xs = x + w * (0.5 + radius * np.cos(angles))
+    ys = y + h * (0.5 + radius * np.sin(angles))
+    return [np.round(np.column_stack((xs, ys)).ravel(), 2).tolist()]
+
+
+def crowd_rle(rng, width, height):
+    """未压缩的 RLE：若干段交替的 0 / 1 游程，总长为图片像素数"""
+    total = width * height
+    cuts = np.sort(rng.choice(total, size=2 * int(rng.integers(2, 9)), replace=False))
+    runs = np.diff(np.concatenate(([0], cuts, [total])))
+    return {"counts": runs.tolist(), "size": [int(height), int(width)]}
+
+
+def keypoints(rng, x, y, w, h, area):
+    """17 个关键点 [x, y, v, ...] 与 num_keypoints；面积越小越可能没有标注关键点"""
+    labeled = rng.random() < min(0.95, max(0.05, area / KEYPOINT_AREA))
+    if not labeled:
+        return [0] * (len(KEYPOINT_NAMES) * 3), 0
+    layout = np.array(KEYPOINT_LAYOUT)
+    visibility = rng.choice((0, 1, 2), size=len(layout), p=(0.25, 0.15, 0.6))
+    xs = np.round(x + w * np.clip(layout[:, 0] + rng.normal(0, 0.05, len(layout)), 0, 1))
+    ys = np.round(y + h * np.clip(layout[:, 1] + rng.normal(0, 0.03, len(layout)), 0, 1))
+    values = np.column_stack((xs, ys, visibility)).astype(np.int64)
+    values[visibility == 0] = 0
+    return values.ravel().tolist(), int(np.count_nonzero(visibility))
+
+
+def caption(rng, names):
+    name = names[int(rng.integers(len(names)))] if names else "scene"
+    other = names[int(rng.integers(len(names)))] if names else "wall"
+    return (f"{CAPTION_SUBJECTS[rng.integers(len(CAPTION_SUBJECTS))]} "
+            f"{CAPTION_ADJECTIVES[rng.integers(len(CAPTION_ADJECTIVES))]} {name} "
+            f"{CAPTION_VERBS[rng.integers(len(CAPTION_VERBS))]} the {other} "
+            f"{CAPTION_PLACES[rng.integers(len(CAPTION_PLACES))]}")
+
+
+def image_annotations(rng, count, width, height, weights):
+    """一张图片的标注几何量与类别下标，返回 [(类别下标, x, y, w, h, area, iscrowd), ...]"""
+    num_scene = min(count, int(rng.integers(1, MAX_SCENE_CATEGORIES + 1)))
+    scene = rng.choice(len(weights), size=num_scene, p=weights)
+    cats = scene[rng.integers(num_scene, size=count)]
+
+    low, high = np.log(REL_AREA_RANGE[0]), np.log(REL_AREA_RANGE[1])
+    box_area = np.exp(rng.uniform(low, high, count)) * width * height
+    ratio = np.exp(rng.normal(0, 0.6, count))
+    w = np.minimum(np.sqrt(box_area * ratio), width)
+    h = np.minimum(box_area / np.maximum(w, 1), height)
+    x = rng.random(count) * (width - w)
+    y = rng.random(count) * (height - h)
+    area = w * h * rng.uniform(0.4, 0.9, count)
+    crowd = rng.random(count) < CROWD_SHARE
+    boxes = np.round(np.column_stack((x, y, w, h)), 2)
+    return list(zip(cats.tolist(), boxes.tolist(), np.round(area, 4).tolist(), crowd.tolist()))
+
+
+class CocoWriter:
+    """按官方段顺序流式写出一个 COCO 文件：先写 images，再逐条追加 annotations，最后写 categories"""
+
+    def __init__(self, path, images, categories=None):
+        self.f = open(path, "w", encoding="utf-8")
+        self.categories = categories
+        self.first = True
+        self.f.write('{"info":' + dumps(INFO) + ',"licenses":' + dumps(LICENSES) + ',"images":[')
+        self.f.write(",".join(dumps(image) for image in images))
+        self.f.write('],"annotations":[')
+
+    def add(self, records):
+        if not records:
+            return
+        self.f.write(("" if self.first else ",") + ",".join(dumps(record) for record in records))
+        self.first = False
+
+    def close(self):
+        self.f.write("]")
+        if self.categories is not None:
+            self.f.write(',"categories":' + dumps(self.categories))
+        self.f.write("}")
+        self.f.close()
+
+
+def dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def generate(output_dir, num_annotations=NUM_ANNOTATIONS, seed=SEED, placeholder_images=False):
+    """
+    在 output_dir 下生成三个标注文件与 fixture.json，返回 fixture.json 的内容。
+    placeholder_images=True 时另建 images/，每张图片都是同一个占位 JPEG 的硬链接
+    （find_image 需要主图文件存在）。
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    weights = category_weights(rng)
+    counts = objects_per_image(rng, num_annotations)
+    image_ids, widths, heights = make_images(rng, counts)
+    images = [
+        {
+            "license": 1,
+            "file_name": f"{image_id:012d}.jpg",
+            "coco_url": "",
+            "height": height,
+            "width": width,
+            "date_captured": "2013-11-14 16:28:13",
+            "flickr_url": "",
+            "id": image_id,
+        }
+        for image_id, width, height in zip(image_ids.tolist(), widths.tolist(), heights.tolist())
+    ]
+    categories = [{"supercategory": sup, "id": cat_id, "name": name} for cat_id, name, sup in COCO_CATEGORIES]
+    person = dict(categories[0], keypoints=list(KEYPOINT_NAMES), skeleton=[list(pair) for pair in SKELETON])
+
+    paths = {source: os.path.join(output_dir, name) for source, name in FILE_NAMES.items()}
+    writers = {
+        "instances": CocoWriter(paths["instances"], images, categories),
+        "person_keypoints": CocoWriter(paths["person_keypoints"], images, [person]),
+        "captions": CocoWriter(paths["captions"], images),
+    }
+    totals = dict.fromkeys(FILE_NAMES, 0)
+    next_id, next_crowd_id, next_caption_id = 1, CROWD_ID_BASE, 1
+
+    # 按随机顺序逐块处理图片，块内的标注打乱后写出
+    order = rng.permutation(len(images))
+    for start in range(0, len(order), SHUFFLE_BLOCK):
+        block = {"instances": [], "person_keypoints": [], "captions": []}
+        for i in order[start:start + SHUFFLE_BLOCK].tolist():
+            image = images[i]
+            names = []
+            for cat, (x, y, w, h), area, crowd in image_annotations(rng, int(counts[i]), image["width"],
+                                                                    image["height"], weights):
+                cat_id, name, _ = COCO_CATEGORIES[cat]
+                names.append(name)
+                if crowd:
+                    segmentation = crowd_rle(rng, image["width"], image["height"])
+                    ann_id, next_crowd_id = next_crowd_id, next_crowd_id + 1
+                else:
+                    segmentation = polygon(rng, x, y, w, h)
+                    ann_id, next_id = next_id, next_id + 1
+                record = {
+                    "segmentation": segmentation,
+                    "area": area,
+                    "iscrowd": int(crowd),
+                    "image_id": image["id"],
+                    "bbox": [x, y, w, h],
+                    "category_id": cat_id,
+                    "id": ann_id,
+                }
+                block["instances"].append(record)
+                if cat_id == 1:
+                    kps, num_kps = keypoints(rng, x, y, w, h, area)
+                    block["person_keypoints"].append(dict(record, num_keypoints=num_kps, keypoints=kps))
+            for _ in range(CAPTIONS_PER_IMAGE):
+                block["captions"].append({"image_id": image["id"], "id": next_caption_id, "caption": caption(rng, names)})
+                next_caption_id += 1
+
+        for source, records in block.items():
+            if source != "captions":
+                records = [records[j] for j in rng.permutation(len(records)).tolist()]
+            writers[source].add(records)
+            totals[source] += len(records)
+
+    for writer in writers.values():
+        writer.close()
+
+    if placeholder_images:
+        write_placeholder_images(os.path.join(output_dir, "images"), images)
+
+    meta = {
+        "version": GENERATOR_VERSION,
+        "seed": seed,
+        "target_annotations": num_annotations,
+        "images": len(images),
+        "annotations": totals,
+        "files": FILE_NAMES,
+        "placeholder_images": placeholder_images,
+    }
+    with open(os.path.join(output_dir, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def write_placeholder_images(image_dir, images):
+    """一个 64x48 的灰色 JPEG，其余文件名都是它的硬链接（不支持硬链接时复制）"""
+    from PIL import Image
+
+    shutil.rmtree(image_dir, ignore_errors=True)
+    os.makedirs(image_dir)
+    source = os.path.join(image_dir, "placeholder.jpg")
+    Image.new("RGB", (64, 48), (128, 128, 128)).save(source, quality=75)
+    for image in images:
+        target = os.path.join(image_dir, image["file_name"])
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copyfile(source, target)
+
+
+def read_meta(output_dir):
+    try:
+        with open(os.path.join(output_dir, META_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic COCO-style instances / keypoints / captions files.")
+    parser.add_argument("--annotations", default=str(NUM_ANNOTATIONS), help="number of instance annotations (e.g. 10k, 1M)")
+    parser.add_argument("--seed", type=int, default=SEED, help="generator seed")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--placeholder-images", action="store_true",
+                        help="also create images/ with one hard-linked placeholder JPEG per image")
+    args = parser.parse_args()
+
+    num_annotations = parse_count(args.annotations)
+    print(f"🧪 Generating {num_annotations} synthetic annotations (seed={args.seed}) -> {args.output_dir}")
+    meta = generate(args.output_dir, num_annotations, args.seed, args.placeholder_images)
+    print(f"✅ {meta['images']} images, "
+          + ", ".join(f"{count} {source}" for source, count in meta["annotations"].items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+缩略图缓存 - 解码过的小图按固定尺寸打包存进一个可 mmap 的文件，多次运行共用
+
+save_overview.py 的概览拼图、find_image.py 的候选预览条每次都要把同一批
+COCO 原图重新解码、缩放。这里把缩放好的小图按尺寸 (THUMB_SIZES) 分别存进
+一个定长槽位的打包文件，命中时直接从 mmap 中拷贝像素，拼图变成一组内存拷贝。
+
+缓存目录结构 (src/data/.thumb_cache/<尺寸>/)：
+- tiles.bin   uint8 (槽位数, 尺寸, 尺寸, 3)  RGB 像素，每个槽位一张小图
+- index.json  版本、LRU 时钟、槽位数，以及 {文件名: [槽位, 源文件大小, 源文件 mtime_ns, 最近使用时刻]}
+
+- 键为文件名，源文件的大小 / 修改时间变化时视为未命中并重新解码（复用原槽位）
+- 每个尺寸的 tiles.bin 不超过 max_bytes；写满后按最近使用时刻淘汰（LRU），
+  本次请求用到的小图不会被淘汰；上限调低时打开缓存即淘汰到新上限并截断文件；
+  上限为 0 时不读写缓存，已有的缓存保持不变
+- 请求的尺寸不在 THUMB_SIZES 中时，取不小于它的最小缓存尺寸再缩放；
+  比最大缓存尺寸还大时直接解码，不缓存
+"""
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from math import ceil
+
+import numpy as np
+from PIL import Image
+
+THUMB_CACHE_DIR = os.path.join("src", "data", ".thumb_cache")
+THUMB_SIZES = (64, 128, 256)
+# 缓存格式版本，格式变化时递增以强制清空
+THUMB_CACHE_VERSION = 1
+# 每个尺寸的 tiles.bin 上限（256px 一张约 192 KB，1 GiB 约 5400 张）
+MAX_BYTES = 1 << 30
+# tiles.bin 每次扩容的槽位数，避免逐张增长文件
+GROW_SLOTS = 1024
+
+NUM_WORKERS = os.cpu_count() or 1  # 解码 / 缩放的进程数，1 表示在主进程中逐张处理
+TASKS_PER_WORKER = 4  # 每个进程大约分到几批图片（批次越多负载越均衡，通信开销也越多）
+
+
+# ================= 解码与缩放（在子进程中执行） =================
+def load_tile(img_path, tile_size):
+    """
+    读取一张图片并缩放为 tile_size x tile_size。
+    JPEG 先用 draft() 让解码器直接按 1/2、1/4、1/8 的 DCT 缩放解码
+    （结果仍不小于目标尺寸），再用 LANCZOS 缩放到最终大小，
+    解码的像素量大约只有原图的几十分之一。
+    """
+    with Image.open(img_path) as img:
+        img.draft("RGB", (tile_size, tile_size))
+        # 统一缩放为固定大小
+        return img.convert("RGB").resize((tile_size, tile_size), Image.Resampling.LANCZOS)
+
+
+def render_tiles(img_paths, tile_size):
+    """处理一批图片，返回每张小图的 RGB 字节；失败的图片返回错误信息字符串"""
+    tiles = []
+    for img_path in img_paths:
+        try:
+            tiles.append(load_tile(img_path, tile_size).tobytes())
+        except Exception as e:
+            tiles.append(str(e))
+    return tiles
+
+
+def iter_tiles(img_paths, tile_size, workers=NUM_WORKERS):
+    """按原顺序产出每张图片的结果；workers > 1 时分批交给进程池并行解码"""
+    if workers <= 1 or len(img_paths) <= 1:
+        yield from render_tiles(img_paths, tile_size)
+        return
+    batch = max(1, ceil(len(img_paths) / (workers * TASKS_PER_WORKER)))
+    batches = [img_paths[i:i + batch] for i in range(0, len(img_paths), batch)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for tiles in pool.map(render_tiles, batches, [tile_size] * len(batches)):
+            yield from tiles
+
+
+def tile_array(tile, tile_size):
+    """render_tiles 产出的字节 -> (tile_size, tile_size, 3) 数组"""
+    return np.frombuffer(tile, dtype=np.uint8).reshape(tile_size, tile_size, 3)
+
+
+def resize_tile(tile, tile_size):
+    if tile.shape[0] == tile_size:
+        return tile
+    return np.asarray(Image.fromarray(tile).resize((tile_size, tile_size), Image.Resampling.LANCZOS))
+
+
+# ================= 单一尺寸的打包文件 =================
+class TileStore:
+    """一个尺寸的 tiles.bin + index.json"""
+
+    def __init__(self, directory, size, max_bytes=MAX_BYTES):
+        self.directory = directory
+        self.size = size
+        self.slot_bytes = size * size * 3
+        self.max_slots = max(0, max_bytes // self.slot_bytes)
+        self.tiles_path = os.path.join(directory, "tiles.bin")
+        self.index_path = os.path.join(directory, "index.json")
+
+        meta = self.read_index()
+        if meta is None or meta.get("version") != THUMB_CACHE_VERSION or meta.get("size") != size:
+            meta = {"version": THUMB_CACHE_VERSION, "size": size, "clock": 0, "capacity": 0, "entries": {}}
+        self.clock = meta["clock"]
+        self.capacity = meta["capacity"]
+        # 文件名 -> [槽位, 源文件大小, 源文件 mtime_ns, 最近使用时刻]
+        self.entries = meta["entries"]
+        self.tiles = None
+        self.dirty = False
+        # 上限不足一个槽位时不收缩（ThumbCache 此时不会使用缓存），避免清空共享的缓存
+        if 0 < self.max_slots < self.capacity:
+            self.shrink()
+        self.free = sorted(set(range(self.capacity)) - {entry[0] for entry in self.entries.values()}, reverse=True)
+
+    def read_index(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def open_tiles(self):
+        """以读写方式 mmap tiles.bin（文件长度不足 capacity 时先补齐）"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.tiles_path, "ab") as f:
+            if f.tell() < self.capacity * self.slot_bytes:
+                f.truncate(self.capacity * self.slot_bytes)
+        self.tiles = None
+        if self.capacity:
+            self.tiles = np.memmap(self.tiles_path, dtype=np.uint8, mode="r+",
+                                   shape=(self.capacity, self.size, self.size, 3))
+
+    def shrink(self):
+        """
+        上限调低后：只保留最近使用的 max_slots 张小图，搬进前 max_slots 个槽位，
+        先写回索引再截断 tiles.bin（中途中断时旧索引指向的像素仍然完好）。
+        """
+        by_recency = sorted(self.entries.items(), key=lambda item: item[1][3], reverse=True)
+        kept = dict(by_recency[:self.max_slots])
+        moves = [entry for entry in kept.values() if entry[0] >= self.max_slots]
+        if moves:
+            free = sorted(set(range(self.max_slots)) - {entry[0] for entry in kept.values()})
+            self.open_tiles()
+            for entry, slot in zip(moves, free):
+                self.tiles[slot] = self.tiles[entry[0]]
+                entry[0] = slot
+            self.tiles.flush()
+            self.tiles = None
+        self.entries = kept
+        self.capacity = self.max_slots
+        self.dirty = True
+        self.save()
+        if os.path.exists(self.tiles_path):
+            with open(self.tiles_path, "r+b") as f:
+                f.truncate(self.capacity * self.slot_bytes)
+
+    def lookup(self, name, fingerprint):
+        """命中时返回槽位中的小图（mmap 视图）并刷新最近使用时刻"""
+        entry = self.entries.get(name)
+        if entry is None or entry[1:3] != fingerprint:
+            return None
+        if self.tiles is None:
+            self.open_tiles()
+        self.clock += 1
+        entry[3] = self.clock
+        self.dirty = True
+        return self.tiles[entry[0]]
+
+    def allocate(self, name, protected):
+        """为 name 分配槽位：复用旧槽位 > 空闲槽位 > 扩容 > 淘汰最久未用的；都不行时返回 None"""
+        entry = self.entries.get(name)
+        if entry is not None:
+            return entry[0]
+        if not self.free and self.capacity < self.max_slots:
+            grown = min(self.max_slots, self.capacity + GROW_SLOTS)
+            self.free = list(range(grown - 1, self.capacity - 1, -1))
+            self.capacity = grown
+            self.open_tiles()
+        if not self.free:
+            self.evict(protected)
+        return self.free.pop() if self.free else None
+
+    def evict(self, protected):
+        """淘汰一批最久未用的小图（至少一张，最多 GROW_SLOTS 张），跳过本次请求用到的"""
+        candidates = [(entry[3], name) for name, entry in self.entries.items() if name not in protected]
+        if not candidates:
+            return
+        count = min(len(candidates), GROW_SLOTS)
+        candidates.sort()
+        for _, name in candidates[:count]:
+            self.free.append(self.entries.pop(name)[0])
+        self.free.sort(reverse=True)
+
+    def store(self, name, fingerprint, tile, protected):
+        slot = self.allocate(name, protected)
+        if slot is None:
+            return False
+        if self.tiles is None or slot >= len(self.tiles):
+            self.open_tiles()
+        self.tiles[slot] = tile
+        self.clock += 1
+        self.entries[name] = [slot, *fingerprint, self.clock]
+        self.dirty = True
+        return True
+
+    def save(self):
+        if not self.dirty:
+            return
+        if self.tiles is not None:
+            self.tiles.flush()
+        meta = {
+            "version": THUMB_CACHE_VERSION,
+            "size": self.size,
+            "clock": self.clock,
+            "capacity": self.capacity,
+            "entries": self.entries,
+        }
+        # 先写临时文件再替换，避免中断时留下不完整的索引
+        tmp_path = self.index_path + ".tmp"
+        os.makedirs(self.directory, exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, separators=(",", ":"))
+        os.replace(tmp_path, self.index_path)
+        self.dirty = False
+
+
+# ================= 对外接口 =================
+class ThumbCache:
+    """
+    多尺寸缩略图缓存。
+
+    - tiles(img_paths, tile_size): 按顺序返回每张图片的 (tile_size, tile_size, 3) uint8 数组，
+      打不开的图片返回错误信息字符串；未命中的图片并行解码后写入缓存
+    - save(): 写回索引（也可以用 with 语句自动保存）
+
+    max_bytes <= 0 表示绕过缓存：每次都直接解码，不读写 tiles.bin / index.json。
+    """
+
+    def __init__(self, cache_dir=THUMB_CACHE_DIR, max_bytes=MAX_BYTES, workers=NUM_WORKERS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self.stores = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.save()
+
+    def store_for(self, tile_size):
+        """不小于 tile_size 的最小缓存尺寸对应的 TileStore，没有或绕过缓存时返回 None"""
+        size = next((size for size in THUMB_SIZES if size >= tile_size), None)
+        if size is None or self.max_bytes <= 0:
+            return None
+        if size not in self.stores:
+            self.stores[size] = TileStore(os.path.join(self.cache_dir, str(size)), size, self.max_bytes)
+        return self.stores[size]
+
+    def tiles(self, img_paths, tile_size):
+        store = self.store_for(tile_size)
+        if store is None:
+            return [tile if isinstance(tile, str) else tile_array(tile, tile_size)
+                    for tile in iter_tiles(img_paths, tile_size, self.workers)]
+
+        results = [None] * len(img_paths)
+        names = [os.path.basename(img_path) for img_path in img_paths]
+        fingerprints = [None] * len(img_paths)
+        misses = []
+        for i, img_path in enumerate(img_paths):
+            try:
+                st = os.stat(img_path)
+            except OSError as e:
+                results[i] = str(e)
+                continue
+            fingerprints[i] = [st.st_size, st.st_mtime_ns]
+            tile = store.lookup(names[i], fingerprints[i])
+            if tile is None:
+                misses.append(i)
+            else:
+                results[i] = tile
+
+        if misses:
+            print(f"🖼️ Thumbnail cache ({store.size}px): {len(img_paths) - len(misses)} hits, decoding {len(misses)}")
+            protected = set(names)
+            decoded = iter_tiles([img_paths[i] for i in misses], store.size, self.workers)
+            for i, tile in zip(misses, decoded):
+                if isinstance(tile, str):
+                    results[i] = tile
+                    continue
+                results[i] = tile_array(tile, store.size)
+                store.store(names[i], fingerprints[i], results[i], protected)
+
+        return [tile if isinstance(tile, str) else resize_tile(np.asarray(tile), tile_size) for tile in results]
+
+    def save(self):
+        for store in self.stores.values():
+            store.save()